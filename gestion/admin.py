@@ -2,7 +2,7 @@ from django.contrib import admin
 from .models import (
     Categoria, Proveedor, Producto, 
     Cliente, Venta, DetalleVenta, 
-    Compra, DetalleCompra, MovimientoInventario
+    Compra, DetalleCompra, MovimientoInventario, TokenAcceso
 )
 
 class DetalleVentaInline(admin.TabularInline):
@@ -10,6 +10,16 @@ class DetalleVentaInline(admin.TabularInline):
     extra = 1  #muestra una fila vacia para llenar el detalle de venta
     autocomplete_fields = ['producto']
 
+    #las lineas de una venta completada ya estan en los resumenes mensuales
+    def has_add_permission(self, request, obj=None):
+        return super().has_add_permission(request, obj) and not (obj and obj.estado == 'completado')
+
+    def has_change_permission(self, request, obj=None):
+        return super().has_change_permission(request, obj) and not (obj and obj.estado == 'completado')
+
+    def has_delete_permission(self, request, obj=None):
+        return super().has_delete_permission(request, obj) and not (obj and obj.estado == 'completado')
+
 class DetalleCompraInline(admin.TabularInline):
     model = DetalleCompra
     extra = 1 #muestra una fila vacia para llenar el detalle de compra
@@ -42,7 +52,7 @@ class VentaAdmin(admin.ModelAdmin):
     list_display = ('numero_pedido', 'fecha', 'cliente', 'estado', 'total')
     list_filter = ('estado', 'fecha')
     inlines = [DetalleVentaInline] #esto permite agregar la fila para llenar productos en la misma pagina de venta
-    readonly_fields = ('fecha',)
+    readonly_fields = ('fecha', 'estado', 'total') #estado y total cambian con finalizar_venta, que actualiza los resumenes
 
 @admin.register(Compra)
 class CompraAdmin(admin.ModelAdmin):
@@ -54,4 +64,10 @@ class CompraAdmin(admin.ModelAdmin):
 @admin.register(MovimientoInventario)
 class MovimientoInventarioAdmin(admin.ModelAdmin):
     list_display = ('fecha', 'tipo', 'producto', 'cantidad')
-    list_filter = ('tipo',)
\ No newline at end of file
+    list_filter = ('tipo',)
+
+@admin.register(TokenAcceso)
+class TokenAccesoAdmin(admin.ModelAdmin):
+    list_display = ('usuario', 'nombre', 'creado', 'expira')
+    search_fields = ('usuario__username',)
+    readonly_fields = ('clave_hash', 'creado') #borrar un token lo revoca
@@ -1,45 +1,191 @@
 from rest_framework.viewsets import ReadOnlyModelViewSet
 from rest_framework.views import APIView
 from rest_framework.response import Response
-from rest_framework.status import HTTP_200_OK, HTTP_400_BAD_REQUEST
-from rest_framework.permissions import AllowAny
+from rest_framework.status import HTTP_200_OK, HTTP_201_CREATED, HTTP_204_NO_CONTENT, HTTP_400_BAD_REQUEST, HTTP_422_UNPROCESSABLE_ENTITY
+from rest_framework.permissions import AllowAny, BasePermission, IsAuthenticated
+import hashlib
+import json
 from django.contrib.auth import authenticate
-from django.contrib.auth.models import User
-from rest_framework.authtoken.models import Token
-from .models import Cliente, Proveedor, Categoria, Producto, Venta, Compra, MovimientoInventario
+from django.db.models import Prefetch
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+from .models import Cliente, Proveedor, Categoria, Producto, Venta, DetalleVenta, Compra, DetalleCompra, MovimientoInventario
 from .serializers import (
     ClienteSerializer, ProveedorSerializer, CategoriaSerializer,
-    ProductoSerializer, VentaSerializer, CompraSerializer, MovimientoSerializer
+    ProductoSerializer, VentaSerializer, CompraSerializer, MovimientoSerializer,
+    LotePedidosSerializer
 )
+from .decorators import pertenece_a
+from .versiones import estado_version, etag_version
+from .filters import VentaFilter, CompraFilter, InventarioFilter, MovimientoFilter
+from . import pedidos, serializacion, cache_catalogo, busqueda, autenticacion
+
+class CamposMixin:
+    """
+    ?fields=a,b deja solo esos campos en la respuesta y ?expand=detalles agrega
+    las listas anidadas cuando se usa ?fields=. Sin parámetros la respuesta es
+    la de siempre.
+
+    Las listas se serializan por el camino rápido (serializacion.py): la
+    consulta pide solo las columnas de los campos pedidos y no se crean
+    objetos de modelo por fila.
+    """
+
+    def _lista_parametro(self, nombre):
+        valor = self.request.query_params.get(nombre, '')
+        return {campo.strip() for campo in valor.split(',') if campo.strip()}
+
+    def campos_pedidos(self):
+        campos = self._lista_parametro('fields')
+        if not campos:
+            return None
+        return campos | self._lista_parametro('expand')
+
+    def get_serializer_context(self):
+        contexto = super().get_serializer_context()
+        contexto['campos'] = self.campos_pedidos()
+        return contexto
+
+    def list(self, request, *args, **kwargs):
+        campos = self.campos_pedidos()
+        serializer_class = self.get_serializer_class()
+        queryset = self.filter_queryset(self.get_queryset()).prefetch_related(None)
+        cols = serializacion.columnas(serializer_class, campos)
+
+        #el paginador necesita en cada fila las columnas del orden
+        orden = []
+        if self.paginator is not None and hasattr(self.paginator, 'get_ordering'):
+            orden = [campo.lstrip('-') for campo in self.paginator.get_ordering(request, queryset, self)]
+        filas = queryset.values(*serializacion.rutas(cols, ['id'] + orden))
+
+        pagina = self.paginate_queryset(filas)
+        if pagina is None:
+            pagina = list(filas)
+        datos = serializacion.convertir_filas(pagina, cols)
+        serializacion.serializar_anidados(datos, [fila['id'] for fila in pagina], serializer_class,
+                                          queryset.model, campos)
+        if self.paginator is not None:
+            return self.get_paginated_response(datos)
+        return Response(datos)
+
+
+class VersionCondicionalMixin:
+    """
+    GET condicional por versión de datos. Cada viewset indica en
+    `modelos_version` los modelos que lee su serializer; si ninguno cambió
+    desde el ETag / Last-Modified que envía el cliente, se responde 304 sin
+    ejecutar la consulta ni el serializer.
+    """
+    modelos_version = ()
+
+    def _condicional(self, request, metodo, *args, **kwargs):
+        etag = quote_etag(etag_version(request, self.modelos_version))
+        ultima = estado_version(request, *self.modelos_version)[1]
+        ultima = int(ultima.timestamp()) if ultima else None
+        response = get_conditional_response(request, etag=etag, last_modified=ultima)
+        if response is None:
+            response = metodo(request, *args, **kwargs)
+        if response.status_code in (200, 304):
+            response['ETag'] = etag
+            if ultima:
+                response['Last-Modified'] = http_date(ultima)
+            #los datos dependen del usuario autenticado: solo cache del cliente, siempre revalidando
+            response['Cache-Control'] = 'private, no-cache'
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self._condicional(request, super().list, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self._condicional(request, super().retrieve, *args, **kwargs)
+
+
+class CacheCatalogoMixin:
+    """
+    Guarda en el cache del catálogo (cache_catalogo.py) los datos de las
+    respuestas de list/retrieve, por ruta completa con sus parámetros. Se
+    invalidan solos cuando cambia alguno de los `modelos_version`.
+    """
+
+    def _cacheado(self, request, metodo, *args, **kwargs):
+        respuestas = []
+
+        def calcular():
+            response = metodo(request, *args, **kwargs)
+            respuestas.append(response)
+            if response.status_code != HTTP_200_OK:
+                raise _NoCacheable
+            return response.data
+
+        partes = (request.get_host(), request.get_full_path(), request.accepted_renderer.format)
+        try:
+            datos = cache_catalogo.obtener(type(self).__name__, self.modelos_version, partes, calcular)
+        except _NoCacheable:
+            return respuestas[0]
+        return respuestas[0] if respuestas else Response(datos)
+
+    def list(self, request, *args, **kwargs):
+        return self._cacheado(request, super().list, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self._cacheado(request, super().retrieve, *args, **kwargs)
+
+
+class _NoCacheable(Exception):
+    """La respuesta no es un 200 y no se guarda en el cache."""
+
 
 #viewsets (controladores automaticos de la API REST)
-class ClienteViewSet(ReadOnlyModelViewSet):
+#todos paginan por cursor (ver PaginacionCursorApi) y cargan de una vez lo que lee su serializer
+#los filtros (?start_date=, ?estado=, ...) son los mismos FilterSet de los reportes
+#las listas del catalogo (proveedores, categorias, productos) se sirven desde cache (CacheCatalogoMixin)
+class ClienteViewSet(VersionCondicionalMixin, CamposMixin, ReadOnlyModelViewSet):
     queryset = Cliente.objects.all()
     serializer_class = ClienteSerializer
+    ordering = ('nombre', 'id')
+    modelos_version = (Cliente,)
 
-class ProveedorViewSet(ReadOnlyModelViewSet):
+class ProveedorViewSet(VersionCondicionalMixin, CacheCatalogoMixin, CamposMixin, ReadOnlyModelViewSet):
     queryset = Proveedor.objects.all()
     serializer_class = ProveedorSerializer
+    ordering = ('empresa', 'id')
+    modelos_version = (Proveedor,)
 
-class CategoriaViewSet(ReadOnlyModelViewSet):
+class CategoriaViewSet(VersionCondicionalMixin, CacheCatalogoMixin, CamposMixin, ReadOnlyModelViewSet):
     queryset = Categoria.objects.all()
     serializer_class = CategoriaSerializer
+    ordering = ('nombre', 'id')
+    modelos_version = (Categoria,)
 
-class ProductoViewSet(ReadOnlyModelViewSet):
-    queryset = Producto.objects.all()
+class ProductoViewSet(VersionCondicionalMixin, CacheCatalogoMixin, CamposMixin, ReadOnlyModelViewSet):
+    queryset = Producto.objects.select_related('categoria', 'proveedor')
     serializer_class = ProductoSerializer
+    filterset_class = InventarioFilter
+    ordering = ('nombre', 'id')
+    modelos_version = (Producto, Categoria, Proveedor)
 
-class VentaViewSet(ReadOnlyModelViewSet):
-    queryset = Venta.objects.all().order_by('-fecha')
+class VentaViewSet(VersionCondicionalMixin, CamposMixin, ReadOnlyModelViewSet):
+    queryset = Venta.objects.select_related('cliente').prefetch_related(
+        Prefetch('detalles', queryset=DetalleVenta.objects.select_related('producto').order_by('id')))
     serializer_class = VentaSerializer
+    filterset_class = VentaFilter
+    ordering = ('-fecha', '-id')
+    modelos_version = (Venta, Cliente, DetalleVenta, Producto)
 
-class CompraViewSet(ReadOnlyModelViewSet):
-    queryset = Compra.objects.all().order_by('-fecha')
+class CompraViewSet(VersionCondicionalMixin, CamposMixin, ReadOnlyModelViewSet):
+    queryset = Compra.objects.select_related('proveedor').prefetch_related(
+        Prefetch('detalles', queryset=DetalleCompra.objects.select_related('producto').order_by('id')))
     serializer_class = CompraSerializer
+    filterset_class = CompraFilter
+    ordering = ('-fecha', '-id')
+    modelos_version = (Compra, Proveedor, DetalleCompra, Producto)
 
-class MovimientoViewSet(ReadOnlyModelViewSet):
-    queryset = MovimientoInventario.objects.all().order_by('-fecha')
+class MovimientoViewSet(VersionCondicionalMixin, CamposMixin, ReadOnlyModelViewSet):
+    queryset = MovimientoInventario.objects.select_related('producto', 'venta_asociada', 'compra_asociada')
     serializer_class = MovimientoSerializer
+    filterset_class = MovimientoFilter
+    ordering = ('-fecha', '-id')
+    modelos_version = (MovimientoInventario, Producto, Venta, Compra)
 
 
 class LoginView(APIView):
@@ -63,13 +209,101 @@ class LoginView(APIView):
                 status=HTTP_400_BAD_REQUEST
             )
 
-        # Eliminar token anterior si existe y crear uno nuevo en cada login
-        Token.objects.filter(user=user).delete()
-        token = Token.objects.create(user=user)
+        #un token nuevo por dispositivo; los de otros dispositivos siguen validos
+        token, registro = autenticacion.crear_token(user, nombre=request.headers.get('User-Agent', ''))
 
         return Response({
-            'token': token.key,
+            'token': token,
+            'expira': registro.expira,
             'user_id': user.id,
             'username': user.username,
             'email': user.email,
-        }, status=HTTP_200_OK)
\ No newline at end of file
+        }, status=HTTP_200_OK)
+
+
+class LogoutView(APIView):
+    """
+    Revoca el token con el que se hizo la petición, o todos los del usuario
+    con {"todos": true}.
+    """
+
+    def post(self, request):
+        if request.data.get('todos'):
+            autenticacion.revocar_tokens_usuario(request.user)
+        elif isinstance(request.auth, str):
+            autenticacion.revocar_token(request.auth)
+        return Response(status=HTTP_204_NO_CONTENT)
+
+
+class EsVendedor(BasePermission):
+    """Solo administradores y vendedores registran pedidos."""
+
+    def has_permission(self, request, view):
+        return pertenece_a(request.user, 'administrador', 'vendedor')
+
+
+class PedidosView(APIView):
+    """
+    Registra pedidos completos (cabecera y líneas) en una sola petición.
+
+    Acepta un pedido {"cliente": 1, "finalizar": false, "lineas": [{"producto": 3,
+    "cantidad": 2}]} o un lote {"pedidos": [...]}. Todo el lote se registra en
+    una transacción. El encabezado Idempotency-Key hace seguros los reintentos.
+    """
+    permission_classes = [IsAuthenticated, EsVendedor]
+
+    def post(self, request):
+        lote = isinstance(request.data, dict) and 'pedidos' in request.data
+        serializer = LotePedidosSerializer(data=request.data if lote else {'pedidos': [request.data]})
+        if not serializer.is_valid():
+            errores = serializer.errors
+            if not lote and isinstance(errores.get('pedidos'), list):
+                errores = errores['pedidos'][0]
+            return Response(errores, status=HTTP_400_BAD_REQUEST)
+
+        clave = request.headers.get('Idempotency-Key')
+        huella = hashlib.sha256(json.dumps(request.data, sort_keys=True, default=str).encode()).hexdigest()
+        try:
+            resultado, repetido = pedidos.registrar_pedidos(
+                serializer.validated_data['pedidos'], request.user, clave=clave, huella=huella)
+        except pedidos.PedidosInvalidos as error:
+            return Response({'pedidos': error.errores} if lote else error.errores[0], status=HTTP_400_BAD_REQUEST)
+        except pedidos.ClaveReutilizada as error:
+            return Response({'error': str(error)}, status=HTTP_422_UNPROCESSABLE_ENTITY)
+
+        response = Response({'pedidos': resultado} if lote else resultado[0], status=HTTP_201_CREATED)
+        if repetido:
+            response['Idempotent-Replayed'] = 'true'
+        return response
+
+
+class BusquedaView(APIView):
+    """
+    Búsqueda por texto con el índice en memoria (busqueda.py), ordenada por
+    parecido: primero los que contienen el texto, después los aproximados.
+
+    GET /api/buscar/?q=martillo&tipo=productos,clientes&limite=10
+    """
+    LIMITE_MAXIMO = 100
+
+    def get(self, request):
+        consulta = request.query_params.get('q', '').strip()
+        tipos = [tipo for tipo in request.query_params.get('tipo', '').split(',') if tipo] or list(busqueda.INDICES)
+        desconocidos = [tipo for tipo in tipos if tipo not in busqueda.INDICES]
+        if desconocidos:
+            return Response({'tipo': [f'Tipos válidos: {", ".join(busqueda.INDICES)}.']}, status=HTTP_400_BAD_REQUEST)
+        try:
+            limite = min(int(request.query_params.get('limite', busqueda.LIMITE)), self.LIMITE_MAXIMO)
+        except ValueError:
+            return Response({'limite': ['Debe ser un número.']}, status=HTTP_400_BAD_REQUEST)
+
+        resultado = {}
+        for tipo in tipos:
+            indice = busqueda.INDICES[tipo]
+            encontrados = busqueda.buscar(tipo, consulta, max(limite, 1)) if consulta else []
+            filas = indice.modelo.objects.only(*indice.campos).in_bulk([pk for pk, _ in encontrados]) if encontrados else {}
+            resultado[tipo] = [
+                dict({campo: getattr(filas[pk], campo) for campo in indice.campos}, id=pk, puntaje=puntaje)
+                for pk, puntaje in encontrados if pk in filas
+            ]
+        return Response(resultado)
@@ -0,0 +1,70 @@
+"""
+Tiempo de arranque de un worker: cargar Django, las URLs (todas las vistas)
+y atender el primer request, medido en un proceso nuevo con
+`python -X importtime`.
+
+Los módulos de MODULOS_DIFERIDOS (ReportLab, pypdf) solo se usan al
+exportar y se importan en esas funciones: no deben cargarse al arrancar.
+El comando `benchmark_arranque` muestra la medición y ArranqueTests hace
+cumplir ARRANQUE_PRESUPUESTO_MS.
+"""
+import json
+import os
+import subprocess
+import sys
+
+from django.conf import settings
+
+MODULOS_DIFERIDOS = ('reportlab', 'pypdf')
+
+#lo que hace un worker al arrancar, en un interprete nuevo
+PROGRAMA = '''
+import json, sys, time
+inicio = time.perf_counter()
+import django
+django.setup()
+from django.urls import get_resolver
+get_resolver().url_patterns
+cargado = time.perf_counter()
+primer_request = None
+if sys.argv[1] == '1':
+    from django.test import Client
+    Client().get('/')
+    primer_request = (time.perf_counter() - inicio) * 1000
+print(json.dumps({
+    'arranque_ms': (cargado - inicio) * 1000,
+    'primer_request_ms': primer_request,
+    'modulos': len(sys.modules),
+    'diferidos': sorted({nombre.split('.')[0] for nombre in sys.modules} & set(sys.argv[2:])),
+}))
+'''
+
+
+def _importtime(salida):
+    """Milisegundos de importación propios de cada paquete (suma por nombre de primer nivel)."""
+    paquetes = {}
+    for linea in salida.splitlines():
+        if not linea.startswith('import time:') or 'self [us]' in linea:
+            continue
+        propio, _, modulo = linea[len('import time:'):].split('|')
+        paquete = modulo.strip().split('.')[0]
+        paquetes[paquete] = paquetes.get(paquete, 0) + int(propio) / 1000
+    return paquetes
+
+
+def medir(primer_request=True):
+    """
+    Arranca un proceso nuevo y devuelve arranque_ms (django.setup() y URLs),
+    primer_request_ms, la cantidad de módulos cargados, los MODULOS_DIFERIDOS
+    que se cargaron igual y los ms de importación por paquete.
+    """
+    proceso = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', PROGRAMA, '1' if primer_request else '0', *MODULOS_DIFERIDOS],
+        capture_output=True, text=True, cwd=settings.BASE_DIR, timeout=120,
+        env={**os.environ, 'DJANGO_SETTINGS_MODULE': os.environ.get('DJANGO_SETTINGS_MODULE', 'gestion_empresarial_project.settings')},
+    )
+    if proceso.returncode != 0:
+        raise RuntimeError(f'No arrancó el proceso de medición:\n{proceso.stderr[-2000:]}')
+    medicion = json.loads(proceso.stdout.strip().splitlines()[-1])
+    medicion['paquetes_ms'] = _importtime(proceso.stderr)
+    return medicion
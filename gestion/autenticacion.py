@@ -0,0 +1,140 @@
+"""
+Autenticación de la API con tokens de acceso (TokenAcceso).
+
+Cada inicio de sesión crea un token nuevo, así un usuario puede tener varios
+dispositivos conectados. Los tokens vencen (TOKEN_DURACION_HORAS) y en la
+base solo se guarda su sha256: quien lea la tabla no obtiene tokens válidos.
+
+Resolver un token no toca la base en el caso normal: el usuario queda en el
+cache de Django bajo el hash del token hasta que el token vence o pasan
+CACHE_TOKENS_SEGUNDOS. Al cerrar sesión, revocar un token o modificar el
+usuario (contraseña, activo, ...) se borran sus entradas del cache. Esas
+invalidaciones solo llegan a los demás workers si el backend de cache es
+compartido: con locmem (el de por defecto) cada proceso tiene su propio
+cache, así que ahí los tokens se guardan solo CACHE_TOKENS_SEGUNDOS_LOCAL
+segundos y una revocación tarda a lo sumo eso en valer en todos lados.
+
+Los clientes envían el encabezado `Authorization: Token <token>` (como con
+el TokenAuthentication de DRF) o `Authorization: Bearer <token>`.
+"""
+import hashlib
+import secrets
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import transaction
+from django.utils import timezone
+from rest_framework import exceptions
+from rest_framework.authentication import BaseAuthentication, get_authorization_header
+
+from .models import TokenAcceso
+
+PREFIJO_CACHE_TOKENS = 'gestion:token:'
+DURACION_TOKEN = timedelta(hours=getattr(settings, 'TOKEN_DURACION_HORAS', 24 * 7))
+PALABRAS_CLAVE = (b'token', b'bearer')
+
+
+def hash_token(token):
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+def _clave_cache(clave_hash):
+    return PREFIJO_CACHE_TOKENS + clave_hash
+
+
+def tiempo_cache_tokens():
+    """Segundos que un token queda en cache; pocos si el cache no es compartido."""
+    if isinstance(caches['default'], LocMemCache):
+        return getattr(settings, 'CACHE_TOKENS_SEGUNDOS_LOCAL', 5)
+    return getattr(settings, 'CACHE_TOKENS_SEGUNDOS', 300)
+
+
+def crear_token(usuario, nombre='', duracion=None):
+    """
+    Crea un token para `usuario` y devuelve (token, registro). El token en
+    claro solo existe en este momento; hay que entregárselo al cliente.
+    """
+    #de paso se limpian los vencidos de este usuario
+    TokenAcceso.objects.filter(usuario=usuario, expira__lte=timezone.now()).delete()
+    token = secrets.token_urlsafe(32)
+    registro = TokenAcceso.objects.create(
+        usuario=usuario, clave_hash=hash_token(token), nombre=nombre[:100],
+        expira=timezone.now() + (duracion or DURACION_TOKEN),
+    )
+    return token, registro
+
+
+def invalidar_cache(*hashes):
+    """Borra del cache los tokens indicados, ya y otra vez al confirmar."""
+    claves = [_clave_cache(clave_hash) for clave_hash in hashes]
+    if claves:
+        cache.delete_many(claves)
+        #de nuevo al confirmar, por si otro request lo volvio a cargar antes del commit
+        transaction.on_commit(lambda: cache.delete_many(claves))
+
+
+def invalidar_usuario(usuario_id):
+    """Quita del cache todos los tokens del usuario (por ejemplo si cambió su contraseña)."""
+    invalidar_cache(*TokenAcceso.objects.filter(usuario_id=usuario_id).values_list('clave_hash', flat=True))
+
+
+#al borrar un TokenAcceso (aqui, en el admin o en cascada) signals.py lo quita del cache
+def revocar_token(token):
+    """Revoca un token (cerrar sesión en un dispositivo)."""
+    TokenAcceso.objects.filter(clave_hash=hash_token(token)).delete()
+
+
+def revocar_tokens_usuario(usuario):
+    """Revoca todos los tokens del usuario (cerrar sesión en todos lados)."""
+    TokenAcceso.objects.filter(usuario=usuario).delete()
+
+
+def usuario_de_token(token):
+    """
+    Usuario dueño de `token`, o None si no existe, venció o el usuario está
+    inactivo. Busca primero en el cache.
+    """
+    clave_hash = hash_token(token)
+    entrada = cache.get(_clave_cache(clave_hash))
+    if entrada is not None:
+        usuario, expira = entrada
+        if expira > time.time():
+            return usuario
+        cache.delete(_clave_cache(clave_hash))
+        return None
+
+    registro = (TokenAcceso.objects.select_related('usuario')
+                .filter(clave_hash=clave_hash, expira__gt=timezone.now()).first())
+    if registro is None or not registro.usuario.is_active:
+        return None
+    expira = registro.expira.timestamp()
+    segundos = min(tiempo_cache_tokens(), int(expira - time.time()))
+    if segundos > 0:
+        cache.set(_clave_cache(clave_hash), (registro.usuario, expira), segundos)
+    return registro.usuario
+
+
+class TokenAccesoAuthentication(BaseAuthentication):
+    """Autenticación de DRF con TokenAcceso; `request.auth` es el token en claro."""
+
+    def authenticate(self, request):
+        partes = get_authorization_header(request).split()
+        if not partes or partes[0].lower() not in PALABRAS_CLAVE:
+            return None
+        if len(partes) != 2:
+            raise exceptions.AuthenticationFailed('Encabezado de token inválido.')
+        try:
+            token = partes[1].decode()
+        except UnicodeError:
+            raise exceptions.AuthenticationFailed('Encabezado de token inválido.')
+
+        usuario = usuario_de_token(token)
+        if usuario is None:
+            raise exceptions.AuthenticationFailed('Token inválido o vencido.')
+        return usuario, token
+
+    def authenticate_header(self, request):
+        return 'Token'
@@ -0,0 +1,241 @@
+"""
+Índice de búsqueda en memoria por trigramas (productos, clientes, proveedores).
+
+Cada proceso arma, la primera vez que se busca, un índice invertido
+{trigrama: ids} con los textos de cada modelo (ver INDICES). Una búsqueda
+junta los ids que comparten trigramas con el texto buscado y los ordena por
+parecido, sin recorrer la tabla con LIKE '%x%'.
+
+El índice se mantiene al día desde las señales de guardado y borrado (se
+aplica el cambio al confirmar la transacción). Los caminos masivos sin
+señales (QuerySet.update, bulk_create, bulk_update) avisan con
+cambio_masivo() si tocan un campo indexado (ver QuerySetBusqueda en
+models.py). Cada índice guarda además la versión de datos con la que está
+sincronizado (VersionModelo 'busqueda:...', ver versiones.py); si otro
+proceso cambió los datos, la versión no coincide y el índice se vuelve a
+armar en un hilo aparte mientras las búsquedas siguen usando el anterior.
+Solo la primera vez (o si el índice se armó dentro de una transacción) se
+arma mientras la búsqueda espera.
+"""
+import threading
+import unicodedata
+from collections import Counter
+
+from django.db import connection, transaction
+
+from .models import Cliente, Producto, Proveedor
+from .versiones import incrementar_version, versiones
+
+#parecido minimo para que un resultado aproximado se incluya
+UMBRAL = 0.3
+LIMITE = 20
+
+
+def normalizar(texto):
+    """Minúsculas, sin tildes y con un solo espacio entre palabras."""
+    texto = unicodedata.normalize('NFKD', texto or '')
+    texto = ''.join(letra for letra in texto if not unicodedata.combining(letra))
+    return ' '.join(texto.lower().split())
+
+
+def trigramas(texto):
+    """Trigramas de cada palabra, con relleno al inicio (como pg_trgm)."""
+    grupos = set()
+    for palabra in texto.split():
+        palabra = f'  {palabra} '
+        grupos.update(palabra[i:i + 3] for i in range(len(palabra) - 2))
+    return grupos
+
+
+class Indice:
+    """Índice de un modelo sobre los campos `campos`."""
+
+    def __init__(self, modelo, campos):
+        self.modelo = modelo
+        self.campos = campos
+        self.etiqueta = f'busqueda:{modelo._meta.label_lower}'
+        #None: no hay un indice armado con datos confirmados
+        self.version = None
+        self.textos = {}
+        self.por_campo = {}
+        self.grupos = {}
+        self.por_trigrama = {}
+        self.candado = threading.RLock()
+        self.hilo = None
+
+    def _agregar(self, pk, valores):
+        #un texto por campo (para filtrar por uno solo) y todos juntos para buscar
+        por_campo = tuple(normalizar(str(valor)) if valor else '' for valor in valores)
+        texto = ' '.join(campo for campo in por_campo if campo)
+        grupos = trigramas(texto)
+        self.por_campo[pk] = por_campo
+        self.textos[pk] = texto
+        self.grupos[pk] = len(grupos)
+        for grupo in grupos:
+            self.por_trigrama.setdefault(grupo, set()).add(pk)
+
+    def _quitar(self, pk):
+        texto = self.textos.pop(pk, None)
+        self.por_campo.pop(pk, None)
+        self.grupos.pop(pk, None)
+        if texto is not None:
+            for grupo in trigramas(texto):
+                ids = self.por_trigrama.get(grupo)
+                if ids is not None:
+                    ids.discard(pk)
+                    if not ids:
+                        del self.por_trigrama[grupo]
+
+    def _armar(self, version):
+        """Lee la tabla en un índice nuevo (sin el candado) y lo pone en lugar del actual."""
+        nuevo = Indice(self.modelo, self.campos)
+        for pk, *valores in self.modelo.objects.values_list('pk', *self.campos).iterator(chunk_size=2000):
+            nuevo._agregar(pk, valores)
+        with self.candado:
+            self.textos, self.por_campo = nuevo.textos, nuevo.por_campo
+            self.grupos, self.por_trigrama = nuevo.grupos, nuevo.por_trigrama
+            #dentro de una transaccion se pudo leer algo que no se confirme: no se conserva la version
+            self.version = None if connection.in_atomic_block else version
+
+    def _armar_en_segundo_plano(self, version):
+        try:
+            self._armar(version)
+        finally:
+            connection.close()
+
+    def vigente(self):
+        """
+        Pone al día el índice si los datos cambiaron desde la última vez. Si ya
+        hay uno armado con datos confirmados, lo arma de nuevo en otro hilo y
+        mientras tanto se sigue usando el anterior.
+        """
+        version = versiones(self.etiqueta)[self.etiqueta]
+        if version == self.version:
+            return self
+        with self.candado:
+            if version == self.version:
+                return self
+            #un hilo no ve lo que esta transaccion todavia no confirmo: ahi se arma aca mismo
+            if self.version is not None and not connection.in_atomic_block:
+                if self.hilo is None or not self.hilo.is_alive():
+                    self.hilo = threading.Thread(target=self._armar_en_segundo_plano, args=(version,), daemon=True)
+                    self.hilo.start()
+                return self
+            self._armar(version)
+        return self
+
+    def descartar(self):
+        """Olvida el índice armado: la próxima búsqueda lo vuelve a armar."""
+        with self.candado:
+            self.version = None
+            self.textos, self.por_campo, self.grupos, self.por_trigrama = {}, {}, {}, {}
+
+    def aplicar(self, pk, valores, version_anterior, version_nueva):
+        """
+        Aplica el cambio de una fila ya confirmada (`valores` None si se borró).
+        Si la versión no pasó justo de `version_anterior` a la siguiente, hubo
+        otros cambios (de otro proceso o de la misma transacción): la versión
+        del índice queda atrás y la próxima búsqueda lo vuelve a armar.
+        """
+        with self.candado:
+            if self.version is None:
+                return
+            self._quitar(pk)
+            if valores is not None:
+                self._agregar(pk, valores)
+            if self.version == version_anterior and version_nueva == version_anterior + 1:
+                self.version = version_nueva
+
+    def buscar(self, consulta, limite=LIMITE, umbral=UMBRAL):
+        """
+        Ids ordenados por parecido con `consulta`, como [(id, puntaje)]. Los
+        que contienen el texto buscado van primero (antes los que empiezan
+        con él); después, los aproximados con parecido mayor a `umbral`.
+        """
+        consulta = normalizar(consulta)
+        if not consulta:
+            return []
+        grupos = trigramas(consulta)
+        with self.candado:
+            comunes = Counter()
+            for grupo in grupos:
+                comunes.update(self.por_trigrama.get(grupo, ()))
+            resultados = []
+            for pk, cantidad in comunes.items():
+                texto = self.textos[pk]
+                parecido = cantidad / (len(grupos) + self.grupos[pk] - cantidad)
+                if consulta in texto:
+                    prefijo = texto.startswith(consulta) or f' {consulta}' in texto
+                    puntaje = 2 + prefijo + parecido
+                elif parecido >= umbral:
+                    puntaje = parecido
+                else:
+                    continue
+                resultados.append((pk, round(puntaje, 3)))
+        resultados.sort(key=lambda par: (-par[1], par[0]))
+        return resultados[:limite] if limite else resultados
+
+    def contienen(self, campo, consulta):
+        """
+        Ids cuyo `campo` contiene `consulta` (lo mismo que icontains, sin
+        distinguir tildes). Los candidatos salen de los trigramas comunes a
+        todas las palabras.
+        """
+        posicion = self.campos.index(campo)
+        consulta = normalizar(consulta)
+        with self.candado:
+            grupos = trigramas(consulta)
+            #una palabra de menos de 3 letras puede estar en medio de otra: no hay trigrama seguro
+            if min(len(palabra) for palabra in consulta.split() or ['']) < 3:
+                candidatos = self.textos
+            else:
+                #solo los trigramas internos de cada palabra (los del borde dependen de donde empieza)
+                internos = {grupo for grupo in grupos if ' ' not in grupo}
+                candidatos = set.intersection(*(self.por_trigrama.get(g, set()) for g in internos)) \
+                    if internos else self.textos
+            return [pk for pk in candidatos if consulta in self.por_campo[pk][posicion]]
+
+
+INDICES = {
+    'productos': Indice(Producto, ('codigo', 'nombre')),
+    'clientes': Indice(Cliente, ('nombre', 'correo')),
+    'proveedores': Indice(Proveedor, ('empresa',)),
+}
+POR_MODELO = {indice.modelo: indice for indice in INDICES.values()}
+
+
+def buscar(tipo, consulta, limite=LIMITE):
+    """[(id, puntaje)] de INDICES[tipo] para `consulta`."""
+    return INDICES[tipo].vigente().buscar(consulta, limite)
+
+
+def ids_que_contienen(modelo, campo, consulta):
+    """Ids de `modelo` cuyo `campo` (uno de los indexados) contiene `consulta`."""
+    return POR_MODELO[modelo].vigente().contienen(campo, consulta)
+
+
+def cambio_masivo(modelo, campos=None):
+    """
+    Llamado después de un update/bulk_create/bulk_update sin señales: si
+    `modelo` está indexado y `campos` (None = todos) incluye alguno de los
+    indexados, sube su versión de búsqueda y los índices se vuelven a armar.
+    """
+    indice = POR_MODELO.get(modelo)
+    if indice is not None and (campos is None or set(campos) & set(indice.campos)):
+        incrementar_version(indice.etiqueta)
+
+
+def registrar_cambio(modelo, instancia, borrado=False):
+    """
+    Llamado desde las señales: sube la versión de búsqueda del modelo y
+    aplica el cambio al índice de este proceso cuando la transacción se
+    confirma.
+    """
+    indice = POR_MODELO[modelo]
+    anterior = versiones(indice.etiqueta)[indice.etiqueta]
+    incrementar_version(indice.etiqueta)
+    valores = None if borrado else [getattr(instancia, campo) for campo in indice.campos]
+    pk = instancia.pk
+
+    transaction.on_commit(
+        lambda: indice.aplicar(pk, valores, anterior, versiones(indice.etiqueta)[indice.etiqueta]))
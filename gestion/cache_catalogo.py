@@ -0,0 +1,123 @@
+"""
+Cache de lecturas del catálogo (categorías, proveedores y productos).
+
+Los valores se guardan en el cache de Django con una clave que incluye los
+parámetros de la lectura y la "generación" de cada modelo del que dependen.
+Cada vez que uno de esos modelos cambia (señales o caminos masivos, ver
+versiones.incrementar_version) su generación sube y las claves viejas dejan
+de usarse: la invalidación es exacta y no hace falta recorrer claves.
+
+Cuando un valor vence, un solo proceso lo recalcula (el que consigue el
+candado con cache.add) mientras los demás siguen sirviendo el valor anterior.
+Si no hay ningún valor, los demás esperan a que el primero termine en vez de
+lanzar todos la misma consulta.
+
+Con varios workers el backend de cache debe ser compartido (archivos, Redis o
+Memcached) para que las invalidaciones lleguen a todos.
+"""
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+PREFIJO = 'gestion:catalogo:'
+#segundos que un valor se considera fresco, y cuanto mas se puede servir vencido
+TIEMPO = getattr(settings, 'CACHE_CATALOGO_SEGUNDOS', 300)
+GRACIA = getattr(settings, 'CACHE_CATALOGO_GRACIA', 60)
+#cuanto espera un proceso a que otro termine de calcular el mismo valor
+ESPERA_MAXIMA = 5.0
+
+
+def _etiqueta(modelo):
+    return modelo if isinstance(modelo, str) else modelo._meta.label_lower
+
+
+def _clave_generacion(modelo):
+    return f'{PREFIJO}gen:{_etiqueta(modelo)}'
+
+
+def generaciones(*modelos):
+    """Generación actual de cada modelo."""
+    claves = [_clave_generacion(modelo) for modelo in modelos]
+    valores = cache.get_many(claves)
+    faltan = [clave for clave in claves if clave not in valores]
+    if faltan:
+        #si se perdio una generacion no puede volver a un numero ya usado
+        for clave in faltan:
+            cache.add(clave, time.time_ns(), None)
+        valores.update(cache.get_many(faltan))
+    return [valores.get(clave, 0) for clave in claves]
+
+
+def invalidar(*modelos):
+    """Sube la generación de los modelos: sus valores cacheados dejan de usarse."""
+    for modelo in modelos:
+        clave = _clave_generacion(modelo)
+        try:
+            cache.incr(clave)
+        except ValueError:
+            cache.set(clave, time.time_ns(), None)
+
+
+def invalidar_al_confirmar(*modelos):
+    """
+    Invalida ya y otra vez al confirmar la transacción, por si otro proceso
+    volvió a cachear los datos viejos antes del commit.
+    """
+    invalidar(*modelos)
+    transaction.on_commit(lambda: invalidar(*modelos))
+
+
+def _recalcular(clave, calcular):
+    try:
+        valor = calcular()
+        cache.set(clave, (valor, time.time() + TIEMPO), TIEMPO + GRACIA)
+        return valor
+    finally:
+        cache.delete(clave + ':candado')
+
+
+def _tomar_candado(clave):
+    return cache.add(clave + ':candado', 1, int(ESPERA_MAXIMA * 2))
+
+
+def obtener(nombre, modelos, partes, calcular):
+    """
+    Devuelve el valor cacheado de `nombre` para `partes` (parámetros de la
+    lectura), o lo calcula con `calcular()`. `modelos` son los modelos de los
+    que depende el valor. El valor debe poder guardarse en el cache (pickle).
+    """
+    huella = hashlib.sha1(repr(partes).encode()).hexdigest()
+    version = '-'.join(map(str, generaciones(*modelos)))
+    clave = f'{PREFIJO}{nombre}:{version}:{huella}'
+
+    entrada = cache.get(clave)
+    if entrada is not None:
+        valor, vence = entrada
+        if vence > time.time() or not _tomar_candado(clave):
+            #fresco, o vencido pero otro proceso ya lo esta recalculando
+            return valor
+        return _recalcular(clave, calcular)
+
+    if _tomar_candado(clave):
+        return _recalcular(clave, calcular)
+
+    #otro proceso lo esta calculando: se espera su resultado
+    limite = time.monotonic() + ESPERA_MAXIMA
+    while time.monotonic() < limite:
+        time.sleep(0.02)
+        entrada = cache.get(clave)
+        if entrada is not None:
+            return entrada[0]
+    return calcular()
+
+
+def opciones_categorias():
+    """(id, nombre) de las categorías para los selects de filtros."""
+    from .models import Categoria
+
+    return obtener('opciones_categorias', ('gestion.categoria',), (), lambda: [
+        (str(pk), nombre) for pk, nombre in Categoria.objects.order_by('nombre').values_list('pk', 'nombre')
+    ])
@@ -0,0 +1,10 @@
+from .decorators import grupos_usuario
+
+
+def roles(request):
+    """
+    Expone los grupos del usuario a las plantillas usando el mismo cache que
+    los decoradores, en lugar de consultar `user.groups` en cada página.
+    """
+    user = getattr(request, 'user', None)
+    return {'grupos_usuario': grupos_usuario(user) if user is not None else ()}
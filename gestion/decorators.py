@@ -1,15 +1,112 @@
 """
 Decoradores personalizados para control de acceso basado en grupos (RBAC).
+
+Los grupos de cada usuario se leen una sola vez por request y se guardan en
+el cache de Django (compartido entre procesos si el backend lo es), así las
+vistas decoradas y las plantillas no consultan la base de datos en cada
+request. signals.py invalida la entrada cuando cambian los grupos del usuario
+o cuando se renombra o elimina un grupo.
 """
 from functools import wraps
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.conf import settings
 from django.contrib.auth.decorators import login_required
+from django.core.cache import cache
 from django.shortcuts import redirect
+from django.views.decorators.http import condition
 from django.contrib import messages
 
+PREFIJO_CACHE_GRUPOS = 'gestion:grupos:'
+TIEMPO_CACHE_GRUPOS = getattr(settings, 'CACHE_GRUPOS_SEGUNDOS', 300)
+
+
+def _clave_grupos(user_id):
+    return f'{PREFIJO_CACHE_GRUPOS}{user_id}'
+
+
+def grupos_usuario(user):
+    """
+    Devuelve los nombres de los grupos del usuario (en orden de creación).
+    """
+    if not user.is_authenticated:
+        return ()
+
+    #primero el valor ya cargado en este request
+    grupos = getattr(user, '_grupos_cache', None)
+    if grupos is None:
+        clave = _clave_grupos(user.pk)
+        grupos = cache.get(clave)
+        if grupos is None:
+            grupos = tuple(user.groups.order_by('pk').values_list('name', flat=True))
+            cache.set(clave, grupos, TIEMPO_CACHE_GRUPOS)
+        user._grupos_cache = grupos
+    return grupos
+
+
+async def agrupos_usuario(user):
+    """grupos_usuario() para vistas async (cache y consulta asincrónicos)."""
+    if not user.is_authenticated:
+        return ()
+
+    grupos = getattr(user, '_grupos_cache', None)
+    if grupos is None:
+        clave = _clave_grupos(user.pk)
+        grupos = await cache.aget(clave)
+        if grupos is None:
+            grupos = tuple([nombre async for nombre in user.groups.order_by('pk').values_list('name', flat=True)])
+            await cache.aset(clave, grupos, TIEMPO_CACHE_GRUPOS)
+        user._grupos_cache = grupos
+    return grupos
+
+
+def pertenece_a(user, *grupos):
+    """Indica si el usuario pertenece a alguno de los grupos indicados."""
+    return not set(grupos).isdisjoint(grupos_usuario(user))
+
+
+async def apertenece_a(user, *grupos):
+    return not set(grupos).isdisjoint(await agrupos_usuario(user))
+
+
+def invalidar_grupos(*user_ids):
+    """Borra del cache los grupos de los usuarios indicados."""
+    cache.delete_many([_clave_grupos(user_id) for user_id in user_ids])
+
+
+def _restringir(vista, grupos, mensaje):
+    """
+    Envuelve `vista` (sincrónica o async) para que solo entren los usuarios
+    de alguno de `grupos`; a los demás se les muestra `mensaje`.
+    """
+    if iscoroutinefunction(vista):
+        @wraps(vista)
+        @login_required
+        async def wrapper_async(request, *args, **kwargs):
+            if await apertenece_a(await request.auser(), *grupos):
+                return await vista(request, *args, **kwargs)
+
+            messages.error(request, mensaje)
+            return redirect('inicio')
+
+        return wrapper_async
+
+    @wraps(vista)
+    @login_required
+    def wrapper(request, *args, **kwargs):
+        if pertenece_a(request.user, *grupos):
+            return vista(request, *args, **kwargs)
+
+        # Si no tiene permisos, mostrar mensaje y redirigir
+        messages.error(request, mensaje)
+        return redirect('inicio')
+
+    return wrapper
+
 
 def grupo_requerido(*grupos):
     """
     Decorador que verifica si el usuario pertenece a uno de los grupos especificados.
+    Sirve también para vistas async.
 
     Uso:
         @grupo_requerido('vendedor')
@@ -17,22 +114,11 @@ def grupo_requerido(*grupos):
             ...
 
         @grupo_requerido('administrador', 'gerente')
-        def otra_vista(request):
+        async def otra_vista(request):
             ...
     """
     def decorador(vista):
-        @wraps(vista)
-        @login_required
-        def wrapper(request, *args, **kwargs):
-            # Verificar si el usuario pertenece a alguno de los grupos requeridos
-            if request.user.groups.filter(name__in=grupos).exists():
-                return vista(request, *args, **kwargs)
-
-            # Si no tiene permisos, mostrar mensaje y redirigir
-            messages.error(request, 'No tiene permiso para acceder a esta página.')
-            return redirect('inicio')
-
-        return wrapper
+        return _restringir(vista, grupos, 'No tiene permiso para acceder a esta página.')
     return decorador
 
 
@@ -40,77 +126,106 @@ def solo_administrador(vista):
     """
     Decorador que solo permite acceso al grupo 'administrador'.
     """
-    @wraps(vista)
-    @login_required
-    def wrapper(request, *args, **kwargs):
-        if request.user.groups.filter(name='administrador').exists():
-            return vista(request, *args, **kwargs)
-
-        messages.error(request, 'Solo administradores pueden acceder aquí.')
-        return redirect('inicio')
-
-    return wrapper
+    return _restringir(vista, ('administrador',), 'Solo administradores pueden acceder aquí.')
 
 
 def solo_vendedor(vista):
     """
     Decorador que solo permite acceso al grupo 'vendedor'.
     """
-    @wraps(vista)
-    @login_required
-    def wrapper(request, *args, **kwargs):
-        if request.user.groups.filter(name='vendedor').exists():
-            return vista(request, *args, **kwargs)
-
-        messages.error(request, 'Solo vendedores pueden acceder aquí.')
-        return redirect('inicio')
-
-    return wrapper
+    return _restringir(vista, ('vendedor',), 'Solo vendedores pueden acceder aquí.')
 
 
 def solo_comprador(vista):
     """
     Decorador que solo permite acceso al grupo 'comprador'.
     """
-    @wraps(vista)
-    @login_required
-    def wrapper(request, *args, **kwargs):
-        if request.user.groups.filter(name='comprador').exists():
-            return vista(request, *args, **kwargs)
-
-        messages.error(request, 'Solo compradores pueden acceder aquí.')
-        return redirect('inicio')
-
-    return wrapper
+    return _restringir(vista, ('comprador',), 'Solo compradores pueden acceder aquí.')
 
 
 def administrador_o_vendedor(vista):
     """
     Decorador que permite acceso a administrador o vendedor.
     """
-    @wraps(vista)
-    @login_required
-    def wrapper(request, *args, **kwargs):
-        if request.user.groups.filter(name__in=['administrador', 'vendedor']).exists():
-            return vista(request, *args, **kwargs)
-
-        messages.error(request, 'No tiene permiso para acceder a esta página.')
-        return redirect('inicio')
-
-    return wrapper
+    return _restringir(vista, ('administrador', 'vendedor'), 'No tiene permiso para acceder a esta página.')
 
 
 def administrador_o_comprador(vista):
     """
     Decorador que permite acceso a administrador o comprador.
     """
-    @wraps(vista)
-    @login_required
-    def wrapper(request, *args, **kwargs):
-        if request.user.groups.filter(name__in=['administrador', 'comprador']).exists():
-            return vista(request, *args, **kwargs)
+    return _restringir(vista, ('administrador', 'comprador'), 'No tiene permiso para acceder a esta página.')
 
-        messages.error(request, 'No tiene permiso para acceder a esta página.')
-        return redirect('inicio')
 
-    return wrapper
+def version_condicional(*modelos):
+    """
+    Decorador para páginas GET que solo leen `modelos`: agrega ETag y
+    Last-Modified según la versión de esos datos (ver versiones.py) y responde
+    304 sin ejecutar la vista si el navegador ya tiene la página.
+
+    La página también muestra el usuario, su rol y un token CSRF, así que
+    esos datos forman parte del ETag. Si hay mensajes pendientes por mostrar
+    la vista se ejecuta siempre.
+
+    Sirve para vistas sincrónicas y async.
+
+    Uso:
+        @login_required
+        @version_condicional(Venta, Cliente)
+        async def reporte_ventas(request):
+            ...
+    """
+    from .versiones import estado_version, etag_version
+
+    def hay_mensajes(request):
+        return len(messages.get_messages(request)) > 0
+
+    def etag(request, *args, **kwargs):
+        if hay_mensajes(request):
+            return None
+        return etag_version(request, modelos, request.user.pk, ','.join(grupos_usuario(request.user)),
+                            request.COOKIES.get(settings.CSRF_COOKIE_NAME, ''))
+
+    def ultima_modificacion(request, *args, **kwargs):
+        if hay_mensajes(request):
+            return None
+        return estado_version(request, *modelos)[1]
+
+    def decorador(vista):
+        if not iscoroutinefunction(vista):
+            return condition(etag_func=etag, last_modified_func=ultima_modificacion)(vista)
+
+        #condition() llama a las funciones sin await y estas consultan la base:
+        #en vistas async se calculan antes en un hilo y condition() solo las lee
+        condicionada = condition(etag_func=lambda request, *args, **kwargs: request._version_condicional[0],
+                                 last_modified_func=lambda request, *args, **kwargs: request._version_condicional[1])(vista)
+
+        @wraps(vista)
+        async def wrapper(request, *args, **kwargs):
+            #el usuario ya cargado por auser(), para que request.user no lo consulte otra vez
+            request.user = await request.auser()
+            request._version_condicional = await sync_to_async(
+                lambda: (etag(request), ultima_modificacion(request)))()
+            return await condicionada(request, *args, **kwargs)
+
+        return wrapper
+    return decorador
+
+
+def presupuesto_consultas(maximo):
+    """
+    Declara cuántas consultas SQL puede hacer la vista en un GET, con el
+    cache vacío y sin importar cuántas filas muestre. PresupuestoConsultasTests
+    (tests.py) recorre las vistas de urls.py y falla si alguna no lo declara,
+    si lo excede o si sus consultas crecen con la cantidad de datos.
+
+    Uso:
+        @presupuesto_consultas(6)
+        @solo_vendedor
+        def lista_ventas(request):
+            ...
+    """
+    def decorador(vista):
+        vista.presupuesto_consultas = maximo
+        return vista
+    return decorador
@@ -0,0 +1,37 @@
+"""
+WhiteNoise como middleware sincrónico y async.
+
+WhiteNoiseMiddleware solo es sincrónico: bajo ASGI Django adapta toda la
+cadena y cada request pasa a un hilo antes de llegar a las vistas async.
+Esta subclase es async cuando la cadena lo es; buscar el archivo es una
+consulta a un diccionario en memoria, así que no bloquea el event loop.
+"""
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from whitenoise.middleware import WhiteNoiseMiddleware
+
+
+class WhiteNoiseAsyncMiddleware(WhiteNoiseMiddleware):
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response=None, **kwargs):
+        super().__init__(get_response, **kwargs)
+        self.es_async = iscoroutinefunction(get_response)
+        if self.es_async:
+            markcoroutinefunction(self)
+
+    def _archivo(self, request):
+        if self.autorefresh:
+            return self.find_file(request.path_info)
+        return self.files.get(request.path_info)
+
+    def __call__(self, request):
+        if self.es_async:
+            return self.__acall__(request)
+        return super().__call__(request)
+
+    async def __acall__(self, request):
+        static_file = self._archivo(request)
+        if static_file is not None:
+            return self.serve(static_file, request)
+        return await self.get_response(request)
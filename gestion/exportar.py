@@ -0,0 +1,135 @@
+"""
+Exportación de reportes a CSV por streaming.
+
+Las filas se leen del servidor en bloques (`iterator(chunk_size=...)`) con los
+joins resueltos en la misma consulta (`values_list`), y se escriben al cliente
+a medida que llegan. La memoria se mantiene constante sin importar cuántos
+años de historial tenga el reporte.
+
+Bajo ASGI un StreamingHttpResponse con un iterador sincrónico se lee entero
+(sync_to_async(list)) antes de enviarse; las vistas async piden la versión
+async (`asincrono=True`), que lee con aiterator() y se envía bloque a bloque.
+"""
+import csv
+
+from django.http import StreamingHttpResponse
+
+from .models import Venta, Compra
+
+TAMANO_BLOQUE = 2000
+
+
+class _Eco:
+    """Objeto tipo archivo que devuelve lo escrito en vez de guardarlo."""
+
+    def write(self, valor):
+        return valor
+
+
+def _fecha(valor):
+    return valor.strftime("%d/%m/%Y") if valor else ''
+
+
+def respuesta_csv(nombre_archivo, encabezados, filas):
+    """
+    Devuelve un StreamingHttpResponse que escribe `encabezados` y luego cada
+    fila de `filas` (cualquier iterable, o un iterable async) como CSV.
+    """
+    writer = csv.writer(_Eco())
+
+    def generar():
+        yield writer.writerow(encabezados)
+        for fila in filas:
+            yield writer.writerow(fila)
+
+    async def agenerar():
+        yield writer.writerow(encabezados)
+        async for fila in filas:
+            yield writer.writerow(fila)
+
+    contenido = agenerar() if hasattr(filas, '__aiter__') else generar()
+    response = StreamingHttpResponse(contenido, content_type='text/csv')
+    response['Content-Disposition'] = f'attachment; filename="{nombre_archivo}"'
+    return response
+
+
+def _formatear_venta(fila, estados=dict(Venta.ESTADOS)):
+    numero, fecha, cliente, total, estado = fila
+    return [numero, _fecha(fecha), cliente, total, estados.get(estado, estado)]
+
+
+def _formatear_compra(fila, estados=dict(Compra.ESTADOS)):
+    numero, fecha, proveedor, total, estado = fila
+    return [numero, _fecha(fecha), proveedor, total, estados.get(estado, estado)]
+
+
+def _formatear_producto(fila):
+    codigo, nombre, categoria, cantidad, precio = fila
+    return [codigo, nombre, categoria or '', cantidad, precio]
+
+
+ENCABEZADOS = {
+    'ventas': ['Pedido', 'Fecha', 'Cliente', 'Total', 'Estado'],
+    'compras': ['Orden', 'Fecha', 'Proveedor', 'Total', 'Estado'],
+    'inventario': ['Código', 'Producto', 'Categoría', 'Stock', 'Precio Venta'],
+}
+
+#columnas de cada reporte (con los joins) y como se pasa cada fila al CSV
+COLUMNAS = {
+    'ventas': (('numero_pedido', 'fecha', 'cliente__nombre', 'total', 'estado'), _formatear_venta),
+    'compras': (('numero_orden', 'fecha', 'proveedor__empresa', 'total', 'estado'), _formatear_compra),
+    'inventario': (('codigo', 'nombre', 'categoria__nombre', 'cantidad', 'precio_venta'), _formatear_producto),
+}
+
+
+def filas(tipo, queryset):
+    campos, formatear = COLUMNAS[tipo]
+    for fila in queryset.values_list(*campos).iterator(chunk_size=TAMANO_BLOQUE):
+        yield formatear(fila)
+
+
+async def afilas(tipo, queryset):
+    """filas() para vistas async: lee los bloques con aiterator() sin ocupar un hilo."""
+    campos, formatear = COLUMNAS[tipo]
+    #values_list() comun ejecuta la consulta al crear el iterador, dentro del event loop
+    #(SynchronousOnlyOperation); con named=True se ejecuta en el hilo de aiterator()
+    async for fila in queryset.values_list(*campos, named=True).aiterator(chunk_size=TAMANO_BLOQUE):
+        yield formatear(fila)
+
+
+def escribir_csv(tipo, queryset, archivo, progreso=None):
+    """
+    Escribe el reporte `tipo` como CSV en `archivo` (abierto en modo texto).
+    `progreso`, si se indica, se llama con las filas escritas cada bloque.
+    """
+    writer = csv.writer(archivo)
+    writer.writerow(ENCABEZADOS[tipo])
+    escritas = 0
+    for fila in filas(tipo, queryset):
+        writer.writerow(fila)
+        escritas += 1
+        if progreso and escritas % TAMANO_BLOQUE == 0:
+            progreso(escritas)
+    if progreso:
+        progreso(escritas)
+
+
+def exportar_csv(tipo, queryset, asincrono=False):
+    """
+    Descarga del reporte `tipo`. Con `asincrono` el contenido es un
+    generador async (para vistas servidas por ASGI).
+    """
+    datos = afilas(tipo, queryset) if asincrono else filas(tipo, queryset)
+    return respuesta_csv(f'{tipo}.csv', ENCABEZADOS[tipo], datos)
+
+
+def exportar_csv_ventas(queryset, asincrono=False):
+    return exportar_csv('ventas', queryset, asincrono)
+
+
+def exportar_csv_compras(queryset, asincrono=False):
+    return exportar_csv('compras', queryset, asincrono)
+
+
+def exportar_csv_inventario(queryset, asincrono=False):
+    return exportar_csv('inventario', queryset, asincrono)
@@ -1,41 +1,95 @@
 import django_filters
+from datetime import datetime, time, timedelta
 from django import forms
-from .models import Venta, Compra, Producto, Categoria
+from django.utils import timezone
+from django.conf import settings
+from django.db.models import Q
+from .models import Venta, Compra, Producto, Cliente, Proveedor, MovimientoInventario
+from .cache_catalogo import opciones_categorias
+from . import busqueda
 
-class VentaFilter(django_filters.FilterSet):
-    #filtro por rango de fechas
-    start_date = django_filters.DateFilter(field_name='fecha', lookup_expr='gte', label='Desde', 
+#los buscadores de texto usan el indice en memoria (busqueda.py) en vez de LIKE '%x%'
+BUSQUEDA_CON_INDICE = getattr(settings, 'BUSQUEDA_CON_INDICE', True)
+#con mas coincidencias que estas conviene el LIKE (un IN enorme es mas lento)
+MAXIMO_IDS_INDICE = 5000
+
+
+def _inicio_del_dia(fecha):
+    return timezone.make_aware(datetime.combine(fecha, time.min))
+
+def condicion_contiene(modelo, campos, valor, relacion=None):
+    """
+    Q equivalente a icontains de `valor` en alguno de `campos` de `modelo`
+    (alcanzado por la fk `relacion` del queryset filtrado, si se indica),
+    resuelta con el índice de búsqueda.
+    """
+    if BUSQUEDA_CON_INDICE:
+        ids = set()
+        for campo in campos:
+            ids.update(busqueda.ids_que_contienen(modelo, campo, valor))
+        if len(ids) <= MAXIMO_IDS_INDICE:
+            return Q(**{f'{relacion or "pk"}__in': ids})
+    condicion = Q()
+    for campo in campos:
+        condicion |= Q(**{f'{relacion}__{campo}__icontains' if relacion else f'{campo}__icontains': valor})
+    return condicion
+
+def filtro_contiene(modelo, campo, relacion=None):
+    """Método de filtro para un CharFilter con condicion_contiene."""
+    def filtrar(queryset, name, value):
+        return queryset.filter(condicion_contiene(modelo, [campo], value, relacion))
+    return filtrar
+
+class RangoFechasFilter(django_filters.FilterSet):
+    """
+    Filtro por rango de fechas sobre `fecha`. Compara contra el inicio del día
+    (y el inicio del día siguiente para 'Hasta', que incluye todo ese día) en
+    vez de usar fecha__date, así la consulta recorre un rango del índice.
+    """
+    start_date = django_filters.DateFilter(method='filtrar_desde', label='Desde',
                                            widget=forms.DateInput(attrs={'type': 'date', 'class': 'form-control'}))
-    end_date = django_filters.DateFilter(field_name='fecha', lookup_expr='lte', label='Hasta', 
+    end_date = django_filters.DateFilter(method='filtrar_hasta', label='Hasta',
                                          widget=forms.DateInput(attrs={'type': 'date', 'class': 'form-control'}))
-    
+
+    def filtrar_desde(self, queryset, name, value):
+        return queryset.filter(fecha__gte=_inicio_del_dia(value))
+
+    def filtrar_hasta(self, queryset, name, value):
+        return queryset.filter(fecha__lt=_inicio_del_dia(value + timedelta(days=1)))
+
+class VentaFilter(RangoFechasFilter):
     #filltro por cliente (buscador)
-    cliente = django_filters.CharFilter(field_name='cliente__nombre', lookup_expr='icontains', label='Cliente',
+    cliente = django_filters.CharFilter(field_name='cliente__nombre', method=filtro_contiene(Cliente, 'nombre', 'cliente'), label='Cliente',
                                         widget=forms.TextInput(attrs={'class': 'form-control', 'placeholder': 'Nombre del cliente'}))
 
+    #filtros exactos para la API (indices (estado, fecha) y (cliente, fecha))
+    estado = django_filters.ChoiceFilter(choices=Venta.ESTADOS, label='Estado')
+    cliente_id = django_filters.NumberFilter(field_name='cliente', label='Id del cliente')
+
     class Meta:
         model = Venta
         fields = ['cliente']
 
-class CompraFilter(django_filters.FilterSet):
-    start_date = django_filters.DateFilter(field_name='fecha', lookup_expr='gte', label='Desde',
-                                           widget=forms.DateInput(attrs={'type': 'date', 'class': 'form-control'}))
-    end_date = django_filters.DateFilter(field_name='fecha', lookup_expr='lte', label='Hasta',
-                                         widget=forms.DateInput(attrs={'type': 'date', 'class': 'form-control'}))
-    
-    proveedor = django_filters.CharFilter(field_name='proveedor__empresa', lookup_expr='icontains', label='Proveedor',
+class CompraFilter(RangoFechasFilter):
+    proveedor = django_filters.CharFilter(field_name='proveedor__empresa', method=filtro_contiene(Proveedor, 'empresa', 'proveedor'), label='Proveedor',
                                           widget=forms.TextInput(attrs={'class': 'form-control', 'placeholder': 'Nombre empresa'}))
 
+    #filtros exactos para la API (indices (estado, fecha) y (proveedor, fecha))
+    estado = django_filters.ChoiceFilter(choices=Compra.ESTADOS, label='Estado')
+    proveedor_id = django_filters.NumberFilter(field_name='proveedor', label='Id del proveedor')
+
     class Meta:
         model = Compra
         fields = ['proveedor']
 
 class InventarioFilter(django_filters.FilterSet):
-    nombre = django_filters.CharFilter(field_name='nombre', lookup_expr='icontains', label='Producto',
+    nombre = django_filters.CharFilter(field_name='nombre', method=filtro_contiene(Producto, 'nombre'), label='Producto',
                                        widget=forms.TextInput(attrs={'class': 'form-control', 'placeholder': 'Buscar producto...'}))
     
-    ccategoria = django_filters.ModelChoiceFilter(
-        queryset=Categoria.objects.all(), 
+    #las opciones salen del cache del catalogo (sin consulta por cada pagina)
+    categoria = django_filters.ChoiceFilter(
+        field_name='categoria',
+        choices=opciones_categorias,
         label='Categoría',
         widget=forms.Select(attrs={'class': 'form-select'})
     )
@@ -46,4 +100,13 @@ class InventarioFilter(django_filters.FilterSet):
 
     class Meta:
         model = Producto
-        fields = ['categoria', 'nombre']
\ No newline at end of file
+        fields = ['categoria', 'nombre']
+
+class MovimientoFilter(RangoFechasFilter):
+    #indices (producto, fecha) y (tipo, fecha)
+    producto = django_filters.NumberFilter(field_name='producto', label='Id del producto')
+    tipo = django_filters.ChoiceFilter(choices=MovimientoInventario.TIPOS, label='Tipo')
+
+    class Meta:
+        model = MovimientoInventario
+        fields = ['producto', 'tipo']
@@ -1,4 +1,5 @@
 from django import forms
+from django.urls import reverse_lazy
 from .models import Cliente, Proveedor, Producto, Venta, Compra, Categoria, DetalleVenta, DetalleCompra
 
 #formularios de catalogos
@@ -23,6 +24,36 @@ class ProductoForm(forms.ModelForm):
         model = Producto
         fields = '__all__'
 
+#selector que no lista todo el catalogo: las opciones se piden al escribir
+class SelectAutocompletar(forms.Select):
+    """
+    Select de un ModelChoiceField que solo trae la opción elegida; el resto
+    se busca en `url` (ver views.autocompletar_productos) mientras se escribe.
+    El campo sigue validando contra su queryset.
+    """
+    template_name = 'widgets/select_autocompletar.html'
+
+    def __init__(self, url, attrs=None):
+        super().__init__(attrs)
+        self.url = url
+
+    def get_context(self, name, value, attrs):
+        contexto = super().get_context(name, value, attrs)
+        contexto['widget']['attrs']['data-autocompletar'] = str(self.url)
+        return contexto
+
+    def optgroups(self, name, value, attrs=None):
+        elegidos = [v for v in value if v]
+        opciones = [('', '---------')]
+        if elegidos:
+            campo = self.choices.field
+            opciones += [(obj.pk, campo.label_from_instance(obj)) for obj in campo.queryset.filter(pk__in=elegidos)]
+        grupos = []
+        for indice, (opcion, etiqueta) in enumerate(opciones):
+            seleccionado = str(opcion) in value
+            grupos.append((None, [self.create_option(name, opcion, etiqueta, seleccionado, indice, attrs=attrs)], indice))
+        return grupos
+
 #formularios de transacciones
 class VentaForm(forms.ModelForm):
     class Meta:
@@ -38,8 +69,10 @@ class DetalleVentaForm(forms.ModelForm):
     class Meta:
         model = DetalleVenta
         fields = ['producto', 'cantidad']
+        widgets = {'producto': SelectAutocompletar(reverse_lazy('autocompletar_productos'))}
 
 class DetalleCompraForm(forms.ModelForm):
     class Meta:
         model = DetalleCompra
         fields = ['producto', 'cantidad', 'costo_unitario']
+        widgets = {'producto': SelectAutocompletar(reverse_lazy('autocompletar_productos'))}
@@ -0,0 +1,163 @@
+"""
+Movimientos de stock al finalizar ventas y recibir compras.
+
+Ambas operaciones corren en una sola transacción y su cantidad de consultas no
+depende de cuántas líneas tenga la venta:
+
+1. se bloquea la venta y luego los productos, siempre en orden de id para que
+   dos finalizaciones simultáneas no se bloqueen mutuamente;
+2. un único UPDATE resta el stock de todos los productos, condicionado a que
+   cada uno tenga suficiente (`cantidad >= n`); si alguna fila no se
+   actualiza, la transacción entera se deshace y no se vende de más;
+3. los movimientos se insertan con bulk_create.
+
+La recepción de compras sigue los mismos pasos: un UPDATE suma el stock y
+actualiza el precio de compra de todos los productos, otro marca lo recibido
+en cada línea, y el estado de la orden cambia al final, cuando todo salió bien.
+Se puede recibir solo una parte de las líneas; la orden queda entonces
+'parcial' hasta recibir el resto.
+"""
+from django.db import transaction
+from django.db.models import Case, DecimalField, F, IntegerField, Q, Value, When
+
+from .models import Venta, DetalleVenta, Compra, DetalleCompra, Producto, MovimientoInventario
+from .versiones import incrementar_version
+from . import resumenes
+
+
+class StockInsuficiente(Exception):
+    """Algún producto no tiene stock para cubrir la venta."""
+
+    def __init__(self, productos):
+        self.productos = productos
+        super().__init__('No hay suficiente stock de: ' + ', '.join(productos))
+
+
+class RecepcionInvalida(Exception):
+    """Se pidió recibir más de lo pendiente o una línea de otra orden."""
+
+
+def _bloquear_productos(ids):
+    """SELECT ... FOR UPDATE en orden de id (no-op en SQLite). Devuelve {id: stock}."""
+    return dict(Producto.objects.select_for_update().filter(pk__in=ids).order_by('pk')
+                .values_list('pk', 'cantidad'))
+
+
+def _por_id(valores, output_field):
+    """CASE WHEN id = ... THEN valor ... END para un UPDATE de varias filas."""
+    return Case(*[When(pk=pk, then=Value(valor)) for pk, valor in valores.items()], output_field=output_field)
+
+
+def descontar_stock(cantidades):
+    """
+    Resta {producto_id: cantidad} del stock en un solo UPDATE. Devuelve la
+    lista de ids sin stock suficiente (vacía si todo salió bien). Debe
+    llamarse dentro de una transacción, que quien llama deshace si falta stock.
+    """
+    ids = sorted(cantidades)
+    #bloqueo en orden determinista antes de escribir
+    stock = _bloquear_productos(ids)
+    faltantes = [pk for pk in ids if stock.get(pk, 0) < cantidades[pk]]
+    if faltantes:
+        return faltantes
+
+    con_stock = Q()
+    for pk in ids:
+        con_stock |= Q(pk=pk, cantidad__gte=cantidades[pk])
+    actualizados = Producto.objects.filter(con_stock).update(
+        cantidad=F('cantidad') - _por_id(cantidades, IntegerField()))
+    if actualizados != len(ids):
+        #solo en bases sin bloqueo de filas: otra transaccion vendio antes
+        return ids
+    return []
+
+
+def finalizar_venta(venta_id):
+    """
+    Descuenta el stock de la venta, registra los movimientos de salida, la
+    marca como completada y actualiza los resúmenes del dashboard.
+
+    Devuelve False si la venta ya no estaba pendiente. Lanza StockInsuficiente
+    (sin haber cambiado nada) si algún producto no alcanza.
+    """
+    with transaction.atomic():
+        venta = Venta.objects.select_for_update().get(pk=venta_id)
+        if venta.estado != 'pendiente':
+            return False
+
+        #hay una sola linea por producto (restriccion unica de DetalleVenta)
+        cantidades = dict(DetalleVenta.objects.filter(venta=venta).values_list('producto_id', 'cantidad'))
+        if cantidades:
+            faltantes = descontar_stock(cantidades)
+            if faltantes:
+                nombres = list(Producto.objects.filter(pk__in=faltantes).order_by('nombre')
+                               .values_list('nombre', flat=True))
+                raise StockInsuficiente(nombres)
+
+            MovimientoInventario.objects.bulk_create([
+                MovimientoInventario(tipo='salida', producto_id=pk, cantidad=cantidad, venta_asociada=venta)
+                for pk, cantidad in sorted(cantidades.items())
+            ])
+            #bulk_create y update() no disparan las señales de versión
+            incrementar_version(Producto, MovimientoInventario)
+
+        venta.estado = 'completado'
+        venta.save(update_fields=['estado'])
+        resumenes.registrar_venta(venta, cantidades=cantidades)
+    return True
+
+
+def recibir_compra(compra_id, cantidades=None):
+    """
+    Recibe mercadería de una orden pendiente o parcial.
+
+    `cantidades` es {detalle_id: cantidad a recibir}; si se omite se recibe
+    todo lo pendiente. Suma el stock, actualiza el precio de compra de los
+    productos y registra los movimientos de entrada. Devuelve el nuevo estado
+    de la orden, o None si la orden ya no admitía recepciones.
+    """
+    with transaction.atomic():
+        compra = Compra.objects.select_for_update().get(pk=compra_id)
+        if compra.estado not in ('pendiente', 'parcial'):
+            return None
+
+        lineas = {
+            pk: (producto_id, pendiente, costo)
+            for pk, producto_id, pendiente, costo in DetalleCompra.objects.filter(compra=compra)
+            .annotate(pendiente=F('cantidad') - F('cantidad_recibida'))
+            .values_list('pk', 'producto_id', 'pendiente', 'costo_unitario')
+        }
+        if cantidades is None:
+            cantidades = {pk: pendiente for pk, (_, pendiente, _) in lineas.items()}
+        for pk, cantidad in cantidades.items():
+            if pk not in lineas or cantidad < 0 or cantidad > lineas[pk][1]:
+                raise RecepcionInvalida('La cantidad a recibir no corresponde a lo pendiente de la orden.')
+        recibir = {pk: cantidad for pk, cantidad in cantidades.items() if cantidad}
+        if not recibir and any(pendiente for _, pendiente, _ in lineas.values()):
+            #un formulario en blanco o en ceros no cambia el estado de la orden
+            raise RecepcionInvalida('Indique al menos una cantidad a recibir.')
+
+        if recibir:
+            #una linea por producto (restriccion unica de DetalleCompra)
+            por_producto = {lineas[pk][0]: cantidad for pk, cantidad in recibir.items()}
+            costos = {lineas[pk][0]: lineas[pk][2] for pk in recibir}
+            _bloquear_productos(sorted(por_producto))
+            Producto.objects.filter(pk__in=por_producto).update(
+                cantidad=F('cantidad') + _por_id(por_producto, IntegerField()),
+                precio_compra=_por_id(costos, DecimalField(max_digits=10, decimal_places=2)),
+            )
+            DetalleCompra.objects.filter(pk__in=recibir).update(
+                cantidad_recibida=F('cantidad_recibida') + _por_id(recibir, IntegerField()))
+            MovimientoInventario.objects.bulk_create([
+                MovimientoInventario(tipo='entrada', producto_id=producto_id, cantidad=cantidad, compra_asociada=compra)
+                for producto_id, cantidad in sorted(por_producto.items())
+            ])
+            incrementar_version(Producto, DetalleCompra, MovimientoInventario)
+
+        #el estado cambia al final, con todo lo anterior ya aplicado
+        completa = all(pendiente == recibir.get(pk, 0) for pk, (_, pendiente, _) in lineas.items())
+        estado = 'recibida' if completa else 'parcial'
+        if estado != compra.estado:
+            compra.estado = estado
+            compra.save(update_fields=['estado'])
+    return estado
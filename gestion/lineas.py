@@ -0,0 +1,150 @@
+"""
+Alta, cambio y baja de líneas de ventas y compras.
+
+Todas las operaciones corren en una transacción que primero bloquea la
+cabecera (SELECT ... FOR UPDATE), así dos clics simultáneos sobre el mismo
+pedido se ejecutan uno detrás del otro. Agregar un producto que ya está en el
+pedido suma la cantidad en la base de datos (UPDATE cantidad = cantidad + n)
+y la restricción única (venta, producto) / (compra, producto) impide líneas
+duplicadas. El total de la cabecera se recalcula con un único UPDATE que suma
+las líneas en la base de datos.
+
+Las usan las vistas HTML y sirven igual para una API de escritura.
+"""
+from django.db import IntegrityError, transaction
+from django.db.models import DecimalField, ExpressionWrapper, F, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+from .models import Venta, DetalleVenta, Compra, DetalleCompra
+from .versiones import incrementar_version
+
+
+class LineaError(Exception):
+    """El pedido no admite el cambio (por ejemplo, ya no está pendiente)."""
+
+
+class LineaNoEncontrada(LineaError):
+    """La línea ya no existe (por ejemplo, otro request la eliminó)."""
+
+
+#cabecera, linea, campo que apunta a la cabecera y campo de precio de cada tipo
+VENTA = (Venta, DetalleVenta, 'venta', 'precio_unitario')
+COMPRA = (Compra, DetalleCompra, 'compra', 'costo_unitario')
+
+
+def _bloquear_cabecera(tipo, cabecera_id):
+    cabecera = tipo[0].objects.select_for_update().get(pk=cabecera_id)
+    if cabecera.estado != 'pendiente':
+        raise LineaError('Solo se pueden modificar pedidos pendientes.')
+    return cabecera
+
+
+def _validar_cantidad(cantidad):
+    if cantidad <= 0:
+        raise LineaError('La cantidad debe ser mayor que cero.')
+
+
+def _cabecera_de_linea(tipo, linea_id):
+    modelo, linea, campo, precio = tipo
+    try:
+        return linea.objects.values_list(campo + '_id', flat=True).get(pk=linea_id)
+    except linea.DoesNotExist:
+        raise LineaNoEncontrada('La línea ya no existe en el pedido.')
+
+
+def _recalcular_total(tipo, cabecera_id):
+    """UPDATE cabecera SET total = (SELECT SUM(cantidad * precio) FROM lineas)."""
+    modelo, linea, campo, precio = tipo
+    subtotales = (
+        linea.objects.filter(**{campo: OuterRef('pk')})
+        .values(campo)
+        .annotate(suma=Sum(ExpressionWrapper(
+            F('cantidad') * F(precio), output_field=DecimalField(max_digits=14, decimal_places=2))))
+        .values('suma')
+    )
+    modelo.objects.filter(pk=cabecera_id).update(
+        total=Coalesce(Subquery(subtotales), Value(0), output_field=DecimalField(max_digits=10, decimal_places=2)))
+    incrementar_version(modelo, linea)
+
+
+def _agregar(tipo, cabecera_id, producto, cantidad, precio_unitario):
+    modelo, linea, campo, precio = tipo
+    _validar_cantidad(cantidad)
+    with transaction.atomic():
+        _bloquear_cabecera(tipo, cabecera_id)
+        filtro = {campo + '_id': cabecera_id, 'producto': producto}
+        cambios = {'cantidad': F('cantidad') + cantidad, precio: precio_unitario}
+        creada = False
+        if not linea.objects.filter(**filtro).update(**cambios):
+            try:
+                with transaction.atomic():
+                    linea.objects.create(cantidad=cantidad, **filtro, **{precio: precio_unitario})
+                creada = True
+            except IntegrityError:
+                #otra transaccion inserto la linea primero (bases sin FOR UPDATE)
+                linea.objects.filter(**filtro).update(**cambios)
+        _recalcular_total(tipo, cabecera_id)
+    return creada
+
+
+def _actualizar(tipo, linea_id, cantidad, precio_unitario=None):
+    modelo, linea, campo, precio = tipo
+    _validar_cantidad(cantidad)
+    with transaction.atomic():
+        cabecera_id = _cabecera_de_linea(tipo, linea_id)
+        _bloquear_cabecera(tipo, cabecera_id)
+        cambios = {'cantidad': cantidad}
+        if precio_unitario is not None:
+            cambios[precio] = precio_unitario
+        if not linea.objects.filter(pk=linea_id).update(**cambios):
+            #se elimino entre la lectura y el bloqueo de la cabecera
+            raise LineaNoEncontrada('La línea ya no existe en el pedido.')
+        _recalcular_total(tipo, cabecera_id)
+    return cabecera_id
+
+
+def _eliminar(tipo, linea_id):
+    modelo, linea, campo, precio = tipo
+    with transaction.atomic():
+        cabecera_id = _cabecera_de_linea(tipo, linea_id)
+        _bloquear_cabecera(tipo, cabecera_id)
+        if not linea.objects.filter(pk=linea_id).delete()[0]:
+            raise LineaNoEncontrada('La línea ya no existe en el pedido.')
+        _recalcular_total(tipo, cabecera_id)
+    return cabecera_id
+
+
+def agregar_linea_venta(venta_id, producto, cantidad):
+    """
+    Agrega `cantidad` unidades de `producto` a la venta al precio de venta
+    actual. Devuelve True si se creó una línea nueva y False si se sumó a una
+    existente.
+    """
+    return _agregar(VENTA, venta_id, producto, cantidad, producto.precio_venta)
+
+
+def actualizar_linea_venta(detalle_id, cantidad):
+    """
+    Cambia la cantidad de una línea (mayor que cero; para quitarla está
+    eliminar_linea_venta). Devuelve el id de la venta. Lanza
+    LineaNoEncontrada si la línea ya no existe.
+    """
+    return _actualizar(VENTA, detalle_id, cantidad)
+
+
+def eliminar_linea_venta(detalle_id):
+    """Elimina una línea. Devuelve el id de la venta o lanza LineaNoEncontrada."""
+    return _eliminar(VENTA, detalle_id)
+
+
+def agregar_linea_compra(compra_id, producto, cantidad, costo_unitario):
+    """Igual que agregar_linea_venta pero con el costo indicado."""
+    return _agregar(COMPRA, compra_id, producto, cantidad, costo_unitario)
+
+
+def actualizar_linea_compra(detalle_id, cantidad, costo_unitario=None):
+    return _actualizar(COMPRA, detalle_id, cantidad, costo_unitario)
+
+
+def eliminar_linea_compra(detalle_id):
+    return _eliminar(COMPRA, detalle_id)
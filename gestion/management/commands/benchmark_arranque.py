@@ -0,0 +1,55 @@
+"""
+Mide el arranque en frío de un worker (ver arranque.py): django.setup() y
+URLs, tiempo hasta el primer request y los paquetes que más tardan en
+importarse (`python -X importtime`).
+
+Uso:
+    python manage.py benchmark_arranque
+    python manage.py benchmark_arranque --repeticiones 10 --paquetes 20 --json arranque.json
+"""
+import json
+import statistics
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from gestion import arranque
+
+
+class Command(BaseCommand):
+    help = 'Mide el tiempo de arranque de un worker y el primer request en procesos nuevos.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeticiones', type=int, default=5, help='Procesos a arrancar.')
+        parser.add_argument('--paquetes', type=int, default=15, help='Paquetes más lentos a mostrar.')
+        parser.add_argument('--json', metavar='ARCHIVO', help='Guardar los resultados en un archivo JSON.')
+
+    def handle(self, *args, **options):
+        mediciones = [arranque.medir() for _ in range(options['repeticiones'])]
+        resumen = {
+            'arranque_ms': round(statistics.median(m['arranque_ms'] for m in mediciones), 1),
+            'primer_request_ms': round(statistics.median(m['primer_request_ms'] for m in mediciones), 1),
+            'modulos': mediciones[-1]['modulos'],
+            'diferidos': mediciones[-1]['diferidos'],
+            'presupuesto_ms': getattr(settings, 'ARRANQUE_PRESUPUESTO_MS', None),
+        }
+        paquetes = {}
+        for medicion in mediciones:
+            for paquete, ms in medicion['paquetes_ms'].items():
+                paquetes.setdefault(paquete, []).append(ms)
+        resumen['paquetes_ms'] = {paquete: round(statistics.median(valores), 1) for paquete, valores in
+                                  sorted(paquetes.items(), key=lambda par: -statistics.median(par[1]))}
+
+        excedido = ' !' if resumen['presupuesto_ms'] and resumen['arranque_ms'] > resumen['presupuesto_ms'] else ''
+        self.stdout.write(f"Arranque (mediana de {len(mediciones)}): {resumen['arranque_ms']} ms "
+                          f"(presupuesto {resumen['presupuesto_ms']} ms){excedido}")
+        self.stdout.write(f"Hasta el primer request: {resumen['primer_request_ms']} ms, {resumen['modulos']} módulos")
+        if resumen['diferidos']:
+            self.stdout.write(f"Se cargaron al arrancar: {', '.join(resumen['diferidos'])} !")
+        self.stdout.write('Importación por paquete:')
+        for paquete, ms in list(resumen['paquetes_ms'].items())[:options['paquetes']]:
+            self.stdout.write(f'{paquete:<32} {ms:>8.1f} ms')
+
+        if options['json']:
+            with open(options['json'], 'w') as archivo:
+                json.dump(resumen, archivo, indent=2)
@@ -0,0 +1,203 @@
+"""
+Compara el rendimiento con peticiones concurrentes de la aplicación servida
+por WSGI (un hilo por petición, como gunicorn con --threads) y por ASGI (un
+event loop, como uvicorn), sobre las vistas de solo lectura.
+
+No abre puertos: llama directamente a get_wsgi_application() desde un pool
+de hilos y a get_asgi_application() con asyncio, con el mismo usuario y la
+misma sesión. Mide por ruta y por modo las peticiones por segundo y la
+latencia p50 / p95 de cada petición.
+
+Las vistas async (reportes, movimientos, dashboard, precio) solo rinden más
+bajo ASGI cuando esperan a la base mientras otras peticiones avanzan; con
+SQLite y un solo núcleo la diferencia es chica, con PostgreSQL y varias
+conexiones es mayor. lista_productos es sincrónica y queda de referencia.
+
+Uso:
+    python manage.py benchmark_asgi
+    python manage.py benchmark_asgi --peticiones 200 --concurrencia 20 --rutas dashboard obtener_precio_producto
+    python manage.py benchmark_asgi --json asgi.json
+"""
+import asyncio
+import io
+import json
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.contrib.auth.models import Group, User
+from django.core.asgi import get_asgi_application
+from django.core.management.base import BaseCommand, CommandError
+from django.core.wsgi import get_wsgi_application
+from django.test import Client
+from django.urls import NoReverseMatch, reverse
+
+from gestion.models import Producto
+
+from .benchmark_rutas import CLAVE, GRUPOS, USUARIO, percentil
+
+RUTAS = ['obtener_precio_producto', 'dashboard', 'movimientos_inventario', 'reporte_inventario', 'lista_productos']
+
+
+def peticion_wsgi(aplicacion, url, cookie):
+    ruta = urlsplit(url)
+    entorno = {
+        'REQUEST_METHOD': 'GET',
+        'PATH_INFO': ruta.path,
+        'QUERY_STRING': ruta.query,
+        'SERVER_NAME': 'localhost',
+        'SERVER_PORT': '80',
+        'SERVER_PROTOCOL': 'HTTP/1.1',
+        'HTTP_HOST': 'localhost',
+        'HTTP_COOKIE': cookie,
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': 'http',
+        'wsgi.input': io.BytesIO(),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': False,
+        'wsgi.run_once': False,
+    }
+    estado = []
+    inicio = time.perf_counter()
+    respuesta = aplicacion(entorno, lambda linea, cabeceras, exc_info=None: estado.append(int(linea[:3])))
+    try:
+        for _ in respuesta:
+            pass
+    finally:
+        respuesta.close()
+    return estado[0], time.perf_counter() - inicio
+
+
+async def peticion_asgi(aplicacion, url, cookie):
+    ruta = urlsplit(url)
+    scope = {
+        'type': 'http',
+        'asgi': {'version': '3.0'},
+        'http_version': '1.1',
+        'method': 'GET',
+        'scheme': 'http',
+        'path': ruta.path,
+        'raw_path': ruta.path.encode(),
+        'query_string': ruta.query.encode(),
+        'root_path': '',
+        'headers': [(b'host', b'localhost'), (b'cookie', cookie.encode())],
+        'client': ('127.0.0.1', 50000),
+        'server': ('localhost', 80),
+    }
+    cuerpo_enviado = False
+    desconexion = asyncio.Event()
+    estado = []
+
+    async def receive():
+        nonlocal cuerpo_enviado
+        if not cuerpo_enviado:
+            cuerpo_enviado = True
+            return {'type': 'http.request', 'body': b'', 'more_body': False}
+        #django escucha una desconexion mientras arma la respuesta; el cliente no se va
+        await desconexion.wait()
+        return {'type': 'http.disconnect'}
+
+    async def send(mensaje):
+        if mensaje['type'] == 'http.response.start':
+            estado.append(mensaje['status'])
+
+    inicio = time.perf_counter()
+    await aplicacion(scope, receive, send)
+    desconexion.set()
+    return estado[0], time.perf_counter() - inicio
+
+
+class Command(BaseCommand):
+    help = 'Compara peticiones concurrentes servidas por WSGI (hilos) y por ASGI (asyncio).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--peticiones', type=int, default=100, help='Peticiones por ruta y modo.')
+        parser.add_argument('--concurrencia', type=int, default=10,
+                            help='Peticiones simultáneas (hilos en WSGI, tareas en ASGI).')
+        parser.add_argument('--rutas', nargs='*', default=RUTAS, help='Nombres de las rutas a medir.')
+        parser.add_argument('--json', metavar='ARCHIVO', help='Guardar los resultados en un archivo JSON.')
+
+    def handle(self, *args, **options):
+        cookie = self.sesion()
+        urls = self.urls(options['rutas'])
+        wsgi = get_wsgi_application()
+        asgi = get_asgi_application()
+
+        resultados = []
+        for nombre, url in urls:
+            for modo in ('wsgi', 'asgi'):
+                #una pasada sin medir: carga plantillas, caches e indices
+                if modo == 'wsgi':
+                    self.wsgi(wsgi, url, cookie, 1, 1)
+                    mediciones, segundos = self.wsgi(wsgi, url, cookie, options['peticiones'], options['concurrencia'])
+                else:
+                    asyncio.run(self.asgi(asgi, url, cookie, 1, 1))
+                    mediciones, segundos = asyncio.run(
+                        self.asgi(asgi, url, cookie, options['peticiones'], options['concurrencia']))
+                latencias = [duracion * 1000 for _, duracion in mediciones]
+                fila = {
+                    'nombre': nombre,
+                    'ruta': url,
+                    'modo': modo,
+                    'peticiones': len(mediciones),
+                    'concurrencia': options['concurrencia'],
+                    'errores': sum(1 for estado, _ in mediciones if estado >= 500),
+                    'por_segundo': round(len(mediciones) / segundos, 1),
+                    'p50_ms': round(percentil(latencias, 50), 3),
+                    'p95_ms': round(percentil(latencias, 95), 3),
+                }
+                resultados.append(fila)
+                self.stdout.write(
+                    f"{modo.upper():<5}{url:<40} {fila['por_segundo']:>8.1f} req/s  p50 {fila['p50_ms']:>8.2f}  "
+                    f"p95 {fila['p95_ms']:>8.2f} ms  {fila['errores']} errores"
+                )
+
+        if options['json']:
+            with open(options['json'], 'w') as archivo:
+                json.dump({'rutas': resultados}, archivo, indent=2)
+
+    def sesion(self):
+        usuario, _ = User.objects.get_or_create(username=USUARIO)
+        usuario.set_password(CLAVE)
+        usuario.save()
+        usuario.groups.add(*[Group.objects.get_or_create(name=nombre)[0] for nombre in GRUPOS])
+        cliente = Client()
+        cliente.force_login(usuario)
+        return f'{settings.SESSION_COOKIE_NAME}={cliente.cookies[settings.SESSION_COOKIE_NAME].value}'
+
+    def urls(self, nombres):
+        producto = Producto.objects.order_by('id').values_list('id', flat=True).first()
+        urls = []
+        for nombre in nombres:
+            try:
+                url = reverse(nombre)
+            except NoReverseMatch:
+                if producto is None:
+                    self.stderr.write(f'{nombre}: no hay productos, se omite.')
+                    continue
+                try:
+                    url = reverse(nombre, args=[producto])
+                except NoReverseMatch:
+                    raise CommandError(f'No se puede armar la ruta {nombre}.')
+            urls.append((nombre, url))
+        return urls
+
+    def wsgi(self, aplicacion, url, cookie, peticiones, concurrencia):
+        inicio = time.perf_counter()
+        with ThreadPoolExecutor(concurrencia) as pool:
+            mediciones = list(pool.map(lambda _: peticion_wsgi(aplicacion, url, cookie), range(peticiones)))
+        return mediciones, time.perf_counter() - inicio
+
+    async def asgi(self, aplicacion, url, cookie, peticiones, concurrencia):
+        semaforo = asyncio.Semaphore(concurrencia)
+
+        async def una():
+            async with semaforo:
+                return await peticion_asgi(aplicacion, url, cookie)
+
+        inicio = time.perf_counter()
+        mediciones = await asyncio.gather(*(una() for _ in range(peticiones)))
+        return mediciones, time.perf_counter() - inicio
@@ -0,0 +1,119 @@
+"""
+Compara el motor de PDFs original (Table de ReportLab) con el motor por
+páginas en tiempo y memoria pico (RSS).
+
+Cada medición corre en un proceso aparte para que el pico de memoria de una
+no contamine a la siguiente. Las filas son sintéticas y se generan en memoria,
+así que no hace falta tener datos en la base.
+
+Uso:
+    python manage.py benchmark_pdf
+    python manage.py benchmark_pdf --filas 1000 10000 --reporte inventario
+"""
+import argparse
+import json
+import resource
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+from decimal import Decimal
+from io import BytesIO
+from types import SimpleNamespace
+
+from django.core.management.base import BaseCommand
+
+MOTORES = ['platypus', 'streaming']
+REPORTES = ['ventas', 'compras', 'inventario']
+
+
+def _rss_kb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def _filas_sinteticas(reporte, n):
+    fecha = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    for i in range(n):
+        if reporte == 'inventario':
+            yield (f"P-{i:06d}", f"Producto de prueba {i}", f"Categoria {i % 20}", i % 500, Decimal('19.99'))
+        else:
+            yield (f"DOC-{i:06d}", fecha, f"Tercero {i % 1000}", Decimal('150.25'), 'completado')
+
+
+def _objetos_sinteticos(reporte, n):
+    """Las mismas filas, con la forma de objetos de modelo que espera PDFReporter."""
+    for fila in _filas_sinteticas(reporte, n):
+        if reporte == 'inventario':
+            codigo, nombre, categoria, cantidad, precio = fila
+            yield SimpleNamespace(codigo=codigo, nombre=nombre, cantidad=cantidad, precio_venta=precio,
+                                  categoria=SimpleNamespace(nombre=categoria))
+        else:
+            numero, fecha, tercero, total, _estado = fila
+            yield SimpleNamespace(numero_pedido=numero, numero_orden=numero, fecha=fecha, total=total,
+                                  cliente=SimpleNamespace(nombre=tercero),
+                                  proveedor=SimpleNamespace(empresa=tercero),
+                                  get_estado_display=lambda: 'Completado')
+
+
+def medir(motor, reporte, n):
+    from gestion.pdf_generator import PDFReporter
+    from gestion.pdf_streaming import REPORTES as MOTORES_STREAMING
+
+    rss_inicial = _rss_kb()
+    inicio = time.perf_counter()
+    if motor == 'platypus':
+        reporter = PDFReporter('Benchmark', reporte)
+        generar = getattr(reporter, f'generar_reporte_{reporte}')
+        tamano = len(generar(_objetos_sinteticos(reporte, n)).getvalue())
+    else:
+        destino = BytesIO()
+        MOTORES_STREAMING[reporte]('Benchmark').render(_filas_sinteticas(reporte, n), destino)
+        tamano = len(destino.getvalue())
+    segundos = time.perf_counter() - inicio
+    return {
+        'motor': motor,
+        'reporte': reporte,
+        'filas': n,
+        'segundos': round(segundos, 3),
+        'rss_inicial_mb': round(rss_inicial / 1024, 1),
+        'rss_pico_mb': round(_rss_kb() / 1024, 1),
+        'bytes_pdf': tamano,
+    }
+
+
+class Command(BaseCommand):
+    help = 'Compara tiempo y memoria pico de los motores de PDF.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--filas', nargs='+', type=int, default=[1000, 10000, 100000])
+        parser.add_argument('--motores', nargs='+', choices=MOTORES, default=MOTORES)
+        parser.add_argument('--reporte', choices=REPORTES, default='ventas')
+        parser.add_argument('--json', dest='salida_json', help='Guardar los resultados en este archivo.')
+        #uso interno: una sola medicion en este proceso
+        parser.add_argument('--medir', nargs=2, metavar=('MOTOR', 'FILAS'), help=argparse.SUPPRESS)
+
+    def handle(self, *args, **options):
+        if options['medir']:
+            motor, n = options['medir']
+            self.stdout.write(json.dumps(medir(motor, options['reporte'], int(n))))
+            return
+
+        resultados = []
+        for n in options['filas']:
+            for motor in options['motores']:
+                proceso = subprocess.run(
+                    [sys.executable, sys.argv[0], 'benchmark_pdf',
+                     '--reporte', options['reporte'], '--medir', motor, str(n)],
+                    capture_output=True, text=True, check=True,
+                )
+                resultado = json.loads(proceso.stdout.strip().splitlines()[-1])
+                resultados.append(resultado)
+                self.stdout.write(
+                    f"{motor:<10} {n:>8} filas  {resultado['segundos']:>8.2f} s  "
+                    f"RSS pico {resultado['rss_pico_mb']:>7.1f} MB "
+                    f"(+{resultado['rss_pico_mb'] - resultado['rss_inicial_mb']:.1f})"
+                )
+
+        if options['salida_json']:
+            with open(options['salida_json'], 'w') as archivo:
+                json.dump(resultados, archivo, indent=2)
@@ -0,0 +1,321 @@
+"""
+Recorre todas las rutas de gestion/urls.py (vistas HTML y API) con el
+cliente de pruebas de Django y mide por ruta:
+
+- latencia p50 / p95 / p99 y media (ms),
+- consultas SQL y tiempo SQL por petición,
+- memoria pico de Python durante una petición (tracemalloc, en una pasada
+  aparte para no inflar las latencias).
+
+Cada petición corre dentro de una transacción que se revierte, así las
+rutas que modifican datos (finalizar, cancelar, eliminar, pedidos, ...) se
+miden siempre sobre el mismo estado y la base queda como estaba. Los
+resultados se guardan en JSON para comparar corridas entre commits.
+
+Conviene generar antes datos con `generar_datos`. Los parámetros de las
+rutas (ids) se toman de la base: una venta y una compra pendientes, el
+primer cliente, etc.; las rutas sin datos para sus parámetros se omiten.
+Las vistas que superan su @presupuesto_consultas se marcan con "!".
+
+Uso:
+    python manage.py benchmark_rutas --json antes.json
+    python manage.py benchmark_rutas --repeticiones 50 --solo api/ --json despues.json --comparar antes.json
+"""
+import json
+import platform
+import statistics
+import subprocess
+import time
+import tracemalloc
+
+import django
+from django.contrib.auth.models import Group, User
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test import Client
+from django.urls import URLPattern, URLResolver, get_resolver
+from django.utils import timezone
+
+from gestion import autenticacion, busqueda
+from gestion.models import (
+    Categoria, Proveedor, Producto, Cliente, Venta, DetalleVenta,
+    Compra, DetalleCompra, MovimientoInventario, TrabajoReporte,
+)
+
+USUARIO = 'benchmark'
+CLAVE = 'benchmark-rutas'
+GRUPOS = ['administrador', 'vendedor', 'comprador']
+
+
+class _Revertir(Exception):
+    pass
+
+
+def recorrer_rutas(patrones=None, prefijo=''):
+    """
+    (ruta, nombre, vista) de cada patrón cuya vista es de la aplicación (no
+    el admin), con la ruta como texto del patrón. Las variantes .json/.api
+    del router se omiten: son la misma vista.
+    """
+    if patrones is None:
+        patrones = get_resolver().url_patterns
+    for patron in patrones:
+        texto = prefijo + str(patron.pattern)
+        if isinstance(patron, URLResolver):
+            yield from recorrer_rutas(patron.url_patterns, texto)
+        elif '(?P<format>' in texto:
+            continue
+        elif isinstance(patron, URLPattern) and patron.callback.__module__.startswith('gestion.'):
+            yield texto, patron.name, patron.callback
+
+
+def _primero(queryset):
+    return queryset.order_by('pk').values_list('pk', flat=True).first()
+
+
+def parametros_de_ejemplo():
+    """Valor de cada parámetro de ruta, según el nombre de la ruta."""
+    venta = _primero(Venta.objects.filter(estado='pendiente', detalles__isnull=False))
+    compra = _primero(Compra.objects.filter(estado='pendiente', detalles__isnull=False))
+    trabajo = _primero(TrabajoReporte.objects.filter(estado='completado'))
+    valores = {
+        'venta': venta,
+        'detalle_venta': _primero(DetalleVenta.objects.filter(venta_id=venta)),
+        'compra': compra,
+        'detalle_compra': _primero(DetalleCompra.objects.filter(compra_id=compra)),
+        'cliente': _primero(Cliente.objects.all()),
+        'proveedor': _primero(Proveedor.objects.all()),
+        'categoria': _primero(Categoria.objects.all()),
+        'producto': _primero(Producto.objects.all()),
+        'trabajo': trabajo,
+    }
+    #nombre de la ruta -> de que valor sale su id
+    por_ruta = {
+        'detalle_venta': 'venta', 'finalizar_venta': 'venta', 'cancelar_venta': 'venta',
+        'eliminar_detalle_venta': 'detalle_venta',
+        'detalle_compra': 'compra', 'finalizar_compra': 'compra', 'cancelar_compra': 'compra',
+        'eliminar_detalle_compra': 'detalle_compra',
+        'editar_cliente': 'cliente', 'eliminar_cliente': 'cliente',
+        'editar_proveedor': 'proveedor', 'eliminar_proveedor': 'proveedor',
+        'editar_categoria': 'categoria', 'eliminar_categoria': 'categoria',
+        'editar_producto': 'producto', 'eliminar_producto': 'producto', 'obtener_precio_producto': 'producto',
+        'estado_trabajo_reporte': 'trabajo', 'descargar_trabajo_reporte': 'trabajo',
+    }
+    return valores, por_ruta
+
+
+def armar_url(ruta, nombre, vista, valores, por_ruta):
+    """URL concreta para la ruta, o None si no hay datos para sus parámetros."""
+    url = ruta
+    if '(?P<pk>' in url:
+        #detalle de un viewset del router
+        modelo = getattr(getattr(vista, 'cls', None), 'queryset', None)
+        pk = _primero(modelo) if modelo is not None else None
+        if pk is None:
+            return None
+        url = url.replace('(?P<pk>[^/.]+)', str(pk))
+    #las rutas del router son expresiones regulares: se quitan las anclas
+    url = url.replace('^', '').replace('$', '')
+    if '<' not in url:
+        return '/' + url
+    if '<str:tipo>' in url:
+        return '/' + url.replace('<str:tipo>', 'ventas')
+    pk = valores.get(por_ruta.get(nombre))
+    if pk is None:
+        return None
+    for parametro in ('<int:id>', '<int:producto_id>'):
+        url = url.replace(parametro, str(pk))
+    return '/' + url
+
+
+def con_parametros(url, nombre, valores):
+    """Agrega los parámetros GET que algunas rutas necesitan para responder 200."""
+    if nombre == 'obtener_precios_productos' and valores['proveedor'] is not None:
+        return f"{url}?proveedor={valores['proveedor']}"
+    if nombre == 'api_buscar':
+        return f'{url}?q=tornillo'
+    return url
+
+
+def peticiones_especiales(valores):
+    """Rutas que se miden con POST y su cuerpo (las demás van por GET)."""
+    producto = Producto.objects.filter(cantidad__gt=0).order_by('pk').first()
+    return {
+        'api_login': {'username': USUARIO, 'password': CLAVE},
+        'api_logout': {},
+        'api_pedidos': {
+            'cliente': valores['cliente'],
+            'finalizar': True,
+            'lineas': [{'producto': producto.pk, 'cantidad': 1}] if producto else [],
+        },
+    }
+
+
+def percentil(datos, p):
+    ordenados = sorted(datos)
+    if not ordenados:
+        return None
+    posicion = (len(ordenados) - 1) * p / 100
+    bajo = int(posicion)
+    alto = min(bajo + 1, len(ordenados) - 1)
+    return ordenados[bajo] + (ordenados[alto] - ordenados[bajo]) * (posicion - bajo)
+
+
+class Command(BaseCommand):
+    help = 'Mide latencia, consultas SQL y memoria de cada ruta de la aplicación y guarda JSON.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeticiones', type=int, default=20, help='Peticiones medidas por ruta.')
+        parser.add_argument('--calentamiento', type=int, default=2, help='Peticiones sin medir antes de medir.')
+        parser.add_argument('--solo', nargs='*', default=[], help='Solo rutas que contengan alguno de estos textos.')
+        parser.add_argument('--tiempo-maximo', type=float, default=30,
+                            help='Segundos por ruta; al pasarlos se deja de repetir (y no se mide memoria).')
+        parser.add_argument('--sin-memoria', action='store_true', help='No medir memoria pico.')
+        parser.add_argument('--json', metavar='ARCHIVO', help='Guardar los resultados en un archivo JSON.')
+        parser.add_argument('--comparar', metavar='ARCHIVO', help='JSON de una corrida anterior para comparar p50.')
+
+    def handle(self, *args, **options):
+        usuario = self.preparar_usuario()
+        token, _ = autenticacion.crear_token(usuario, nombre='benchmark_rutas')
+        #un error 500 se mide como cualquier otra respuesta en vez de cortar la corrida
+        cliente = Client(raise_request_exception=False, HTTP_AUTHORIZATION=f'Token {token}')
+        cliente.force_login(usuario)
+
+        valores, por_ruta = parametros_de_ejemplo()
+        #un indice armado dentro de una transaccion no se conserva: se arma antes, fuera de ellas
+        for indice in busqueda.INDICES.values():
+            indice.vigente()
+        especiales = peticiones_especiales(valores)
+        resultados = []
+        for ruta, nombre, vista in recorrer_rutas():
+            url = armar_url(ruta, nombre, vista, valores, por_ruta)
+            if url is None:
+                self.stderr.write(f'{ruta}: sin datos para sus parámetros, se omite.')
+                continue
+            url = con_parametros(url, nombre, valores)
+            if options['solo'] and not any(texto in url for texto in options['solo']):
+                continue
+            metodo = 'post' if nombre in especiales else 'get'
+            fila = self.medir(cliente, metodo, url, especiales.get(nombre), options)
+            #presupuesto declarado con decorators.presupuesto_consultas (solo vistas HTML)
+            presupuesto = getattr(vista, 'presupuesto_consultas', None)
+            fila.update(ruta=url, nombre=nombre, presupuesto_consultas=presupuesto)
+            resultados.append(fila)
+            excedido = ' !' if presupuesto is not None and fila['consultas'] > presupuesto else ''
+            self.stdout.write(
+                f"{metodo.upper():<5}{url:<48} {fila['estado']}  p50 {fila['p50_ms']:>8.2f}  p95 {fila['p95_ms']:>8.2f}  "
+                f"p99 {fila['p99_ms']:>8.2f} ms  {fila['consultas']:>4} consultas  {fila['sql_ms']:>7.2f} ms SQL  "
+                f"{fila['memoria_pico_kb'] if fila['memoria_pico_kb'] is not None else '-':>7} KB{excedido}"
+            )
+
+        autenticacion.revocar_token(token)
+        salida = {'meta': self.meta(options), 'rutas': resultados}
+        if options['comparar']:
+            self.comparar(resultados, options['comparar'])
+        if options['json']:
+            with open(options['json'], 'w') as archivo:
+                json.dump(salida, archivo, indent=2)
+
+    def preparar_usuario(self):
+        usuario, _ = User.objects.get_or_create(username=USUARIO)
+        usuario.set_password(CLAVE)
+        usuario.save()
+        usuario.groups.add(*[Group.objects.get_or_create(name=nombre)[0] for nombre in GRUPOS])
+        return usuario
+
+    def una_peticion(self, cliente, metodo, url, datos):
+        """(estado, segundos, consultas, segundos SQL) de una petición que se revierte."""
+        tiempos_sql = []
+
+        def medir_sql(execute, sql, params, many, context):
+            inicio = time.perf_counter()
+            try:
+                return execute(sql, params, many, context)
+            finally:
+                tiempos_sql.append(time.perf_counter() - inicio)
+
+        respuesta = None
+        inicio = time.perf_counter()
+        try:
+            with transaction.atomic(), connection.execute_wrapper(medir_sql):
+                if metodo == 'post':
+                    respuesta = cliente.post(url, datos, content_type='application/json')
+                else:
+                    respuesta = cliente.get(url)
+                #las respuestas por streaming (PDF, CSV, archivos) se consumen completas
+                if respuesta.streaming:
+                    b''.join(respuesta.streaming_content)
+                raise _Revertir
+        except _Revertir:
+            pass
+        segundos = time.perf_counter() - inicio
+        respuesta.close()
+        return respuesta.status_code, segundos, len(tiempos_sql), sum(tiempos_sql)
+
+    def medir(self, cliente, metodo, url, datos, options):
+        for _ in range(options['calentamiento']):
+            if self.una_peticion(cliente, metodo, url, datos)[1] > options['tiempo_maximo']:
+                break
+
+        latencias, consultas, sql = [], [], []
+        estado = None
+        limite = time.perf_counter() + options['tiempo_maximo']
+        for _ in range(options['repeticiones']):
+            estado, segundos, n, segundos_sql = self.una_peticion(cliente, metodo, url, datos)
+            latencias.append(segundos * 1000)
+            consultas.append(n)
+            sql.append(segundos_sql * 1000)
+            if time.perf_counter() > limite:
+                break
+
+        memoria = None
+        #con tracemalloc una peticion tarda varias veces mas: se omite en las rutas que ya agotaron su tiempo
+        if not options['sin_memoria'] and time.perf_counter() <= limite:
+            tracemalloc.start()
+            try:
+                self.una_peticion(cliente, metodo, url, datos)
+                memoria = round(tracemalloc.get_traced_memory()[1] / 1024)
+            finally:
+                tracemalloc.stop()
+
+        return {
+            'metodo': metodo.upper(),
+            'estado': estado,
+            'repeticiones': len(latencias),
+            'p50_ms': round(percentil(latencias, 50), 3),
+            'p95_ms': round(percentil(latencias, 95), 3),
+            'p99_ms': round(percentil(latencias, 99), 3),
+            'media_ms': round(statistics.fmean(latencias), 3),
+            'consultas': round(statistics.fmean(consultas), 1),
+            'sql_ms': round(statistics.fmean(sql), 3),
+            'memoria_pico_kb': memoria,
+        }
+
+    def meta(self, options):
+        try:
+            commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                                    text=True, timeout=5).stdout.strip() or None
+        except (OSError, subprocess.SubprocessError):
+            commit = None
+        return {
+            'fecha': timezone.now().isoformat(),
+            'commit': commit,
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'base': connection.vendor,
+            'repeticiones': options['repeticiones'],
+            'filas': {modelo.__name__: modelo.objects.count() for modelo in (
+                Producto, Cliente, Proveedor, Venta, DetalleVenta, Compra, DetalleCompra, MovimientoInventario)},
+        }
+
+    def comparar(self, resultados, archivo):
+        with open(archivo) as entrada:
+            anteriores = {(fila['metodo'], fila['ruta']): fila for fila in json.load(entrada)['rutas']}
+        self.stdout.write(f'\nComparación de p50 contra {archivo}:')
+        for fila in resultados:
+            anterior = anteriores.get((fila['metodo'], fila['ruta']))
+            if anterior and anterior['p50_ms']:
+                self.stdout.write(
+                    f"{fila['ruta']:<52} {anterior['p50_ms']:>8.2f} -> {fila['p50_ms']:>8.2f} ms "
+                    f"(x{fila['p50_ms'] / anterior['p50_ms']:.2f})  consultas {anterior['consultas']} -> {fila['consultas']}"
+                )
@@ -0,0 +1,87 @@
+"""
+Compara la serialización de listas de la API con los ModelSerializer de
+siempre contra el camino rápido desde `.values()` (ver serializacion.py), en
+filas por segundo. Ambas mediciones incluyen la consulta a la base.
+
+Usa los datos que ya hay en la base.
+
+Uso:
+    python manage.py benchmark_serializacion
+    python manage.py benchmark_serializacion --filas 5000 --recurso ventas --fields numero_pedido,total
+"""
+import json
+import time
+
+from django.core.management.base import BaseCommand
+from rest_framework.renderers import JSONRenderer
+
+from gestion import api_views, serializacion
+
+RECURSOS = {
+    'productos': api_views.ProductoViewSet,
+    'ventas': api_views.VentaViewSet,
+    'compras': api_views.CompraViewSet,
+    'movimientos': api_views.MovimientoViewSet,
+}
+
+
+def _con_serializer(viewset, n, campos):
+    queryset = viewset.queryset.order_by(*viewset.ordering)[:n]
+    datos = viewset.serializer_class(queryset, many=True, context={'campos': campos}).data
+    return JSONRenderer().render(datos)
+
+
+def _rapido(viewset, n, campos):
+    queryset = viewset.queryset.prefetch_related(None).order_by(*viewset.ordering)
+    cols = serializacion.columnas(viewset.serializer_class, campos)
+    filas = list(queryset.values(*serializacion.rutas(cols, ['id']))[:n])
+    datos = serializacion.convertir_filas(filas, cols)
+    serializacion.serializar_anidados(datos, [fila['id'] for fila in filas], viewset.serializer_class,
+                                      queryset.model, campos)
+    return JSONRenderer().render(datos)
+
+
+def medir(funcion, viewset, n, campos, repeticiones):
+    mejor = None
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        salida = funcion(viewset, n, campos)
+        segundos = time.perf_counter() - inicio
+        mejor = segundos if mejor is None else min(mejor, segundos)
+    return mejor, len(salida)
+
+
+class Command(BaseCommand):
+    help = 'Mide filas por segundo del serializer de DRF contra la serialización rápida de la API.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--recurso', choices=list(RECURSOS), nargs='+', default=['productos', 'ventas'])
+        parser.add_argument('--filas', type=int, default=2000, help='Filas por medición.')
+        parser.add_argument('--fields', default='', help='Lista de campos, como ?fields= en la API.')
+        parser.add_argument('--repeticiones', type=int, default=3, help='Se informa la mejor.')
+        parser.add_argument('--json', metavar='ARCHIVO', help='Guardar los resultados en un archivo JSON.')
+
+    def handle(self, *args, **options):
+        campos = {campo.strip() for campo in options['fields'].split(',') if campo.strip()} or None
+        resultados = []
+        for recurso in options['recurso']:
+            viewset = RECURSOS[recurso]
+            filas = min(options['filas'], viewset.queryset.count())
+            if not filas:
+                self.stderr.write(f'{recurso}: no hay filas en la base, se omite.')
+                continue
+            fila = {'recurso': recurso, 'filas': filas}
+            for nombre, funcion in (('serializer', _con_serializer), ('rapido', _rapido)):
+                segundos, tamano = medir(funcion, viewset, filas, campos, options['repeticiones'])
+                fila[f'{nombre}_filas_s'] = round(filas / segundos)
+                fila[f'{nombre}_bytes'] = tamano
+            fila['aceleracion'] = round(fila['rapido_filas_s'] / fila['serializer_filas_s'], 1)
+            resultados.append(fila)
+            self.stdout.write(
+                f"{recurso:<12} {filas:>7} filas  serializer {fila['serializer_filas_s']:>9} filas/s  "
+                f"rapido {fila['rapido_filas_s']:>9} filas/s  x{fila['aceleracion']}"
+            )
+
+        if options['json']:
+            with open(options['json'], 'w') as archivo:
+                json.dump(resultados, archivo, indent=2)
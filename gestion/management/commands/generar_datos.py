@@ -0,0 +1,198 @@
+"""
+Genera un conjunto de datos sintéticos reproducible para pruebas de carga:
+categorías, proveedores, productos, clientes, ventas y compras con sus
+líneas, y los movimientos de inventario de las finalizadas.
+
+Todo se inserta con bulk_create en lotes; las fechas se reparten en los
+últimos meses. Con la misma --semilla y --escala se obtienen los mismos
+datos. Los códigos llevan el prefijo SIM- y --limpiar borra lo generado
+antes.
+
+Uso:
+    python manage.py generar_datos
+    python manage.py generar_datos --escala 10 --semilla 7 --limpiar
+    python manage.py generar_datos --productos 50000 --ventas 0
+"""
+import random
+from datetime import timedelta
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+
+from gestion import busqueda, resumenes
+from gestion.models import (
+    Categoria, Proveedor, Producto, Cliente, Venta, DetalleVenta,
+    Compra, DetalleCompra, MovimientoInventario, ResumenProductoMes,
+)
+from gestion.versiones import incrementar_version
+
+PREFIJO = 'SIM-'
+TAMANO_LOTE = 2000
+#cantidades con --escala 1
+BASE = {
+    'categorias': 20,
+    'proveedores': 50,
+    'productos': 2000,
+    'clientes': 1000,
+    'ventas': 5000,
+    'compras': 1000,
+}
+PALABRAS = ['Tornillo', 'Tuerca', 'Martillo', 'Cable', 'Tubo', 'Pintura', 'Llave', 'Broca', 'Cinta',
+            'Foco', 'Lija', 'Clavo', 'Sierra', 'Pala', 'Manguera', 'Candado', 'Bisagra', 'Taladro']
+DETALLES = ['de acero', 'galvanizado', 'plástico', 'industrial', 'pequeño', 'grande', 'rojo', 'negro',
+            'de cobre', 'reforzado', '1/2"', '3/4"', 'económico', 'premium']
+NOMBRES = ['Ana', 'Luis', 'María', 'José', 'Carlos', 'Lucía', 'Pedro', 'Sofía', 'Jorge', 'Elena']
+APELLIDOS = ['López', 'García', 'Pérez', 'Hernández', 'Morales', 'Castillo', 'Ramírez', 'Díaz']
+
+
+def _por_lotes(modelo, objetos):
+    return modelo.objects.bulk_create(objetos, batch_size=TAMANO_LOTE)
+
+
+def _fechas(azar, cantidad, meses):
+    """Fechas al azar en los últimos `meses` meses, en orden."""
+    ahora = timezone.now()
+    segundos = meses * 30 * 24 * 3600
+    return sorted(ahora - timedelta(seconds=azar.randrange(segundos)) for _ in range(cantidad))
+
+
+def _lineas(azar, productos, maximo):
+    elegidos = azar.sample(productos, min(len(productos), azar.randint(1, maximo)))
+    return [(producto, azar.randint(1, 10)) for producto in elegidos]
+
+
+class Command(BaseCommand):
+    help = 'Genera datos sintéticos reproducibles (bulk_create) para pruebas de carga.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--escala', type=float, default=1.0,
+                            help='Multiplica las cantidades base: ' + ', '.join(f'{k} {v}' for k, v in BASE.items()))
+        parser.add_argument('--semilla', type=int, default=1)
+        parser.add_argument('--meses', type=int, default=12, help='Meses hacia atrás en que se reparten las fechas.')
+        parser.add_argument('--lineas', type=int, default=5, help='Máximo de líneas por venta o compra.')
+        parser.add_argument('--limpiar', action='store_true', help='Borrar antes los datos generados (SIM-).')
+        for nombre in BASE:
+            parser.add_argument(f'--{nombre}', type=int, help=f'Cantidad de {nombre} (en vez de la escala).')
+
+    def handle(self, *args, **options):
+        cantidades = {
+            nombre: options[nombre] if options[nombre] is not None else max(1, round(base * options['escala']))
+            for nombre, base in BASE.items()
+        }
+        if cantidades['productos'] and not (cantidades['categorias'] and cantidades['proveedores']):
+            raise CommandError('Los productos necesitan al menos una categoría y un proveedor.')
+
+        with transaction.atomic():
+            if options['limpiar']:
+                self.limpiar()
+            elif Producto.objects.filter(codigo__startswith=PREFIJO).exists():
+                raise CommandError('Ya hay datos generados; use --limpiar para volver a generarlos.')
+            self.generar(random.Random(options['semilla']), cantidades, options['meses'], options['lineas'])
+
+            #los caminos masivos no disparan señales: se avisa a los caches y al indice de busqueda
+            resumenes.reconstruir()
+            incrementar_version(Categoria, Proveedor, Producto, Cliente, Venta, DetalleVenta,
+                                Compra, DetalleCompra, MovimientoInventario,
+                                *(indice.etiqueta for indice in busqueda.INDICES.values()))
+
+        self.stdout.write(', '.join(f'{cantidad} {nombre}' for nombre, cantidad in cantidades.items()) + ' generados.')
+
+    def limpiar(self):
+        #borrado directo en orden de dependencias: delete() mandaria una señal por fila
+        productos = Producto.objects.filter(codigo__startswith=PREFIJO)
+        ventas = Venta.objects.filter(numero_pedido__startswith=PREFIJO)
+        compras = Compra.objects.filter(numero_orden__startswith=PREFIJO)
+        for queryset in (
+            MovimientoInventario.objects.filter(producto__in=productos),
+            DetalleVenta.objects.filter(venta__in=ventas),
+            DetalleCompra.objects.filter(compra__in=compras),
+            ResumenProductoMes.objects.filter(producto__in=productos),
+            ventas, compras, productos,
+            Cliente.objects.filter(correo__endswith='@sim.example'),
+            Proveedor.objects.filter(empresa__startswith=PREFIJO),
+            Categoria.objects.filter(nombre__startswith=PREFIJO),
+        ):
+            queryset._raw_delete(queryset.db)
+
+    def generar(self, azar, cantidades, meses, max_lineas):
+        categorias = _por_lotes(Categoria, [
+            Categoria(nombre=f'{PREFIJO}Categoría {i}') for i in range(cantidades['categorias'])])
+        proveedores = _por_lotes(Proveedor, [
+            Proveedor(empresa=f'{PREFIJO}Distribuidora {i}', contacto=azar.choice(NOMBRES),
+                      telefono=f'{azar.randrange(10 ** 8):08d}', direccion=f'Zona {azar.randint(1, 25)}')
+            for i in range(cantidades['proveedores'])])
+        productos = []
+        for i in range(cantidades['productos']):
+            costo = Decimal(azar.randint(100, 50000)) / 100
+            productos.append(Producto(
+                codigo=f'{PREFIJO}{i:07d}',
+                nombre=f'{azar.choice(PALABRAS)} {azar.choice(DETALLES)} {i}',
+                precio_compra=costo, precio_venta=(costo * Decimal('1.3')).quantize(Decimal('0.01')),
+                cantidad=azar.randint(0, 500),
+                categoria=azar.choice(categorias), proveedor=azar.choice(proveedores),
+            ))
+        productos = _por_lotes(Producto, productos)
+        clientes = _por_lotes(Cliente, [
+            Cliente(nombre=f'{azar.choice(NOMBRES)} {azar.choice(APELLIDOS)} {i}', direccion=f'Zona {azar.randint(1, 25)}',
+                    telefono=f'{azar.randrange(10 ** 8):08d}', correo=f'cliente{i}@sim.example')
+            for i in range(cantidades['clientes'])])
+
+        if cantidades['ventas'] and productos and clientes:
+            self.generar_ventas(azar, cantidades['ventas'], productos, clientes, meses, max_lineas)
+        if cantidades['compras'] and productos:
+            self.generar_compras(azar, cantidades['compras'], productos, meses, max_lineas)
+
+    def generar_ventas(self, azar, cantidad, productos, clientes, meses, max_lineas):
+        lineas = [_lineas(azar, productos, max_lineas) for _ in range(cantidad)]
+        ventas = [
+            Venta(numero_pedido=f'{PREFIJO}PED-{i:07d}', cliente=azar.choice(clientes),
+                  estado=azar.choices(['completado', 'pendiente', 'cancelado'], [85, 10, 5])[0],
+                  total=sum(producto.precio_venta * unidades for producto, unidades in lineas_venta))
+            for i, lineas_venta in enumerate(lineas)
+        ]
+        ventas = _por_lotes(Venta, ventas)
+        self.repartir_fechas(Venta, ventas, azar, meses)
+        _por_lotes(DetalleVenta, [
+            DetalleVenta(venta=venta, producto=producto, cantidad=unidades, precio_unitario=producto.precio_venta)
+            for venta, lineas_venta in zip(ventas, lineas) for producto, unidades in lineas_venta])
+        self.generar_movimientos('salida', 'venta_asociada', ventas, lineas, 'completado')
+
+    def generar_compras(self, azar, cantidad, productos, meses, max_lineas):
+        por_proveedor = {}
+        for producto in productos:
+            por_proveedor.setdefault(producto.proveedor_id, []).append(producto)
+        grupos = list(por_proveedor.values())
+        lineas = [_lineas(azar, azar.choice(grupos), max_lineas) for _ in range(cantidad)]
+        compras = [
+            Compra(numero_orden=f'{PREFIJO}OC-{i:07d}', proveedor_id=lineas_compra[0][0].proveedor_id,
+                   estado=azar.choices(['recibida', 'pendiente', 'cancelada'], [80, 15, 5])[0],
+                   total=sum(producto.precio_compra * unidades for producto, unidades in lineas_compra))
+            for i, lineas_compra in enumerate(lineas)
+        ]
+        compras = _por_lotes(Compra, compras)
+        self.repartir_fechas(Compra, compras, azar, meses)
+        _por_lotes(DetalleCompra, [
+            DetalleCompra(compra=compra, producto=producto, cantidad=unidades, costo_unitario=producto.precio_compra,
+                          cantidad_recibida=unidades if compra.estado == 'recibida' else 0)
+            for compra, lineas_compra in zip(compras, lineas) for producto, unidades in lineas_compra])
+        self.generar_movimientos('entrada', 'compra_asociada', compras, lineas, 'recibida')
+
+    def repartir_fechas(self, modelo, objetos, azar, meses):
+        #fecha es auto_now_add: bulk_create pone la fecha actual y se corrige despues
+        for objeto, fecha in zip(objetos, _fechas(azar, len(objetos), meses)):
+            objeto.fecha = fecha
+        modelo.objects.bulk_update(objetos, ['fecha'], batch_size=TAMANO_LOTE)
+
+    def generar_movimientos(self, tipo, relacion, documentos, lineas, estado):
+        movimientos = [
+            MovimientoInventario(tipo=tipo, producto=producto, cantidad=unidades, **{relacion: documento})
+            for documento, lineas_documento in zip(documentos, lineas) if documento.estado == estado
+            for producto, unidades in lineas_documento
+        ]
+        movimientos = _por_lotes(MovimientoInventario, movimientos)
+        fechas = {documento.pk: documento.fecha for documento in documentos}
+        for movimiento in movimientos:
+            movimiento.fecha = fechas[getattr(movimiento, f'{relacion}_id')]
+        MovimientoInventario.objects.bulk_update(movimientos, ['fecha'], batch_size=TAMANO_LOTE)
@@ -0,0 +1,78 @@
+"""
+Lista y muestra los perfiles guardados por PerfiladoMiddleware (perfilado.py).
+
+Uso:
+    python manage.py perfiles                      # lista, el más reciente primero
+    python manage.py perfiles --ver NOMBRE         # funciones más costosas y consultas SQL
+    python manage.py perfiles --ver NOMBRE --orden tottime --lineas 40
+    python manage.py perfiles --copiar NOMBRE --destino /tmp
+    python manage.py perfiles --limpiar
+"""
+import io
+import os
+import pstats
+import shutil
+
+from django.core.management.base import BaseCommand, CommandError
+
+from gestion import perfilado
+
+
+class Command(BaseCommand):
+    help = 'Lista, muestra o copia los perfiles de requests guardados.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--ver', metavar='NOMBRE', help='Mostrar el resumen de un perfil.')
+        parser.add_argument('--orden', default='cumulative', help='Orden de pstats (cumulative, tottime, calls, ...).')
+        parser.add_argument('--lineas', type=int, default=25, help='Funciones y consultas a mostrar.')
+        parser.add_argument('--copiar', metavar='NOMBRE', help='Copiar el .prof y el .json de un perfil.')
+        parser.add_argument('--destino', default='.', help='Directorio destino de --copiar.')
+        parser.add_argument('--limpiar', action='store_true', help='Borrar todos los perfiles.')
+
+    def handle(self, *args, **options):
+        if options['limpiar']:
+            perfilado.eliminar_todos()
+            self.stdout.write('Perfiles eliminados.')
+        elif options['ver']:
+            self.ver(options['ver'], options['orden'], options['lineas'])
+        elif options['copiar']:
+            for extension in ('.prof', '.json'):
+                shutil.copy(self.ruta(options['copiar'], extension), options['destino'])
+            self.stdout.write(f"Copiado a {os.path.abspath(options['destino'])}.")
+        else:
+            self.listar()
+
+    def ruta(self, nombre, extension):
+        ruta = perfilado.ruta(nombre, extension)
+        if ruta is None:
+            raise CommandError(f'No existe el perfil {nombre}.')
+        return ruta
+
+    def listar(self):
+        perfiles = perfilado.listar()
+        if not perfiles:
+            self.stdout.write(f'No hay perfiles en {perfilado.directorio()}.')
+            return
+        for perfil in perfiles:
+            self.stdout.write(
+                f"{perfil['nombre']:<48} {perfil['metodo']:<6} {perfil['estado']}  {perfil['duracion_ms']:>9} ms  "
+                f"{len(perfil['consultas']):>4} consultas  {perfil['motivo']:<7}  {perfil['ruta']}"
+            )
+
+    def ver(self, nombre, orden, lineas):
+        datos = perfilado.listar()
+        datos = next((perfil for perfil in datos if perfil['nombre'] == nombre), None)
+        if datos is None:
+            raise CommandError(f'No existe el perfil {nombre}.')
+        self.stdout.write(f"{datos['metodo']} {datos['ruta']} -> {datos['estado']} en {datos['duracion_ms']} ms "
+                          f"({datos['vista']}, {datos['motivo']}, {datos['fecha']})")
+
+        salida = io.StringIO()
+        estadisticas = pstats.Stats(self.ruta(nombre, '.prof'), stream=salida)
+        estadisticas.strip_dirs().sort_stats(orden).print_stats(lineas)
+        self.stdout.write(salida.getvalue())
+
+        consultas = sorted(datos['consultas'], key=lambda consulta: -consulta['ms'])
+        self.stdout.write(f"{len(consultas)} consultas SQL, {datos['sql_ms']} ms; las más lentas:")
+        for consulta in consultas[:lineas]:
+            self.stdout.write(f"{consulta['ms']:>9.3f} ms  {consulta['sql']}")
@@ -0,0 +1,57 @@
+"""
+Worker de exportación de reportes en segundo plano.
+
+Uso:
+    python manage.py procesar_reportes             # corre indefinidamente
+    python manage.py procesar_reportes --una-vez   # procesa lo pendiente y termina
+    python manage.py procesar_reportes --limpiar 7 # borra trabajos de más de 7 días
+"""
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from gestion import trabajos
+
+
+class Command(BaseCommand):
+    help = 'Procesa los trabajos de exportación de reportes pendientes.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--una-vez', action='store_true', help='Procesar lo pendiente y terminar.')
+        parser.add_argument('--intervalo', type=float, default=2.0,
+                            help='Segundos de espera cuando no hay trabajos.')
+        parser.add_argument('--abandonados', type=int, default=30,
+                            help='Minutos tras los cuales un trabajo en proceso se considera abandonado.')
+        parser.add_argument('--limpiar', type=int, metavar='DIAS',
+                            help='Borrar trabajos y archivos con más de DIAS días y terminar.')
+
+    def handle(self, *args, **options):
+        if options['limpiar'] is not None:
+            borrados = trabajos.limpiar(options['limpiar'])
+            self.stdout.write(f'{borrados} trabajos eliminados.')
+            return
+
+        liberados = trabajos.liberar_abandonados(options['abandonados'])
+        if liberados:
+            self.stdout.write(f'{liberados} trabajos abandonados devueltos a la cola.')
+
+        while True:
+            close_old_connections()
+            trabajo = trabajos.tomar_siguiente()
+            if trabajo is None:
+                if options['una_vez']:
+                    return
+                time.sleep(options['intervalo'])
+                continue
+
+            inicio = time.monotonic()
+            try:
+                trabajos.procesar(trabajo)
+            except Exception as error:
+                self.stderr.write(f'Trabajo {trabajo.pk} ({trabajo.tipo}.{trabajo.formato}) falló: {error}')
+                continue
+            self.stdout.write(
+                f'Trabajo {trabajo.pk} ({trabajo.tipo}.{trabajo.formato}) listo '
+                f'en {time.monotonic() - inicio:.1f} s'
+            )
@@ -0,0 +1,21 @@
+"""
+Recalcula desde cero los resúmenes mensuales del dashboard.
+
+Uso:
+    python manage.py reconstruir_resumenes
+"""
+from django.core.management.base import BaseCommand
+
+from gestion import resumenes
+from gestion.models import ResumenProductoMes, ResumenVentasMes
+
+
+class Command(BaseCommand):
+    help = 'Recalcula los resúmenes mensuales de ventas y productos vendidos.'
+
+    def handle(self, *args, **options):
+        resumenes.reconstruir()
+        self.stdout.write(
+            f'{ResumenVentasMes.objects.count()} meses y '
+            f'{ResumenProductoMes.objects.count()} filas producto/mes recalculadas.'
+        )
@@ -0,0 +1,239 @@
+"""
+Métricas por ruta (nombre de la URL resuelta) en formato de texto de Prometheus.
+
+MetricasMiddleware mide cada request: duración, cantidad de consultas SQL y
+su tiempo (connection.execute_wrapper) y tamaño de la respuesta. Los valores
+se acumulan en memoria en REGISTRO, como contadores e histogramas.
+
+Con varios workers (gunicorn) cada proceso guarda cada INTERVALO segundos
+una copia de sus métricas en METRICAS_DIR (un archivo JSON por proceso) y
+/metrics suma los archivos de todos; el directorio se debe vaciar al
+arrancar el servidor. Sin METRICAS_DIR solo se ven las del proceso que
+atiende /metrics.
+
+Las respuestas por streaming se miden hasta que la vista las devuelve; su
+tamaño es el Content-Length si lo traen.
+"""
+import json
+import os
+import threading
+import time
+import uuid
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connection
+from django.utils.deprecation import MiddlewareMixin
+
+#limites de los histogramas (Prometheus usa el limite superior, "le")
+SEGUNDOS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+CONSULTAS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+BYTES = (1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+
+#nombre: (tipo, ayuda, limites del histograma)
+METRICAS = {
+    'gestion_peticiones_total': ('counter', 'Requests atendidos por vista, método y código.', None),
+    'gestion_peticion_segundos': ('histogram', 'Duración de los requests.', SEGUNDOS),
+    'gestion_peticion_consultas': ('histogram', 'Consultas SQL por request.', CONSULTAS),
+    'gestion_peticion_sql_segundos': ('histogram', 'Tiempo en la base de datos por request.', SEGUNDOS),
+    'gestion_respuesta_bytes': ('histogram', 'Tamaño del cuerpo de la respuesta.', BYTES),
+}
+#cada cuanto un proceso guarda sus metricas en METRICAS_DIR (segundos)
+INTERVALO = 5.0
+SIN_RUTA = '<sin_ruta>'
+
+
+class Registro:
+    """Contadores e histogramas de este proceso, por (métrica, etiquetas)."""
+
+    def __init__(self):
+        self.series = {}
+        self.candado = threading.Lock()
+        self.archivo = f'{os.getpid()}-{uuid.uuid4().hex[:8]}.json'
+        self.guardado = 0.0
+
+    def sumar(self, nombre, etiquetas, valor=1):
+        clave = (nombre, etiquetas)
+        with self.candado:
+            self.series[clave] = self.series.get(clave, 0) + valor
+
+    def observar(self, nombre, etiquetas, valor):
+        limites = METRICAS[nombre][2]
+        clave = (nombre, etiquetas)
+        with self.candado:
+            #un contador por limite, y al final la suma y la cantidad de observaciones
+            serie = self.series.get(clave)
+            if serie is None:
+                serie = self.series[clave] = [0] * (len(limites) + 2)
+            for i, limite in enumerate(limites):
+                if valor <= limite:
+                    serie[i] += 1
+            serie[-2] += valor
+            serie[-1] += 1
+
+    def copia(self):
+        with self.candado:
+            return [[nombre, list(map(list, etiquetas)), list(valor) if isinstance(valor, list) else valor]
+                    for (nombre, etiquetas), valor in self.series.items()]
+
+    def guardar(self, directorio, forzar=False):
+        """Escribe la copia de este proceso en `directorio` si pasó INTERVALO."""
+        ahora = time.monotonic()
+        if not forzar and ahora - self.guardado < INTERVALO:
+            return
+        self.guardado = ahora
+        os.makedirs(directorio, exist_ok=True)
+        ruta = os.path.join(directorio, self.archivo)
+        temporal = f'{ruta}.tmp'
+        with open(temporal, 'w') as archivo:
+            json.dump(self.copia(), archivo)
+        os.replace(temporal, ruta)
+
+
+REGISTRO = Registro()
+
+
+def _directorio():
+    return getattr(settings, 'METRICAS_DIR', None)
+
+
+def juntar(copias):
+    """Suma las copias de varios procesos: {(nombre, etiquetas): valor}."""
+    total = {}
+    for copia in copias:
+        for nombre, etiquetas, valor in copia:
+            if nombre not in METRICAS:
+                continue #de una version anterior del codigo
+            clave = (nombre, tuple(map(tuple, etiquetas)))
+            anterior = total.get(clave)
+            if anterior is None:
+                total[clave] = list(valor) if isinstance(valor, list) else valor
+            elif isinstance(valor, list):
+                total[clave] = [a + b for a, b in zip(anterior, valor)]
+            else:
+                total[clave] = anterior + valor
+    return total
+
+
+def leer_copias(directorio):
+    copias = []
+    for nombre in os.listdir(directorio):
+        if not nombre.endswith('.json'):
+            continue
+        try:
+            with open(os.path.join(directorio, nombre)) as archivo:
+                copias.append(json.load(archivo))
+        except (OSError, ValueError):
+            continue #un proceso lo esta reemplazando o quedo a medias
+    return copias
+
+
+def _etiquetas_texto(etiquetas, extra=()):
+    def escapar(valor):
+        return str(valor).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+    pares = [f'{clave}="{escapar(valor)}"' for clave, valor in (*etiquetas, *extra)]
+    return '{' + ','.join(pares) + '}' if pares else ''
+
+
+def _numero(valor):
+    return repr(float(valor)) if isinstance(valor, float) else str(valor)
+
+
+def texto_prometheus():
+    """Las métricas de todos los procesos en el formato de exposición de Prometheus."""
+    directorio = _directorio()
+    if directorio:
+        REGISTRO.guardar(directorio, forzar=True)
+        series = juntar(leer_copias(directorio))
+    else:
+        series = juntar([REGISTRO.copia()])
+
+    lineas = []
+    for nombre, (tipo, ayuda, limites) in METRICAS.items():
+        lineas += [f'# HELP {nombre} {ayuda}', f'# TYPE {nombre} {tipo}']
+        for (serie, etiquetas), valor in sorted(series.items()):
+            if serie != nombre:
+                continue
+            if tipo == 'counter':
+                lineas.append(f'{nombre}{_etiquetas_texto(etiquetas)} {_numero(valor)}')
+                continue
+            for limite, acumulado in zip(limites, valor):
+                lineas.append(f'{nombre}_bucket{_etiquetas_texto(etiquetas, [("le", limite)])} {acumulado}')
+            lineas.append(f'{nombre}_bucket{_etiquetas_texto(etiquetas, [("le", "+Inf")])} {valor[-1]}')
+            lineas.append(f'{nombre}_sum{_etiquetas_texto(etiquetas)} {_numero(valor[-2])}')
+            lineas.append(f'{nombre}_count{_etiquetas_texto(etiquetas)} {valor[-1]}')
+    return '\n'.join(lineas) + '\n'
+
+
+def _tamano(respuesta):
+    if not respuesta.streaming:
+        return len(respuesta.content)
+    largo = respuesta.get('Content-Length')
+    return int(largo) if largo and largo.isdigit() else None
+
+
+class _Medicion:
+    """Tiempo y consultas SQL de un request en curso (wrapper de execute)."""
+
+    def __init__(self):
+        self.inicio = time.perf_counter()
+        self.consultas = 0
+        self.segundos_sql = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        inicio = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.consultas += 1
+            self.segundos_sql += time.perf_counter() - inicio
+
+
+class MetricasMiddleware(MiddlewareMixin):
+    """
+    Registra las métricas de cada request por nombre de ruta. Con
+    METRICAS_SERVER_TIMING agrega el header Server-Timing (tiempo total y de
+    base de datos) para verlo en las herramientas del navegador.
+
+    Bajo ASGI MiddlewareMixin corre process_request y process_response en el
+    hilo del request, el mismo en que se ejecutan sus consultas.
+    """
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'METRICAS_ACTIVAS', True):
+            raise MiddlewareNotUsed
+        super().__init__(get_response)
+
+    def process_request(self, request):
+        request._metricas = _Medicion()
+        connection.execute_wrappers.append(request._metricas)
+
+    def process_response(self, request, respuesta):
+        medicion = getattr(request, '_metricas', None)
+        if medicion is None:
+            return respuesta
+        connection.execute_wrappers.remove(medicion)
+        duracion = time.perf_counter() - medicion.inicio
+
+        coincidencia = getattr(request, 'resolver_match', None)
+        vista = coincidencia.view_name if coincidencia else SIN_RUTA
+        etiquetas = (('vista', vista), ('metodo', request.method))
+        REGISTRO.sumar('gestion_peticiones_total', etiquetas + (('codigo', str(respuesta.status_code)),))
+        REGISTRO.observar('gestion_peticion_segundos', etiquetas, duracion)
+        REGISTRO.observar('gestion_peticion_consultas', etiquetas, medicion.consultas)
+        REGISTRO.observar('gestion_peticion_sql_segundos', etiquetas, medicion.segundos_sql)
+        tamano = _tamano(respuesta)
+        if tamano is not None:
+            REGISTRO.observar('gestion_respuesta_bytes', etiquetas, tamano)
+
+        directorio = _directorio()
+        if directorio:
+            REGISTRO.guardar(directorio)
+
+        if getattr(settings, 'METRICAS_SERVER_TIMING', False):
+            tiempos = (f'db;dur={medicion.segundos_sql * 1000:.1f};desc="{medicion.consultas} consultas", '
+                       f'total;dur={duracion * 1000:.1f}')
+            anterior = respuesta.get('Server-Timing')
+            respuesta['Server-Timing'] = f'{anterior}, {tiempos}' if anterior else tiempos
+        return respuesta
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.8 on 2026-10-18 11:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gestion', '0002_alter_cliente_telefono_alter_proveedor_telefono'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='cliente',
+            index=models.Index(fields=['nombre', 'id'], name='gestion_cli_nombre_4cb011_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='compra',
+            index=models.Index(fields=['fecha', 'id'], name='gestion_com_fecha_0c207d_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='movimientoinventario',
+            index=models.Index(fields=['fecha', 'id'], name='gestion_mov_fecha_396e4e_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='producto',
+            index=models.Index(fields=['nombre', 'id'], name='gestion_pro_nombre_667c05_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='venta',
+            index=models.Index(fields=['fecha', 'id'], name='gestion_ven_fecha_313481_idx'),
+        ),
+    ]
@@ -0,0 +1,65 @@
+# Generated by Django 5.2.8 on 2026-10-18 12:08
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, DateField, Sum
+from django.db.models.functions import TruncMonth
+
+
+def poblar_resumenes(apps, schema_editor):
+    """
+    Calcula los resúmenes mensuales con las ventas completadas que ya existían
+    (lo mismo que resumenes.reconstruir, con los modelos de la migración).
+    """
+    Venta = apps.get_model('gestion', 'Venta')
+    DetalleVenta = apps.get_model('gestion', 'DetalleVenta')
+    ResumenVentasMes = apps.get_model('gestion', 'ResumenVentasMes')
+    ResumenProductoMes = apps.get_model('gestion', 'ResumenProductoMes')
+
+    ResumenVentasMes.objects.all().delete()
+    ResumenVentasMes.objects.bulk_create([
+        ResumenVentasMes(mes=fila['mes'], total=fila['total'], num_ventas=fila['num_ventas'])
+        for fila in Venta.objects.filter(estado='completado')
+        .annotate(mes=TruncMonth('fecha', output_field=DateField()))
+        .values('mes').annotate(total=Sum('total'), num_ventas=Count('id')).order_by()
+    ], batch_size=1000)
+
+    ResumenProductoMes.objects.all().delete()
+    ResumenProductoMes.objects.bulk_create([
+        ResumenProductoMes(mes=fila['mes'], producto_id=fila['producto'], cantidad=fila['cantidad'])
+        for fila in DetalleVenta.objects.filter(venta__estado='completado')
+        .annotate(mes=TruncMonth('venta__fecha', output_field=DateField()))
+        .values('mes', 'producto').annotate(cantidad=Sum('cantidad')).order_by()
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gestion', '0004_trabajos_reportes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ResumenVentasMes',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('mes', models.DateField(unique=True)),
+                ('total', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('num_ventas', models.IntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ResumenProductoMes',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('mes', models.DateField()),
+                ('cantidad', models.BigIntegerField(default=0)),
+                ('producto', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='gestion.producto')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('mes', 'producto'), name='resumen_producto_mes_unico')],
+            },
+        ),
+        migrations.RunPython(poblar_resumenes, migrations.RunPython.noop),
+    ]
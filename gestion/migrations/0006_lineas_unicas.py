@@ -0,0 +1,39 @@
+# Generated by Django 5.2.8 on 2026-10-18 12:10
+
+from django.db import migrations, models
+from django.db.models import Count, Max, Min, Sum
+
+
+def unir_lineas_duplicadas(apps, schema_editor):
+    """Une las líneas repetidas de un mismo producto antes de crear las restricciones."""
+    for modelo, campo, precio in (('DetalleVenta', 'venta', 'precio_unitario'),
+                                  ('DetalleCompra', 'compra', 'costo_unitario')):
+        Linea = apps.get_model('gestion', modelo)
+        repetidas = (Linea.objects.values(campo, 'producto')
+                     .annotate(n=Count('id'), primera=Min('id'), ultima=Max('id'), cantidad=Sum('cantidad'))
+                     .filter(n__gt=1).order_by())
+        for grupo in repetidas:
+            #se conserva la primera linea con la cantidad sumada y el precio de la ultima
+            ultimo_precio = Linea.objects.values_list(precio, flat=True).get(pk=grupo['ultima'])
+            Linea.objects.filter(pk=grupo['primera']).update(cantidad=grupo['cantidad'], **{precio: ultimo_precio})
+            Linea.objects.filter(**{campo: grupo[campo], 'producto': grupo['producto']}).exclude(
+                pk=grupo['primera']).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gestion', '0005_resumenes_mensuales'),
+    ]
+
+    operations = [
+        migrations.RunPython(unir_lineas_duplicadas, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='detallecompra',
+            constraint=models.UniqueConstraint(fields=('compra', 'producto'), name='detalle_compra_producto_unico'),
+        ),
+        migrations.AddConstraint(
+            model_name='detalleventa',
+            constraint=models.UniqueConstraint(fields=('venta', 'producto'), name='detalle_venta_producto_unico'),
+        ),
+    ]
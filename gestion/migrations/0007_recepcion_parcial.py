@@ -0,0 +1,31 @@
+# Generated by Django 5.2.8 on 2026-10-18 12:12
+
+from django.db import migrations, models
+from django.db.models import F
+
+
+def marcar_recibidas(apps, schema_editor):
+    """Las órdenes ya recibidas se recibieron completas."""
+    DetalleCompra = apps.get_model('gestion', 'DetalleCompra')
+    DetalleCompra.objects.filter(compra__estado='recibida').update(cantidad_recibida=F('cantidad'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gestion', '0006_lineas_unicas'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='detallecompra',
+            name='cantidad_recibida',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(marcar_recibidas, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='compra',
+            name='estado',
+            field=models.CharField(choices=[('pendiente', 'Pendiente'), ('parcial', 'Recibida parcialmente'), ('recibida', 'Recibida'), ('cancelada', 'Cancelada')], default='pendiente', max_length=20),
+        ),
+    ]
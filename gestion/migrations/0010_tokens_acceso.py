@@ -0,0 +1,48 @@
+# Generated by Django 5.2.8 on 2026-10-18 12:31
+
+import hashlib
+from datetime import timedelta
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def pasar_tokens_existentes(apps, schema_editor):
+    """Los tokens de authtoken siguen sirviendo: se guarda su hash con el vencimiento normal."""
+    Token = apps.get_model('authtoken', 'Token')
+    TokenAcceso = apps.get_model('gestion', 'TokenAcceso')
+    expira = timezone.now() + timedelta(hours=getattr(settings, 'TOKEN_DURACION_HORAS', 24 * 7))
+    TokenAcceso.objects.bulk_create([
+        TokenAcceso(usuario_id=token.user_id, clave_hash=hashlib.sha256(token.key.encode()).hexdigest(),
+                    nombre='authtoken', expira=expira)
+        for token in Token.objects.all()
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gestion', '0009_indices_filtros_api'),
+        ('authtoken', '0004_alter_tokenproxy_options'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TokenAcceso',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('clave_hash', models.CharField(max_length=64, unique=True)),
+                ('nombre', models.CharField(blank=True, max_length=100)),
+                ('creado', models.DateTimeField(auto_now_add=True)),
+                ('expira', models.DateTimeField()),
+                ('usuario', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='tokens_acceso', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['usuario', 'expira'], name='gestion_tok_usuario_70c4ef_idx')],
+            },
+        ),
+        migrations.RunPython(pasar_tokens_existentes, migrations.RunPython.noop),
+    ]
@@ -1,6 +1,30 @@
 from django.db import models
 from django.core.validators import MinValueValidator
 
+
+class QuerySetBusqueda(models.QuerySet):
+    """
+    QuerySet de los modelos del índice de búsqueda (busqueda.py): update y
+    bulk_create no mandan señales, así que avisan ellos mismos cuando tocan
+    un campo indexado (bulk_update pasa por update).
+    """
+
+    def _avisar_busqueda(self, campos=None):
+        from .busqueda import cambio_masivo
+        cambio_masivo(self.model, campos)
+
+    def update(self, **kwargs):
+        filas = super().update(**kwargs)
+        if filas:
+            self._avisar_busqueda(kwargs)
+        return filas
+
+    def bulk_create(self, objs, *args, **kwargs):
+        creados = super().bulk_create(objs, *args, **kwargs)
+        if creados:
+            self._avisar_busqueda()
+        return creados
+
 #inventario
 class Categoria(models.Model):
     nombre = models.CharField(max_length=100)
@@ -14,6 +38,8 @@ class Proveedor(models.Model):
     telefono = models.CharField(max_length=8)
     direccion = models.TextField()
 
+    objects = QuerySetBusqueda.as_manager()
+
     def __str__(self):
         return self.empresa
 
@@ -27,6 +53,14 @@ class Producto(models.Model):
     proveedor = models.ForeignKey(Proveedor, on_delete=models.SET_NULL, null=True)
     categoria = models.ForeignKey(Categoria, on_delete=models.SET_NULL, null=True)
 
+    objects = QuerySetBusqueda.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['nombre', 'id']), #paginacion por cursor
+            models.Index(fields=['cantidad']), #filtro de stock bajo
+        ]
+
     def __str__(self):
         return f"{self.codigo} - {self.nombre}"
 
@@ -37,6 +71,11 @@ class Cliente(models.Model):
     telefono = models.CharField(max_length=8)
     correo = models.EmailField()
 
+    objects = QuerySetBusqueda.as_manager()
+
+    class Meta:
+        indexes = [models.Index(fields=['nombre', 'id'])]
+
     def __str__(self):
         return self.nombre
 
@@ -53,6 +92,14 @@ class Venta(models.Model):
     estado = models.CharField(max_length=20, choices=ESTADOS, default='pendiente')
     total = models.DecimalField(max_digits=10, decimal_places=2, default=0)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['fecha', 'id']),
+            #filtros de la API
+            models.Index(fields=['estado', 'fecha']),
+            models.Index(fields=['cliente', 'fecha']),
+        ]
+
     def __str__(self):
         return f"Pedido {self.numero_pedido} - {self.cliente}"
 
@@ -62,6 +109,11 @@ class DetalleVenta(models.Model):
     cantidad = models.PositiveIntegerField(validators=[MinValueValidator(1)])
     precio_unitario = models.DecimalField(max_digits=10, decimal_places=2)
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['venta', 'producto'], name='detalle_venta_producto_unico'),
+        ]
+
     def subtotal(self):
         return self.cantidad * self.precio_unitario
 
@@ -69,6 +121,7 @@ class DetalleVenta(models.Model):
 class Compra(models.Model):
     ESTADOS = [
         ('pendiente', 'Pendiente'),
+        ('parcial', 'Recibida parcialmente'),
         ('recibida', 'Recibida'),
         ('cancelada', 'Cancelada'),
     ]
@@ -79,6 +132,14 @@ class Compra(models.Model):
     estado = models.CharField(max_length=20, choices=ESTADOS, default='pendiente')
     total = models.DecimalField(max_digits=10, decimal_places=2, default=0)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['fecha', 'id']),
+            #filtros de la API
+            models.Index(fields=['estado', 'fecha']),
+            models.Index(fields=['proveedor', 'fecha']),
+        ]
+
     def __str__(self):
         return f"Orden {self.numero_orden} - {self.proveedor}"
 
@@ -87,6 +148,15 @@ class DetalleCompra(models.Model):
     producto = models.ForeignKey(Producto, on_delete=models.CASCADE)
     cantidad = models.PositiveIntegerField(validators=[MinValueValidator(1)])
     costo_unitario = models.DecimalField(max_digits=10, decimal_places=2)
+    cantidad_recibida = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['compra', 'producto'], name='detalle_compra_producto_unico'),
+        ]
+
+    def pendiente_recibir(self):
+        return self.cantidad - self.cantidad_recibida
 
 #movimientos de inventario
 class MovimientoInventario(models.Model):
@@ -101,6 +171,120 @@ class MovimientoInventario(models.Model):
     cantidad = models.PositiveIntegerField()
     venta_asociada = models.ForeignKey(Venta, on_delete=models.SET_NULL, null=True, blank=True)
     compra_asociada = models.ForeignKey(Compra, on_delete=models.SET_NULL, null=True, blank=True)
-    
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['fecha', 'id']),
+            #filtros de la API
+            models.Index(fields=['producto', 'fecha']),
+            models.Index(fields=['tipo', 'fecha']),
+        ]
+
+    def __str__(self):
+        return f"{self.tipo} - {self.producto} ({self.cantidad})"
+
+#resumenes mensuales para el dashboard (solo ventas completadas)
+class ResumenVentasMes(models.Model):
+    mes = models.DateField(unique=True) #primer dia del mes
+    total = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    num_ventas = models.IntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.mes:%Y-%m}: Q{self.total}"
+
+class ResumenProductoMes(models.Model):
+    mes = models.DateField()
+    producto = models.ForeignKey(Producto, on_delete=models.CASCADE)
+    cantidad = models.BigIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['mes', 'producto'], name='resumen_producto_mes_unico'),
+        ]
+
+    def __str__(self):
+        return f"{self.mes:%Y-%m} {self.producto_id}: {self.cantidad}"
+
+#versiones de datos (se incrementan cada vez que cambia una tabla)
+class VersionModelo(models.Model):
+    modelo = models.CharField(max_length=100, unique=True)
+    version = models.PositiveBigIntegerField(default=0)
+    actualizado = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.modelo} v{self.version}"
+
+#trabajos de exportacion de reportes en segundo plano
+class TrabajoReporte(models.Model):
+    TIPOS = [
+        ('ventas', 'Ventas'),
+        ('compras', 'Compras'),
+        ('inventario', 'Inventario'),
+    ]
+    FORMATOS = [
+        ('pdf', 'PDF'),
+        ('csv', 'CSV'),
+    ]
+    ESTADOS = [
+        ('pendiente', 'Pendiente'),
+        ('procesando', 'Procesando'),
+        ('completado', 'Completado'),
+        ('error', 'Error'),
+    ]
+
+    clave = models.CharField(max_length=64) #tipo + formato + filtros normalizados + version de los datos
+    tipo = models.CharField(max_length=20, choices=TIPOS)
+    formato = models.CharField(max_length=5, choices=FORMATOS)
+    parametros = models.JSONField(default=dict, blank=True)
+    estado = models.CharField(max_length=20, choices=ESTADOS, default='pendiente')
+    progreso = models.PositiveSmallIntegerField(default=0)
+    archivo = models.CharField(max_length=255, blank=True)
+    error = models.TextField(blank=True)
+    usuario = models.ForeignKey('auth.User', on_delete=models.SET_NULL, null=True, blank=True)
+    creado = models.DateTimeField(auto_now_add=True)
+    actualizado = models.DateTimeField(auto_now=True)
+    terminado = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        constraints = [
+            #un solo trabajo vigente por clave; los que fallaron se pueden reintentar
+            models.UniqueConstraint(fields=['clave'], condition=~models.Q(estado='error'),
+                                    name='trabajo_reporte_clave_vigente'),
+        ]
+        indexes = [models.Index(fields=['estado', 'creado'])]
+
+    def __str__(self):
+        return f"Reporte {self.tipo}.{self.formato} ({self.estado})"
+
+#claves de idempotencia de la API de pedidos: un reintento con la misma clave
+#devuelve la respuesta guardada en vez de registrar los pedidos otra vez
+class ClaveIdempotencia(models.Model):
+    usuario = models.ForeignKey('auth.User', on_delete=models.CASCADE)
+    clave = models.CharField(max_length=255)
+    huella = models.CharField(max_length=64) #sha256 del cuerpo del pedido
+    respuesta = models.JSONField(default=dict)
+    creado = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['usuario', 'clave'], name='clave_idempotencia_unica'),
+        ]
+        indexes = [models.Index(fields=['creado'])]
+
+    def __str__(self):
+        return f"{self.usuario} - {self.clave}"
+
+
+#tokens de la API (ver autenticacion.py): varios por usuario, con vencimiento y guardados como hash
+class TokenAcceso(models.Model):
+    usuario = models.ForeignKey('auth.User', on_delete=models.CASCADE, related_name='tokens_acceso')
+    clave_hash = models.CharField(max_length=64, unique=True) #sha256 del token
+    nombre = models.CharField(max_length=100, blank=True) #dispositivo o cliente que lo pidio
+    creado = models.DateTimeField(auto_now_add=True)
+    expira = models.DateTimeField()
+
+    class Meta:
+        indexes = [models.Index(fields=['usuario', 'expira'])]
+
     def __str__(self):
-        return f"{self.tipo} - {self.producto} ({self.cantidad})"
\ No newline at end of file
+        return f"{self.usuario} - {self.nombre or self.clave_hash[:8]}"
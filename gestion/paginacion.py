@@ -0,0 +1,206 @@
+"""
+Paginación por cursor (keyset / seek) para las vistas de listas HTML y la API.
+
+En lugar de OFFSET y COUNT(*), cada página se pide a partir de los valores
+de ordenamiento de la última fila vista, por ejemplo (fecha, id) o
+(nombre, id). Con un índice sobre esas columnas la consulta es un recorrido
+de rango y cuesta lo mismo en la primera página que en la número mil.
+"""
+import base64
+import json
+
+from django.conf import settings
+from django.db.models import Q
+from django.http import QueryDict
+from rest_framework.pagination import CursorPagination
+
+POR_PAGINA_DEFECTO = getattr(settings, 'PAGINACION_POR_PAGINA', 50)
+POR_PAGINA_MAXIMO = getattr(settings, 'PAGINACION_MAXIMO', 500)
+
+
+class PaginaKeyset:
+    """
+    Una página de resultados con los cursores para moverse hacia adelante
+    y hacia atrás.
+    """
+
+    def __init__(self, objetos, por_pagina, cursor_siguiente, cursor_anterior, parametros=None):
+        self.objetos = objetos
+        self.por_pagina = por_pagina
+        self.cursor_siguiente = cursor_siguiente
+        self.cursor_anterior = cursor_anterior
+        #parametros GET de la pagina actual (filtros), se conservan en los enlaces
+        self.parametros = parametros if parametros is not None else QueryDict()
+
+    @property
+    def tiene_siguiente(self):
+        return self.cursor_siguiente is not None
+
+    @property
+    def tiene_anterior(self):
+        return self.cursor_anterior is not None
+
+    def _enlace(self, clave, cursor):
+        parametros = self.parametros.copy()
+        parametros.pop('antes', None)
+        parametros.pop('despues', None)
+        parametros[clave] = cursor
+        parametros['por_pagina'] = str(self.por_pagina)
+        return f'?{parametros.urlencode()}'
+
+    @property
+    def enlace_siguiente(self):
+        return self._enlace('despues', self.cursor_siguiente) if self.tiene_siguiente else None
+
+    @property
+    def enlace_anterior(self):
+        return self._enlace('antes', self.cursor_anterior) if self.tiene_anterior else None
+
+    def __iter__(self):
+        return iter(self.objetos)
+
+    def __len__(self):
+        return len(self.objetos)
+
+
+def _codificar_cursor(valores):
+    texto = json.dumps(valores, default=str, separators=(',', ':'))
+    return base64.urlsafe_b64encode(texto.encode()).decode().rstrip('=')
+
+
+def _decodificar_cursor(cursor, modelo, campos):
+    """
+    Devuelve la lista de valores del cursor convertidos al tipo de cada campo,
+    o None si el cursor está mal formado.
+    """
+    try:
+        relleno = '=' * (-len(cursor) % 4)
+        valores = json.loads(base64.urlsafe_b64decode(cursor + relleno).decode())
+        if not isinstance(valores, list) or len(valores) != len(campos):
+            return None
+        return [
+            modelo._meta.get_field(campo.lstrip('-')).to_python(valor)
+            for campo, valor in zip(campos, valores)
+        ]
+    except Exception:
+        return None
+
+
+def _filtro_despues_de(campos, valores):
+    """
+    Construye la condición "fila estrictamente después del cursor" para un
+    ordenamiento compuesto, por ejemplo con ['-fecha', '-id']:
+
+        fecha < f OR (fecha = f AND id < i)
+    """
+    condicion = Q()
+    for i, campo in enumerate(campos):
+        nombre = campo.lstrip('-')
+        operador = 'lt' if campo.startswith('-') else 'gt'
+        parte = Q(**{f'{nombre}__{operador}': valores[i]})
+        for previo, valor in zip(campos[:i], valores[:i]):
+            parte &= Q(**{previo.lstrip('-'): valor})
+        condicion |= parte
+    return condicion
+
+
+def _invertir(campos):
+    return [campo[1:] if campo.startswith('-') else f'-{campo}' for campo in campos]
+
+
+def _valores_fila(objeto, campos):
+    return [getattr(objeto, campo.lstrip('-')) for campo in campos]
+
+
+def obtener_por_pagina(request):
+    try:
+        por_pagina = int(request.GET.get('por_pagina', POR_PAGINA_DEFECTO))
+    except (TypeError, ValueError):
+        por_pagina = POR_PAGINA_DEFECTO
+    return max(1, min(por_pagina, POR_PAGINA_MAXIMO))
+
+
+def _consulta_keyset(request, queryset, campos, por_pagina):
+    """
+    (queryset de la página con una fila extra, valores del cursor `despues`,
+    si se recorre hacia atrás).
+    """
+    modelo = queryset.model
+    despues = request.GET.get('despues')
+    antes = request.GET.get('antes')
+
+    valores_despues = _decodificar_cursor(despues, modelo, campos) if despues else None
+    valores_antes = _decodificar_cursor(antes, modelo, campos) if antes else None
+
+    if valores_antes is not None:
+        #se recorre el orden inverso y luego se voltea la página
+        invertidos = _invertir(campos)
+        qs = queryset.filter(_filtro_despues_de(invertidos, valores_antes)).order_by(*invertidos)
+        return qs[:por_pagina + 1], None, True
+
+    qs = queryset.order_by(*campos)
+    if valores_despues is not None:
+        qs = qs.filter(_filtro_despues_de(campos, valores_despues))
+    return qs[:por_pagina + 1], valores_despues, False
+
+
+def _armar_pagina(filas, campos, por_pagina, valores_despues, hacia_atras, parametros):
+    if hacia_atras:
+        hay_mas_atras = len(filas) > por_pagina
+        objetos = list(reversed(filas[:por_pagina]))
+        hay_mas_adelante = True
+    else:
+        hay_mas_adelante = len(filas) > por_pagina
+        objetos = filas[:por_pagina]
+        hay_mas_atras = valores_despues is not None
+
+    cursor_siguiente = None
+    cursor_anterior = None
+    if objetos:
+        if hay_mas_adelante:
+            cursor_siguiente = _codificar_cursor(_valores_fila(objetos[-1], campos))
+        if hay_mas_atras:
+            cursor_anterior = _codificar_cursor(_valores_fila(objetos[0], campos))
+
+    return PaginaKeyset(objetos, por_pagina, cursor_siguiente, cursor_anterior, parametros)
+
+
+def paginar_keyset(request, queryset, campos, por_pagina=None):
+    """
+    Pagina un queryset por cursor.
+
+    `campos` es el ordenamiento completo y debe terminar en una columna única
+    (normalmente 'id' o '-id') para que el orden sea total. El cursor llega en
+    los parámetros GET `despues` (página siguiente) o `antes` (página anterior).
+
+    Para saber si hay más filas se pide una fila extra en lugar de contar la
+    tabla completa.
+    """
+    if por_pagina is None:
+        por_pagina = obtener_por_pagina(request)
+    qs, valores_despues, hacia_atras = _consulta_keyset(request, queryset, campos, por_pagina)
+    return _armar_pagina(list(qs), campos, por_pagina, valores_despues, hacia_atras, request.GET)
+
+
+async def apaginar_keyset(request, queryset, campos, por_pagina=None):
+    """paginar_keyset() para vistas async."""
+    if por_pagina is None:
+        por_pagina = obtener_por_pagina(request)
+    qs, valores_despues, hacia_atras = _consulta_keyset(request, queryset, campos, por_pagina)
+    return _armar_pagina([fila async for fila in qs], campos, por_pagina, valores_despues, hacia_atras,
+                         request.GET)
+
+
+class PaginacionCursorApi(CursorPagination):
+    """
+    Paginación por cursor de la API REST. Cada viewset indica su orden en el
+    atributo `ordering`; en las tablas grandes debe estar cubierto por un índice.
+    """
+    page_size = POR_PAGINA_DEFECTO
+    page_size_query_param = 'por_pagina'
+    max_page_size = POR_PAGINA_MAXIMO
+    ordering = '-id'
+
+    def get_ordering(self, request, queryset, view):
+        ordering = getattr(view, 'ordering', None) or self.ordering
+        return (ordering,) if isinstance(ordering, str) else tuple(ordering)
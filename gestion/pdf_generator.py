@@ -9,8 +9,15 @@ from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph,
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.lib.units import inch
 from io import BytesIO
-from django.http import HttpResponse
+import tempfile
+from django.conf import settings
+from django.http import HttpResponse, FileResponse
 from datetime import datetime
+from .pdf_streaming import REPORTES as REPORTES_STREAMING
+from .pdf_paralelo import generar_pdf_paralelo
+
+#a partir de este tamaño el PDF generado pasa de memoria a un archivo temporal
+TAMANO_MAXIMO_EN_MEMORIA = 5 * 1024 * 1024
 
 
 class PDFReporter:
@@ -188,19 +195,59 @@ class PDFReporter:
         return response
 
 
-def generar_pdf_ventas(data, titulo='Reporte de Ventas'):
+def _motor(motor):
+    return motor or getattr(settings, 'PDF_MOTOR', 'streaming')
+
+
+def escribir_pdf(tipo, data, titulo, destino, procesos=None, progreso=None):
+    """
+    Escribe el reporte `tipo` con el motor por páginas en `destino` (ruta o
+    archivo binario).
+
+    Si se configuran varios procesos (PDF_PROCESOS o el argumento `procesos`)
+    y el reporte tiene al menos PDF_PARALELO_MIN_FILAS filas, el dibujo se
+    reparte entre procesos y las partes se unen al final. `progreso` se llama
+    al terminar cada página, o cada parte en el modo de varios procesos.
+
+    Solo lo llama el worker de reportes (trabajos.procesar): las descargas
+    directas se dibujan en serie, sin crear procesos desde el request.
+    """
+    procesos = procesos or getattr(settings, 'PDF_PROCESOS', 1)
+    if procesos > 1 and data.count() >= getattr(settings, 'PDF_PARALELO_MIN_FILAS', 20000):
+        generar_pdf_paralelo(tipo, data, titulo, destino, procesos=procesos, progreso=progreso)
+    else:
+        REPORTES_STREAMING[tipo](titulo).generar(data, destino, progreso=progreso)
+
+
+def _respuesta_streaming(tipo, data, titulo, filename):
+    """
+    Genera el PDF con el motor por páginas y lo devuelve como descarga.
+    """
+    archivo = tempfile.SpooledTemporaryFile(max_size=TAMANO_MAXIMO_EN_MEMORIA)
+    REPORTES_STREAMING[tipo](titulo).generar(data, archivo)
+    archivo.seek(0)
+    return FileResponse(archivo, as_attachment=True, filename=filename, content_type='application/pdf')
+
+
+def generar_pdf_ventas(data, titulo='Reporte de Ventas', motor=None):
+    if _motor(motor) == 'streaming':
+        return _respuesta_streaming('ventas', data, titulo, 'reporte_ventas.pdf')
     reporter = PDFReporter(titulo, 'venta')
     reporter.generar_reporte_ventas(data)
     return reporter.obtener_response(filename='reporte_ventas.pdf')
 
 
-def generar_pdf_compras(data, titulo='Reporte de Compras'):
+def generar_pdf_compras(data, titulo='Reporte de Compras', motor=None):
+    if _motor(motor) == 'streaming':
+        return _respuesta_streaming('compras', data, titulo, 'reporte_compras.pdf')
     reporter = PDFReporter(titulo, 'compra')
     reporter.generar_reporte_compras(data)
     return reporter.obtener_response(filename='reporte_compras.pdf')
 
 
-def generar_pdf_inventario(data, titulo='Reporte de Inventario'):
+def generar_pdf_inventario(data, titulo='Reporte de Inventario', motor=None):
+    if _motor(motor) == 'streaming':
+        return _respuesta_streaming('inventario', data, titulo, 'reporte_inventario.pdf')
     reporter = PDFReporter(titulo, 'inventario')
     reporter.generar_reporte_inventario(data)
     return reporter.obtener_response(filename='reporte_inventario.pdf')
@@ -0,0 +1,191 @@
+"""
+Renderizado de PDFs en paralelo con varios procesos.
+
+El reporte se parte en rangos de páginas contiguos. Como el motor por páginas
+tiene un alto de fila fijo, cada rango de páginas corresponde a un rango de
+filas conocido de antemano. Cada proceso dibuja su rango en un PDF parcial y
+al final las partes se unen con pypdf.
+
+Para que el pie de página y la fila de totales sigan siendo correctos, antes
+de repartir el trabajo se calcula en la base de datos el total de cada rango
+de filas; así cada parte arranca con el acumulado de las anteriores y conoce
+el número total de páginas. La cantidad de filas y los totales se leen en una
+sola transacción; en PostgreSQL es REPEATABLE READ y los procesos importan esa
+misma instantánea (pg_export_snapshot), así que todos ven los mismos datos.
+En otras bases las partes informan lo que dibujaron y, si los datos cambiaron
+mientras tanto, el reporte se vuelve a dibujar en serie.
+
+Solo lo usa el worker de reportes (trabajos.py): los procesos se crean con
+'spawn', sin heredar las conexiones ni las transacciones del proceso padre.
+"""
+import multiprocessing
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from django.apps import apps
+from django.db import connections, transaction
+
+
+def _rangos_de_paginas(total_paginas, partes):
+    """Divide las páginas 1..total_paginas en `partes` rangos contiguos."""
+    partes = max(1, min(partes, total_paginas))
+    por_parte, resto = divmod(total_paginas, partes)
+    rangos = []
+    inicio = 1
+    for i in range(partes):
+        fin = inicio + por_parte + (1 if i < resto else 0) - 1
+        rangos.append((inicio, fin))
+        inicio = fin + 1
+    return rangos
+
+
+def _iniciar_proceso():
+    #con 'spawn' el proceso importa este modulo antes de django.setup():
+    #por eso los modelos (pdf_streaming) se importan dentro de las funciones
+    import django
+    django.setup()
+
+
+def _pool(procesos):
+    contexto = multiprocessing.get_context('spawn')
+    return ProcessPoolExecutor(max_workers=procesos, mp_context=contexto, initializer=_iniciar_proceso)
+
+
+def _exportar_instantanea(conexion):
+    """
+    En PostgreSQL fija REPEATABLE READ en la transacción recién abierta y
+    devuelve el id de su instantánea para los otros procesos; en otras bases
+    devuelve None.
+    """
+    if conexion.vendor != 'postgresql':
+        return None
+    with conexion.cursor() as cursor:
+        cursor.execute('SET TRANSACTION ISOLATION LEVEL REPEATABLE READ')
+        cursor.execute('SELECT pg_export_snapshot()')
+        return cursor.fetchone()[0]
+
+
+def _renderizar_parte(tipo, titulo, modelo, query, alias, instantanea, inicio, fin, pagina_inicial,
+                      total_paginas, totales, es_ultima, ruta):
+    """
+    Se ejecuta en un proceso del pool: dibuja las filas [inicio, fin).
+    Devuelve (ruta, filas dibujadas, totales al final de la parte).
+    """
+    from .pdf_streaming import REPORTES
+
+    queryset = apps.get_model(modelo)._default_manager.using(alias).all()
+    queryset.query = query
+    reporte = REPORTES[tipo](titulo)
+    dibujadas = 0
+
+    def contar(filas):
+        nonlocal dibujadas
+        for fila in filas:
+            dibujadas += 1
+            yield fila
+
+    try:
+        with transaction.atomic(using=alias):
+            if instantanea:
+                with connections[alias].cursor() as cursor:
+                    cursor.execute('SET TRANSACTION ISOLATION LEVEL REPEATABLE READ')
+                    cursor.execute('SET TRANSACTION SNAPSHOT %s', [instantanea])
+            totales = reporte.render(
+                contar(reporte.leer_filas(queryset[inicio:fin])),
+                ruta,
+                pagina_inicial=pagina_inicial,
+                total_paginas=total_paginas,
+                totales=totales,
+                incluir_total=es_ultima,
+            )
+    finally:
+        connections.close_all()
+    return ruta, dibujadas, totales
+
+
+def _planificar(reporte, queryset, procesos):
+    """(filas, total de páginas, partes (página inicial, inicio, fin), acumulado antes de cada parte, totales)."""
+    num_filas = queryset.count()
+    total_paginas = reporte.total_paginas(num_filas)
+
+    partes = []
+    for pagina_inicial, pagina_final in _rangos_de_paginas(total_paginas, procesos):
+        inicio = min(reporte.primera_fila_de_pagina(pagina_inicial), num_filas)
+        fin = min(reporte.primera_fila_de_pagina(pagina_final + 1), num_filas)
+        partes.append((pagina_inicial, inicio, fin))
+    #la ultima parte toma todas las filas restantes y la fila de totales
+    pagina_inicial, inicio, _ = partes[-1]
+    partes[-1] = (pagina_inicial, inicio, num_filas)
+
+    #acumulado de las partes anteriores a cada una, calculado en la base de datos
+    acumulados = []
+    totales = reporte.totales_iniciales()
+    for _, inicio, fin in partes:
+        acumulados.append(dict(totales))
+        if fin > inicio:
+            reporte.sumar_totales(totales, queryset[inicio:fin].aggregate(**reporte.agregados()))
+    return num_filas, total_paginas, partes, acumulados, totales
+
+
+def _dibujar_partes(tipo, titulo, queryset, instantanea, plan, procesos, directorio, progreso=None):
+    _, total_paginas, partes, acumulados, _ = plan
+    with _pool(procesos) as pool:
+        futuros = [
+            pool.submit(
+                _renderizar_parte, tipo, titulo, queryset.model._meta.label, queryset.query, queryset.db,
+                instantanea, inicio, fin, pagina_inicial, total_paginas, acumulados[i],
+                i == len(partes) - 1, os.path.join(directorio, f'parte_{i:04d}.pdf'),
+            )
+            for i, (pagina_inicial, inicio, fin) in enumerate(partes)
+        ]
+        if progreso:
+            procesadas = 0
+            for futuro in as_completed(futuros):
+                procesadas += futuro.result()[1]
+                progreso(procesadas)
+        return [futuro.result() for futuro in futuros]
+
+
+def generar_pdf_paralelo(tipo, queryset, titulo, destino, procesos=None, progreso=None):
+    """
+    Genera el reporte `tipo` ('ventas', 'compras' o 'inventario') sobre
+    `queryset` repartiendo el dibujo entre `procesos` procesos y escribe el
+    PDF final en `destino` (ruta o archivo binario). `progreso`, si se
+    indica, se llama con las filas dibujadas cada vez que termina una parte.
+
+    Devuelve True si se dibujó en paralelo, o False si los datos cambiaron
+    durante el dibujo y se volvió a generar en serie.
+    """
+    from pypdf import PdfWriter
+
+    from .pdf_streaming import REPORTES
+
+    procesos = procesos or os.cpu_count() or 1
+    reporte = REPORTES[tipo](titulo)
+
+    with tempfile.TemporaryDirectory(prefix='reporte_') as directorio:
+        with transaction.atomic(using=queryset.db):
+            instantanea = _exportar_instantanea(connections[queryset.db])
+            plan = _planificar(reporte, queryset, procesos)
+            #la instantanea exportada vale mientras esta transaccion siga abierta
+            if instantanea:
+                resultados = _dibujar_partes(tipo, titulo, queryset, instantanea, plan, procesos, directorio, progreso)
+        if not instantanea:
+            #sin instantanea compartida no se retiene la transaccion: bloquearia las escrituras
+            resultados = _dibujar_partes(tipo, titulo, queryset, None, plan, procesos, directorio, progreso)
+
+        num_filas, _, _, _, totales = plan
+        #los totales se comparan como se imprimen: SQLite multiplica decimales en punto flotante
+        if (sum(dibujadas for _, dibujadas, _ in resultados) != num_filas
+                or reporte.texto_acumulado(resultados[-1][2]) != reporte.texto_acumulado(totales)):
+            #los datos cambiaron entre el conteo y el dibujo: una sola lectura en serie es consistente
+            reporte.generar(queryset, destino, progreso=progreso)
+            return False
+
+        writer = PdfWriter()
+        for ruta, _, _ in resultados:
+            writer.append(ruta)
+        writer.write(destino)
+        writer.close()
+    return True
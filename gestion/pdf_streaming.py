@@ -0,0 +1,360 @@
+"""
+Motor de PDFs por páginas (streaming) usando el canvas de ReportLab.
+
+A diferencia de PDFReporter, que arma una sola Table con todas las filas y
+deja que `doc.build` la parta en páginas, este motor consume las filas de un
+iterador en bloques y dibuja una página a la vez: encabezado de la tabla en
+cada página, filas con alto fijo y un pie con el número de página y el total
+acumulado. Solo se mantiene en memoria la página que se está dibujando.
+
+Como el alto de fila es fijo, la cantidad de filas por página es
+determinística; eso permite calcular de antemano en qué página cae cada fila
+(lo usa el modo paralelo para repartir rangos de páginas).
+"""
+from datetime import datetime
+from decimal import Decimal
+
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.units import inch
+from reportlab.pdfbase.pdfdoc import PDFArray, PDFName, PDFStream, PDFZCompress
+from reportlab.pdfbase.pdfmetrics import stringWidth
+from reportlab.pdfgen import canvas
+
+from django.db.models import DecimalField, F, Sum
+
+from .models import Venta, Compra
+
+TAMANO_BLOQUE = 2000
+
+COLOR_PRINCIPAL = colors.HexColor('#1f4788')
+COLOR_ALTERNO = colors.HexColor('#f0f0f0')
+
+MARGEN = 0.75 * inch
+ALTO_FILA = 18
+ALTO_ENCABEZADO = 24
+ALTO_TITULO = 60
+ALTO_PIE = 30
+FUENTE = 'Helvetica'
+FUENTE_NEGRITA = 'Helvetica-Bold'
+TAMANO_FUENTE = 9
+
+
+def _moneda(valor):
+    return f"Q{valor:,.2f}"
+
+
+def _recortar(texto, ancho, fuente=FUENTE, tamano=TAMANO_FUENTE):
+    """Recorta el texto para que quepa en la celda."""
+    texto = str(texto)
+    #estimacion rapida antes de medir con la fuente
+    if len(texto) * tamano * 0.6 <= ancho:
+        return texto
+    while texto and stringWidth(texto + '…', fuente, tamano) > ancho:
+        texto = texto[:-1]
+    return texto + '…'
+
+
+class CanvasCompacto(canvas.Canvas):
+    """
+    Canvas que comprime el contenido de cada página apenas se cierra.
+
+    ReportLab guarda el texto sin comprimir de todas las páginas hasta
+    `save()`; aquí se reemplaza por el stream ya comprimido, que es varias
+    veces más chico, para que un reporte de miles de páginas no crezca en
+    memoria al ritmo de su contenido sin comprimir.
+    """
+
+    def showPage(self):
+        super().showPage()
+        pagina = self._doc.Pages.pages[-1]
+        if pagina.stream and not pagina.Contents:
+            contenido = PDFStream(content=PDFZCompress.encode(pagina.stream), filters=[])
+            contenido.dictionary['Filter'] = PDFArray([PDFName('FlateDecode')])
+            contenido.__Comment__ = 'page stream'
+            pagina.Contents = contenido
+            pagina.stream = None
+
+
+class ReporteStreaming:
+    """
+    Base de los reportes por páginas. Cada subclase define las columnas, los
+    campos que se leen de la base de datos y cómo se acumulan los totales.
+    """
+
+    encabezados = []
+    anchos = []
+    campos = ()
+    pagesize = A4
+
+    def __init__(self, titulo):
+        self.titulo = titulo
+        ancho, alto = self.pagesize
+        self.ancho_pagina = ancho
+        self.alto_pagina = alto
+        self.ancho_tabla = sum(self.anchos)
+        self.x_inicial = (ancho - self.ancho_tabla) / 2
+
+    # -- a implementar por cada reporte --
+
+    def formatear(self, fila):
+        raise NotImplementedError
+
+    def totales_iniciales(self):
+        raise NotImplementedError
+
+    def acumular(self, totales, fila):
+        raise NotImplementedError
+
+    def fila_totales(self, totales):
+        raise NotImplementedError
+
+    def texto_acumulado(self, totales):
+        raise NotImplementedError
+
+    def agregados(self):
+        """Expresiones de agregación que calculan en la base de datos los mismos totales."""
+        raise NotImplementedError
+
+    def sumar_totales(self, totales, otros):
+        for clave, valor in otros.items():
+            totales[clave] += valor or 0
+        return totales
+
+    # -- geometria de la pagina --
+
+    def _espacio_filas(self, primera):
+        alto = self.alto_pagina - 2 * MARGEN - ALTO_ENCABEZADO - ALTO_PIE
+        if primera:
+            alto -= ALTO_TITULO
+        return alto
+
+    def filas_en_pagina(self, numero_pagina):
+        """Cantidad de filas de datos que caben en la página `numero_pagina` (desde 1)."""
+        return int(self._espacio_filas(numero_pagina == 1) // ALTO_FILA)
+
+    def total_paginas(self, num_filas):
+        """
+        Páginas necesarias para `num_filas` filas más la fila de totales al
+        final del reporte.
+        """
+        restantes = num_filas + 1
+        paginas = 0
+        while restantes > 0:
+            paginas += 1
+            restantes -= self.filas_en_pagina(paginas)
+        return paginas
+
+    def primera_fila_de_pagina(self, numero_pagina):
+        """Índice (desde 0) de la primera fila de datos de la página."""
+        primera = self.filas_en_pagina(1)
+        if numero_pagina == 1:
+            return 0
+        return primera + (numero_pagina - 2) * self.filas_en_pagina(2)
+
+    # -- dibujo --
+
+    def _dibujar_titulo(self, c, y):
+        c.setFont(FUENTE_NEGRITA, 16)
+        c.setFillColor(COLOR_PRINCIPAL)
+        c.drawString(self.x_inicial, y - 20, self.titulo)
+        c.setFont(FUENTE, 9)
+        c.setFillColor(colors.grey)
+        c.drawString(self.x_inicial, y - 40, f"Generado: {datetime.now().strftime('%d/%m/%Y %H:%M')}")
+        return y - ALTO_TITULO
+
+    def _dibujar_textos(self, c, filas, y, alto, fuente, color, recortar=True):
+        """Escribe los textos de varias filas con un solo objeto de texto."""
+        texto = c.beginText()
+        texto.setFont(fuente, TAMANO_FUENTE)
+        texto.setFillColor(color)
+        base = (alto - TAMANO_FUENTE) / 2 + 2
+        for valores in filas:
+            x = self.x_inicial
+            for valor, ancho in zip(valores, self.anchos):
+                contenido = _recortar(valor, ancho - 4, fuente) if recortar else str(valor)
+                medida = stringWidth(contenido, fuente, TAMANO_FUENTE)
+                texto.setTextOrigin(x + (ancho - medida) / 2, y - alto + base)
+                texto.textOut(contenido)
+                x += ancho
+            y -= alto
+        c.drawText(texto)
+
+    def _dibujar_pagina(self, c, numero_pagina, filas, fila_total, indice_inicial, total_paginas, totales):
+        """
+        Dibuja una página completa: título (solo en la primera), encabezado,
+        filas de datos, fila de totales opcional, cuadrícula y pie.
+        """
+        y = self.alto_pagina - MARGEN
+        if numero_pagina == 1:
+            y = self._dibujar_titulo(c, y)
+        x = self.x_inicial
+        alto_datos = ALTO_FILA * (len(filas) + (1 if fila_total else 0))
+
+        #fondos: encabezado, filas alternas y fila de totales
+        c.setFillColor(COLOR_PRINCIPAL)
+        c.rect(x, y - ALTO_ENCABEZADO, self.ancho_tabla, ALTO_ENCABEZADO, stroke=0, fill=1)
+        c.setFillColor(COLOR_ALTERNO)
+        y_datos = y - ALTO_ENCABEZADO
+        for i in range(len(filas)):
+            if (indice_inicial + i) % 2:
+                c.rect(x, y_datos - ALTO_FILA * (i + 1), self.ancho_tabla, ALTO_FILA, stroke=0, fill=1)
+        if fila_total:
+            c.setFillColor(colors.beige)
+            c.rect(x, y_datos - alto_datos, self.ancho_tabla, ALTO_FILA, stroke=0, fill=1)
+
+        #textos
+        self._dibujar_textos(c, [self.encabezados], y, ALTO_ENCABEZADO, FUENTE_NEGRITA, colors.whitesmoke)
+        self._dibujar_textos(c, filas, y_datos, ALTO_FILA, FUENTE, colors.black)
+        if fila_total:
+            self._dibujar_textos(c, [fila_total], y_datos - ALTO_FILA * len(filas), ALTO_FILA,
+                                 FUENTE_NEGRITA, colors.black, recortar=False)
+
+        #cuadricula completa en una sola operacion
+        xs = [x]
+        for ancho in self.anchos:
+            xs.append(xs[-1] + ancho)
+        ys = [y] + [y_datos - ALTO_FILA * i for i in range(int(alto_datos // ALTO_FILA) + 1)]
+        c.grid(xs, ys)
+
+        self._dibujar_pie(c, numero_pagina, total_paginas, totales)
+        c.showPage()
+
+    def _dibujar_pie(self, c, numero_pagina, total_paginas, totales):
+        c.setFont(FUENTE, 8)
+        c.setFillColor(colors.grey)
+        if total_paginas:
+            pagina = f"Página {numero_pagina} de {total_paginas}"
+        else:
+            pagina = f"Página {numero_pagina}"
+        c.drawString(self.x_inicial, MARGEN, pagina)
+        c.drawRightString(self.x_inicial + self.ancho_tabla, MARGEN, self.texto_acumulado(totales))
+
+    def render(self, filas, destino, pagina_inicial=1, total_paginas=None,
+               totales=None, incluir_total=True, progreso=None):
+        """
+        Dibuja el reporte en `destino` (ruta o archivo binario) leyendo
+        `filas` (tuplas con los valores de `campos`) una a la vez.
+
+        `pagina_inicial` y `totales` permiten renderizar solo una parte del
+        reporte que continúa a otra ya dibujada. `progreso`, si se indica, se
+        llama con la cantidad de filas procesadas al terminar cada página.
+
+        Devuelve los totales acumulados al final.
+        """
+        if totales is None:
+            totales = self.totales_iniciales()
+
+        c = CanvasCompacto(destino, pagesize=self.pagesize)
+        c.setTitle(self.titulo)
+        c.setStrokeColor(colors.black)
+        c.setLineWidth(0.5)
+
+        numero_pagina = pagina_inicial
+        procesadas = 0
+        iterador = iter(filas)
+        pendiente = True
+
+        while pendiente:
+            capacidad = self.filas_en_pagina(numero_pagina)
+            pagina = []
+            while len(pagina) < capacidad:
+                fila = next(iterador, None)
+                if fila is None:
+                    pendiente = False
+                    break
+                pagina.append(self.formatear(fila))
+                self.acumular(totales, fila)
+
+            #si la ultima pagina quedo llena, la fila de totales cae en una
+            #pagina nueva que solo lleva el encabezado y los totales
+            fila_total = None
+            if not pendiente and incluir_total:
+                fila_total = self.fila_totales(totales)
+            elif not pagina and numero_pagina > pagina_inicial:
+                #una parte intermedia termino justo al final de una pagina
+                break
+
+            self._dibujar_pagina(c, numero_pagina, pagina, fila_total, procesadas, total_paginas, totales)
+            procesadas += len(pagina)
+            if progreso:
+                progreso(procesadas)
+            numero_pagina += 1
+
+        c.save()
+        return totales
+
+    def leer_filas(self, queryset):
+        """Iterador en bloques sobre el queryset con los joins ya resueltos."""
+        return queryset.values_list(*self.campos).iterator(chunk_size=TAMANO_BLOQUE)
+
+    def generar(self, queryset, destino, **kwargs):
+        return self.render(self.leer_filas(queryset), destino, **kwargs)
+
+
+class ReporteVentasStreaming(ReporteStreaming):
+    encabezados = ['Pedido', 'Fecha', 'Cliente', 'Total', 'Estado']
+    anchos = [1.2 * inch, 1.2 * inch, 2 * inch, 1 * inch, 1.2 * inch]
+    campos = ('numero_pedido', 'fecha', 'cliente__nombre', 'total', 'estado')
+    estados = dict(Venta.ESTADOS)
+
+    def formatear(self, fila):
+        numero, fecha, cliente, total, estado = fila
+        return [numero, fecha.strftime("%d/%m/%Y"), cliente, _moneda(total), self.estados.get(estado, estado)]
+
+    def totales_iniciales(self):
+        return {'total': Decimal('0')}
+
+    def acumular(self, totales, fila):
+        totales['total'] += fila[3]
+
+    def fila_totales(self, totales):
+        return ['', '', 'TOTAL:', _moneda(totales['total']), '']
+
+    def texto_acumulado(self, totales):
+        return f"Acumulado: {_moneda(totales['total'])}"
+
+    def agregados(self):
+        return {'total': Sum('total')}
+
+
+class ReporteComprasStreaming(ReporteVentasStreaming):
+    encabezados = ['Orden', 'Fecha', 'Proveedor', 'Total', 'Estado']
+    campos = ('numero_orden', 'fecha', 'proveedor__empresa', 'total', 'estado')
+    estados = dict(Compra.ESTADOS)
+
+
+class ReporteInventarioStreaming(ReporteStreaming):
+    encabezados = ['Código', 'Producto', 'Categoría', 'Stock', 'Precio Venta']
+    anchos = [1 * inch, 2.5 * inch, 1.5 * inch, 0.8 * inch, 1.2 * inch]
+    campos = ('codigo', 'nombre', 'categoria__nombre', 'cantidad', 'precio_venta')
+
+    def formatear(self, fila):
+        codigo, nombre, categoria, cantidad, precio = fila
+        return [codigo, nombre[:25], categoria or '', str(cantidad), _moneda(precio)]
+
+    def totales_iniciales(self):
+        return {'stock': 0, 'valor': Decimal('0')}
+
+    def acumular(self, totales, fila):
+        totales['stock'] += fila[3]
+        totales['valor'] += fila[3] * fila[4]
+
+    def fila_totales(self, totales):
+        return ['', '', 'TOTALES:', f"{totales['stock']} unidades", _moneda(totales['valor'])]
+
+    def texto_acumulado(self, totales):
+        return f"Acumulado: {totales['stock']} unidades / {_moneda(totales['valor'])}"
+
+    def agregados(self):
+        return {
+            'stock': Sum('cantidad'),
+            'valor': Sum(F('cantidad') * F('precio_venta'), output_field=DecimalField()),
+        }
+
+
+REPORTES = {
+    'ventas': ReporteVentasStreaming,
+    'compras': ReporteComprasStreaming,
+    'inventario': ReporteInventarioStreaming,
+}
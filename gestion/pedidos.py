@@ -0,0 +1,165 @@
+"""
+Registro de pedidos en lote (API de integración con el punto de venta).
+
+Un lote trae uno o varios pedidos, cada uno con todas sus líneas. Se valida
+completo con una consulta para los clientes y otra para los productos, y se
+inserta con bulk_create dentro de una sola transacción: o se registran todos
+los pedidos o ninguno. Los pedidos marcados para finalizar descuentan el stock
+en el mismo paso (ver inventario.descontar_stock).
+
+Con una clave de idempotencia, un reintento devuelve la respuesta del primer
+intento en vez de duplicar los pedidos. La clave se guarda en la misma
+transacción que los pedidos, así un intento que falla no la deja ocupada.
+"""
+import uuid
+from collections import Counter
+
+from django.db import IntegrityError, transaction
+
+from .models import Cliente, Producto, Venta, DetalleVenta, MovimientoInventario, ClaveIdempotencia
+from .versiones import incrementar_version
+from . import inventario, resumenes
+
+TAMANO_LOTE = 1000
+
+
+class PedidosInvalidos(Exception):
+    """Algún pedido del lote no es válido; `errores` tiene uno por pedido."""
+
+    def __init__(self, errores):
+        self.errores = errores
+        super().__init__('Hay pedidos inválidos en el lote.')
+
+
+class ClaveReutilizada(Exception):
+    """La clave de idempotencia ya se usó con otro contenido."""
+
+
+def _validar(pedidos, clientes, precios):
+    errores = []
+    for pedido in pedidos:
+        error = {}
+        if pedido['cliente'] not in clientes:
+            error['cliente'] = ['El cliente no existe.']
+        errores_lineas = []
+        for linea in pedido['lineas']:
+            error_linea = {}
+            precio = precios.get(linea['producto'])
+            if precio is None:
+                error_linea['producto'] = ['El producto no existe.']
+            elif linea.get('precio_unitario') is not None and linea['precio_unitario'] != precio:
+                error_linea['precio_unitario'] = [f'El precio vigente es {precio}.']
+            errores_lineas.append(error_linea)
+        if any(errores_lineas):
+            error['lineas'] = errores_lineas
+        errores.append(error)
+    return errores
+
+
+def _errores_de_stock(pedidos, faltantes):
+    faltantes = set(faltantes)
+    errores = []
+    for pedido in pedidos:
+        lineas = [
+            {'cantidad': ['No hay suficiente stock.']} if pedido['finalizar'] and linea['producto'] in faltantes else {}
+            for linea in pedido['lineas']
+        ]
+        errores.append({'lineas': lineas} if any(lineas) else {})
+    return errores
+
+
+def _registrar(pedidos):
+    clientes = set(Cliente.objects.filter(pk__in={p['cliente'] for p in pedidos}).values_list('pk', flat=True))
+    precios = dict(Producto.objects.filter(
+        pk__in={linea['producto'] for p in pedidos for linea in p['lineas']}).values_list('pk', 'precio_venta'))
+    errores = _validar(pedidos, clientes, precios)
+    if any(errores):
+        raise PedidosInvalidos(errores)
+
+    #una linea por producto en cada pedido (restriccion unica de DetalleVenta)
+    cantidades = []
+    for pedido in pedidos:
+        por_producto = Counter()
+        for linea in pedido['lineas']:
+            por_producto[linea['producto']] += linea['cantidad']
+        cantidades.append(por_producto)
+
+    a_descontar = Counter()
+    for pedido, por_producto in zip(pedidos, cantidades):
+        if pedido['finalizar']:
+            a_descontar.update(por_producto)
+    if a_descontar:
+        faltantes = inventario.descontar_stock(dict(a_descontar))
+        if faltantes:
+            raise PedidosInvalidos(_errores_de_stock(pedidos, faltantes))
+
+    ventas = [
+        Venta(
+            numero_pedido=f'TMP-{uuid.uuid4().hex}',
+            cliente_id=pedido['cliente'],
+            estado='completado' if pedido['finalizar'] else 'pendiente',
+            total=sum(cantidad * precios[pk] for pk, cantidad in por_producto.items()),
+        )
+        for pedido, por_producto in zip(pedidos, cantidades)
+    ]
+    Venta.objects.bulk_create(ventas, batch_size=TAMANO_LOTE)
+    #mismo formato que crear_venta, ahora que se conocen los ids
+    for venta in ventas:
+        venta.numero_pedido = f"PED-{venta.id:05d}"
+    Venta.objects.bulk_update(ventas, ['numero_pedido'], batch_size=TAMANO_LOTE)
+
+    DetalleVenta.objects.bulk_create([
+        DetalleVenta(venta=venta, producto_id=pk, cantidad=cantidad, precio_unitario=precios[pk])
+        for venta, por_producto in zip(ventas, cantidades)
+        for pk, cantidad in por_producto.items()
+    ], batch_size=TAMANO_LOTE)
+
+    finalizadas = [venta for venta in ventas if venta.estado == 'completado']
+    if finalizadas:
+        MovimientoInventario.objects.bulk_create([
+            MovimientoInventario(tipo='salida', producto_id=pk, cantidad=cantidad, venta_asociada=venta)
+            for venta, por_producto in zip(ventas, cantidades) if venta.estado == 'completado'
+            for pk, cantidad in sorted(por_producto.items())
+        ], batch_size=TAMANO_LOTE)
+        resumenes.registrar_ventas(finalizadas, {
+            venta.pk: dict(por_producto) for venta, por_producto in zip(ventas, cantidades)
+            if venta.estado == 'completado'
+        })
+        incrementar_version(Venta, DetalleVenta, Producto, MovimientoInventario)
+    else:
+        incrementar_version(Venta, DetalleVenta)
+
+    return [
+        {'id': venta.id, 'numero_pedido': venta.numero_pedido, 'estado': venta.estado, 'total': str(venta.total)}
+        for venta in ventas
+    ]
+
+
+def registrar_pedidos(pedidos, usuario, clave=None, huella=''):
+    """
+    Registra un lote de pedidos ya validados por PedidoSerializer y devuelve
+    (resultado, repetido). `resultado` tiene id, numero_pedido, estado y total
+    de cada pedido; `repetido` es True si la clave de idempotencia ya se había
+    usado y el resultado es el del primer intento.
+
+    Lanza PedidosInvalidos (sin registrar nada) si algún pedido no es válido y
+    ClaveReutilizada si la clave se usó antes con otro contenido (`huella`).
+    """
+    with transaction.atomic():
+        if clave:
+            try:
+                with transaction.atomic():
+                    registro = ClaveIdempotencia.objects.create(usuario=usuario, clave=clave, huella=huella)
+            except IntegrityError:
+                #reintento: en PostgreSQL espera a que el primer intento confirme
+                anterior = ClaveIdempotencia.objects.get(usuario=usuario, clave=clave)
+                if anterior.huella != huella:
+                    raise ClaveReutilizada('La clave de idempotencia ya se usó con otro pedido.')
+                return anterior.respuesta, True
+
+        resultado = _registrar(pedidos)
+
+        if clave:
+            registro.respuesta = resultado
+            registro.save(update_fields=['respuesta'])
+    return resultado, False
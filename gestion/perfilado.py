@@ -0,0 +1,183 @@
+"""
+Perfilado de requests por muestreo con cProfile (opcional).
+
+Con PERFILADO_ACTIVO, PerfiladoMiddleware perfila una fracción de los
+requests (PERFILADO_MUESTRA) y guarda el perfil de los elegidos y de los que
+tardaron más de PERFILADO_UMBRAL_MS. Con un umbral configurado se perfilan
+todos los requests (no se sabe antes cuáles serán lentos) y solo se guardan
+los lentos; PERFILADO_VISTAS limita el perfilado a algunas rutas por nombre
+(por ejemplo reporte_inventario o producto-list de la API).
+
+Cada volcado son dos archivos en PERFILADO_DIR con el mismo nombre: el
+.prof (se abre con pstats, snakeviz, ...) y un .json con los datos del
+request y las consultas SQL que hizo. Se conservan los PERFILADO_MAXIMO más
+recientes; al guardar uno nuevo se borran los más viejos.
+
+Desactivado, el middleware se quita de la cadena (MiddlewareNotUsed) y no
+agrega ningún costo. Los volcados se ven en /perfiles/ (administradores) o
+con `python manage.py perfiles`.
+"""
+import cProfile
+import json
+import os
+import random
+import re
+import time
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connection
+from django.utils import timezone
+from django.utils.deprecation import MiddlewareMixin
+
+#largo maximo de cada consulta y de sus parametros en el .json
+LARGO_SQL = 2000
+NOMBRE_VALIDO = re.compile(r'^\d+-[\w.-]+$')
+
+
+def directorio():
+    return getattr(settings, 'PERFILADO_DIR', os.path.join(settings.BASE_DIR, 'perfiles'))
+
+
+def _maximo():
+    return getattr(settings, 'PERFILADO_MAXIMO', 50)
+
+
+def guardar(perfil, datos):
+    """Escribe el volcado (.prof y .json) y borra los más viejos. Devuelve su nombre."""
+    carpeta = directorio()
+    os.makedirs(carpeta, exist_ok=True)
+    #el tiempo en nanosegundos al inicio ordena los volcados por antiguedad
+    vista = re.sub(r'[^\w.-]', '_', datos['vista'])[:60]
+    nombre = f'{time.time_ns()}-{os.getpid()}-{vista}'
+    perfil.dump_stats(os.path.join(carpeta, f'{nombre}.prof'))
+    with open(os.path.join(carpeta, f'{nombre}.json'), 'w') as archivo:
+        json.dump(datos, archivo, indent=1, default=str)
+    recortar(carpeta, _maximo())
+    return nombre
+
+
+def recortar(carpeta, maximo):
+    nombres = sorted({os.path.splitext(archivo)[0] for archivo in os.listdir(carpeta)
+                      if NOMBRE_VALIDO.match(os.path.splitext(archivo)[0])})
+    for nombre in nombres[:max(0, len(nombres) - maximo)]:
+        for extension in ('.prof', '.json'):
+            try:
+                os.remove(os.path.join(carpeta, nombre + extension))
+            except FileNotFoundError:
+                pass #otro proceso ya lo borro
+
+
+def listar():
+    """Datos de cada volcado (lo que guarda el .json), el más reciente primero."""
+    carpeta = directorio()
+    if not os.path.isdir(carpeta):
+        return []
+    volcados = []
+    for archivo in sorted(os.listdir(carpeta), reverse=True):
+        nombre, extension = os.path.splitext(archivo)
+        if extension != '.json' or not NOMBRE_VALIDO.match(nombre):
+            continue
+        try:
+            with open(os.path.join(carpeta, archivo)) as contenido:
+                datos = json.load(contenido)
+        except (OSError, ValueError):
+            continue #se esta escribiendo o ya se borro
+        datos['nombre'] = nombre
+        volcados.append(datos)
+    return volcados
+
+
+def ruta(nombre, extension):
+    """Ruta del .prof o .json del volcado `nombre`, o None si no existe."""
+    if extension not in ('.prof', '.json') or not NOMBRE_VALIDO.match(nombre):
+        return None
+    archivo = os.path.join(directorio(), nombre + extension)
+    return archivo if os.path.isfile(archivo) else None
+
+
+def eliminar_todos():
+    carpeta = directorio()
+    if os.path.isdir(carpeta):
+        recortar(carpeta, 0)
+
+
+class _Perfilado:
+    """Perfil y consultas SQL de un request en curso."""
+
+    def __init__(self, elegido):
+        self.elegido = elegido
+        self.perfil = cProfile.Profile()
+        self.consultas = []
+
+    def __call__(self, execute, sql, params, many, context):
+        inicio = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.consultas.append({
+                'sql': sql[:LARGO_SQL],
+                'parametros': repr(params)[:LARGO_SQL],
+                'ms': round((time.perf_counter() - inicio) * 1000, 3),
+            })
+
+
+class PerfiladoMiddleware(MiddlewareMixin):
+    """
+    Inicia cProfile antes de llamar a la vista (process_view, ya se conoce el
+    nombre de la ruta) y lo detiene cuando vuelve la respuesta.
+
+    cProfile mide un solo hilo. Bajo ASGI MiddlewareMixin corre estos métodos
+    en el hilo del request: en las vistas async el perfil muestra lo que
+    corre en ese hilo (consultas, plantillas, PDF) y no el código del event
+    loop.
+    """
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'PERFILADO_ACTIVO', False):
+            raise MiddlewareNotUsed
+        super().__init__(get_response)
+        self.muestra = getattr(settings, 'PERFILADO_MUESTRA', 0.01)
+        self.umbral = getattr(settings, 'PERFILADO_UMBRAL_MS', None)
+        self.vistas = set(getattr(settings, 'PERFILADO_VISTAS', ()))
+
+    def process_request(self, request):
+        request._inicio_perfilado = time.perf_counter()
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if self.vistas and request.resolver_match.view_name not in self.vistas:
+            return None
+        elegido = random.random() < self.muestra
+        if not elegido and self.umbral is None:
+            return None
+        perfilado = _Perfilado(elegido)
+        try:
+            perfilado.perfil.enable()
+        except ValueError:
+            return None #ya hay otro perfilador activo en este hilo
+        connection.execute_wrappers.append(perfilado)
+        request._perfilado = perfilado
+        return None
+
+    def process_response(self, request, respuesta):
+        perfilado = getattr(request, '_perfilado', None)
+        if perfilado is None:
+            return respuesta
+
+        perfilado.perfil.disable()
+        connection.execute_wrappers.remove(perfilado)
+        duracion = (time.perf_counter() - request._inicio_perfilado) * 1000
+        lento = self.umbral is not None and duracion >= self.umbral
+        if perfilado.elegido or lento:
+            guardar(perfilado.perfil, {
+                'fecha': timezone.now().isoformat(),
+                'vista': request.resolver_match.view_name,
+                'metodo': request.method,
+                'ruta': request.get_full_path(),
+                'estado': respuesta.status_code,
+                'duracion_ms': round(duracion, 1),
+                'motivo': 'lento' if lento else 'muestra',
+                'sql_ms': round(sum(consulta['ms'] for consulta in perfilado.consultas), 3),
+                'consultas': perfilado.consultas,
+            })
+        return respuesta
@@ -0,0 +1,122 @@
+"""
+Resúmenes mensuales de ventas para el dashboard.
+
+ResumenVentasMes guarda el total vendido por mes y ResumenProductoMes la
+cantidad vendida de cada producto por mes. Solo cuentan las ventas
+completadas: se suman al finalizar una venta y se restan si una venta
+completada se revierte o se borra. La migración que crea las tablas las
+llena con las ventas que ya existían y `manage.py reconstruir_resumenes` los vuelve a
+calcular desde cero a partir del historial.
+"""
+from collections import Counter
+
+from django.db import IntegrityError, transaction
+from django.db.models import BigIntegerField, Case, Count, DateField, F, Sum, Value, When
+from django.db.models.functions import TruncMonth
+from django.utils import timezone
+
+from .models import DetalleVenta, ResumenProductoMes, ResumenVentasMes, Venta
+
+
+def mes_de(fecha):
+    """Primer día del mes de `fecha` en la zona horaria actual (igual que TruncMonth)."""
+    if timezone.is_aware(fecha):
+        fecha = timezone.localtime(fecha)
+    return fecha.date().replace(day=1)
+
+
+def _sumar(modelo, claves, **deltas):
+    """UPDATE ... SET campo = campo + delta; si la fila no existe se crea."""
+    cambios = {campo: F(campo) + delta for campo, delta in deltas.items()}
+    if modelo.objects.filter(**claves).update(**cambios):
+        return
+    try:
+        with transaction.atomic():
+            modelo.objects.create(**claves, **deltas)
+    except IntegrityError:
+        #otra transaccion creo la fila primero
+        modelo.objects.filter(**claves).update(**cambios)
+
+
+def _sumar_productos(mes, cantidades):
+    """
+    Suma {producto_id: cantidad} a ResumenProductoMes del mes con un UPDATE
+    para las filas existentes y un INSERT para las nuevas, sin importar
+    cuántos productos tenga la venta.
+    """
+    existentes = set(ResumenProductoMes.objects.filter(mes=mes, producto_id__in=cantidades)
+                     .values_list('producto_id', flat=True))
+    if existentes:
+        ResumenProductoMes.objects.filter(mes=mes, producto_id__in=existentes).update(
+            cantidad=F('cantidad') + Case(
+                *[When(producto_id=pk, then=Value(cantidades[pk])) for pk in existentes],
+                output_field=BigIntegerField(),
+            ))
+    nuevos = [ResumenProductoMes(mes=mes, producto_id=pk, cantidad=cantidad)
+              for pk, cantidad in cantidades.items() if pk not in existentes]
+    if not nuevos:
+        return
+    try:
+        with transaction.atomic():
+            ResumenProductoMes.objects.bulk_create(nuevos)
+    except IntegrityError:
+        #otra transaccion creo alguna de las filas primero
+        for fila in nuevos:
+            _sumar(ResumenProductoMes, {'mes': mes, 'producto_id': fila.producto_id}, cantidad=fila.cantidad)
+
+
+def registrar_ventas(ventas, cantidades=None, signo=1):
+    """
+    Suma (o resta con signo=-1) varias ventas completadas a los resúmenes,
+    agrupadas por mes. `cantidades` ({venta_id: {producto_id: cantidad}})
+    evita leer de nuevo las líneas si quien llama ya las tiene.
+    """
+    if cantidades is None:
+        cantidades = {}
+        lineas = (DetalleVenta.objects.filter(venta__in=[venta.pk for venta in ventas]).order_by()
+                  .values('venta', 'producto').annotate(cantidad=Sum('cantidad'))
+                  .values_list('venta', 'producto', 'cantidad'))
+        for venta_id, producto_id, cantidad in lineas:
+            cantidades.setdefault(venta_id, {})[producto_id] = cantidad
+
+    por_mes = {}
+    for venta in ventas:
+        resumen = por_mes.setdefault(mes_de(venta.fecha), {'total': 0, 'num_ventas': 0, 'productos': Counter()})
+        resumen['total'] += venta.total
+        resumen['num_ventas'] += 1
+        resumen['productos'].update(cantidades.get(venta.pk, {}))
+
+    for mes, resumen in por_mes.items():
+        _sumar(ResumenVentasMes, {'mes': mes}, total=signo * resumen['total'], num_ventas=signo * resumen['num_ventas'])
+        if resumen['productos']:
+            _sumar_productos(mes, {pk: signo * cantidad for pk, cantidad in resumen['productos'].items()})
+
+
+def registrar_venta(venta, signo=1, cantidades=None):
+    """Suma (o resta con signo=-1) una venta completada a los resúmenes."""
+    registrar_ventas([venta], None if cantidades is None else {venta.pk: cantidades}, signo)
+
+
+def revertir_venta(venta):
+    registrar_venta(venta, signo=-1)
+
+
+@transaction.atomic
+def reconstruir():
+    """Recalcula ambos resúmenes desde el historial de ventas completadas."""
+    completadas = Venta.objects.filter(estado='completado')
+
+    ResumenVentasMes.objects.all().delete()
+    ResumenVentasMes.objects.bulk_create([
+        ResumenVentasMes(mes=fila['mes'], total=fila['total'], num_ventas=fila['num_ventas'])
+        for fila in completadas.annotate(mes=TruncMonth('fecha', output_field=DateField()))
+        .values('mes').annotate(total=Sum('total'), num_ventas=Count('id')).order_by()
+    ], batch_size=1000)
+
+    ResumenProductoMes.objects.all().delete()
+    ResumenProductoMes.objects.bulk_create([
+        ResumenProductoMes(mes=fila['mes'], producto_id=fila['producto'], cantidad=fila['cantidad'])
+        for fila in DetalleVenta.objects.filter(venta__estado='completado')
+        .annotate(mes=TruncMonth('venta__fecha', output_field=DateField()))
+        .values('mes', 'producto').annotate(cantidad=Sum('cantidad')).order_by()
+    ], batch_size=1000)
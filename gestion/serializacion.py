@@ -0,0 +1,100 @@
+"""
+Serialización rápida de solo lectura para las listas de la API.
+
+En vez de instanciar un modelo y recorrer los campos de DRF por cada fila, se
+piden a la base solo las columnas necesarias con `.values()` y cada valor se
+convierte con el `to_representation` del campo de DRF correspondiente. Los
+campos de DRF se crean una sola vez por petición, no una vez por fila, y la
+salida es la misma que la del serializer.
+
+Las listas anidadas (por ejemplo `detalles` de una venta) se cargan con una
+consulta extra para toda la página y se agrupan por la cabecera.
+"""
+from rest_framework import serializers
+from rest_framework.relations import RelatedField
+
+
+class _Columna:
+    __slots__ = ('nombre', 'ruta', 'convertir', 'omitir_nulo')
+
+    def __init__(self, nombre, campo):
+        self.nombre = nombre
+        self.ruta = campo.source.replace('.', '__')
+        #un RelatedField sobre el id y un ReadOnlyField ya entregan el valor final
+        if isinstance(campo, (RelatedField, serializers.ReadOnlyField)):
+            self.convertir = None
+        else:
+            self.convertir = campo.to_representation
+        #DRF omite los ReadOnlyField que cruzan una relacion nula (SkipField)
+        self.omitir_nulo = isinstance(campo, serializers.ReadOnlyField) and '.' in campo.source
+
+
+def campos_del_serializer(serializer_class):
+    """Campos del serializer (instanciado una vez) por nombre."""
+    return serializer_class().fields
+
+
+def columnas(serializer_class, campos=None):
+    """
+    Columnas planas del serializer (sin las listas anidadas), limitadas a
+    `campos` si se indican.
+    """
+    return [
+        _Columna(nombre, campo)
+        for nombre, campo in campos_del_serializer(serializer_class).items()
+        if (campos is None or nombre in campos) and not isinstance(campo, serializers.BaseSerializer)
+    ]
+
+
+def anidados(serializer_class, modelo, campos=None):
+    """
+    Listas anidadas del serializer como {nombre: (serializer hijo, campo fk
+    del hijo hacia la cabecera)}.
+    """
+    resultado = {}
+    for nombre, campo in campos_del_serializer(serializer_class).items():
+        if campos is not None and nombre not in campos:
+            continue
+        if isinstance(campo, serializers.ListSerializer):
+            relacion = modelo._meta.get_field(campo.source)
+            resultado[nombre] = (type(campo.child), relacion.field.name)
+    return resultado
+
+
+def convertir_filas(filas, cols):
+    """Convierte dicts de `.values()` al formato de salida del serializer."""
+    salida = []
+    for fila in filas:
+        dato = {}
+        for col in cols:
+            valor = fila[col.ruta]
+            if valor is None:
+                if col.omitir_nulo:
+                    continue
+                dato[col.nombre] = None
+            else:
+                dato[col.nombre] = col.convertir(valor) if col.convertir else valor
+        salida.append(dato)
+    return salida
+
+
+def rutas(cols, extra=()):
+    """Columnas a pedir a `.values()` (sin repetir)."""
+    return list(dict.fromkeys([col.ruta for col in cols] + list(extra)))
+
+
+def serializar_anidados(datos, ids, serializer_class, modelo, campos=None):
+    """
+    Agrega a cada dato de `datos` (en el mismo orden que `ids`) sus listas
+    anidadas, con una consulta por lista para toda la página.
+    """
+    for nombre, (hijo, fk) in anidados(serializer_class, modelo, campos).items():
+        cols = columnas(hijo)
+        grupos = {pk: [] for pk in ids}
+        filas = list(hijo.Meta.model.objects.filter(**{fk + '__in': ids}).order_by('id')
+                     .values(*rutas(cols, [fk])))
+        for fila, dato in zip(filas, convertir_filas(filas, cols)):
+            grupos[fila[fk]].append(dato)
+        for pk, dato in zip(ids, datos):
+            dato[nombre] = grupos[pk]
+    return datos
@@ -1,22 +1,34 @@
 from rest_framework import serializers
 from .models import Cliente, Proveedor, Categoria, Producto, Venta, Compra, DetalleVenta, DetalleCompra, MovimientoInventario
 
-class CategoriaSerializer(serializers.ModelSerializer):
+class CamposDinamicosMixin:
+    """
+    Deja solo los campos indicados en context['campos'] (ver ?fields= en la API).
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        campos = self.context.get('campos')
+        if campos is not None:
+            for nombre in set(self.fields) - set(campos):
+                self.fields.pop(nombre)
+
+class CategoriaSerializer(CamposDinamicosMixin, serializers.ModelSerializer):
     class Meta:
         model = Categoria
         fields = '__all__'
 
-class ClienteSerializer(serializers.ModelSerializer):
+class ClienteSerializer(CamposDinamicosMixin, serializers.ModelSerializer):
     class Meta:
         model = Cliente
         fields = '__all__'
 
-class ProveedorSerializer(serializers.ModelSerializer):
+class ProveedorSerializer(CamposDinamicosMixin, serializers.ModelSerializer):
     class Meta:
         model = Proveedor
         fields = '__all__'
 
-class ProductoSerializer(serializers.ModelSerializer):
+class ProductoSerializer(CamposDinamicosMixin, serializers.ModelSerializer):
     # Campos extra para mostrar nombres
     categoria_nombre = serializers.ReadOnlyField(source='categoria.nombre')
     proveedor_nombre = serializers.ReadOnlyField(source='proveedor.empresa')
@@ -39,7 +51,7 @@ class DetalleCompraSerializer(serializers.ModelSerializer):
         model = DetalleCompra
         fields = ['id', 'producto', 'producto_nombre', 'cantidad', 'costo_unitario']
 
-class VentaSerializer(serializers.ModelSerializer):
+class VentaSerializer(CamposDinamicosMixin, serializers.ModelSerializer):
     cliente_nombre = serializers.ReadOnlyField(source='cliente.nombre')
     #se agregan los detalles de la venta
     detalles = DetalleVentaSerializer(many=True, read_only=True)
@@ -48,7 +60,7 @@ class VentaSerializer(serializers.ModelSerializer):
         model = Venta
         fields = '__all__'
 
-class CompraSerializer(serializers.ModelSerializer):
+class CompraSerializer(CamposDinamicosMixin, serializers.ModelSerializer):
     proveedor_nombre = serializers.ReadOnlyField(source='proveedor.empresa')
     
     #se agregan los detalles de la compra
@@ -58,11 +70,26 @@ class CompraSerializer(serializers.ModelSerializer):
         model = Compra
         fields = '__all__'
 
-class MovimientoSerializer(serializers.ModelSerializer):
+class MovimientoSerializer(CamposDinamicosMixin, serializers.ModelSerializer):
     producto_nombre = serializers.ReadOnlyField(source='producto.nombre')
     venta_numero = serializers.ReadOnlyField(source='venta_asociada.numero_pedido')
     compra_numero = serializers.ReadOnlyField(source='compra_asociada.numero_orden')
 
     class Meta:
         model = MovimientoInventario
-        fields = '__all__'
\ No newline at end of file
+        fields = '__all__'
+
+#entrada de la API de pedidos en lote
+class LineaPedidoSerializer(serializers.Serializer):
+    producto = serializers.IntegerField(min_value=1)
+    cantidad = serializers.IntegerField(min_value=1)
+    #opcional: si se envia debe coincidir con el precio de venta vigente
+    precio_unitario = serializers.DecimalField(max_digits=10, decimal_places=2, required=False)
+
+class PedidoSerializer(serializers.Serializer):
+    cliente = serializers.IntegerField(min_value=1)
+    finalizar = serializers.BooleanField(default=False)
+    lineas = LineaPedidoSerializer(many=True, allow_empty=False, max_length=5000)
+
+class LotePedidosSerializer(serializers.Serializer):
+    pedidos = PedidoSerializer(many=True, allow_empty=False, max_length=1000)
@@ -0,0 +1,101 @@
+"""
+Receptores de señales de la aplicación.
+"""
+from django.contrib.auth.models import Group, User
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_save, post_delete, pre_delete
+from django.dispatch import receiver
+
+from .decorators import invalidar_grupos
+from . import autenticacion
+
+from .models import (
+    Categoria, Proveedor, Producto, Cliente, Venta, DetalleVenta,
+    Compra, DetalleCompra, MovimientoInventario, TokenAcceso
+)
+from .versiones import incrementar_version
+from . import busqueda, resumenes
+
+MODELOS_VERSIONADOS = (
+    Categoria, Proveedor, Producto, Cliente, Venta, DetalleVenta,
+    Compra, DetalleCompra, MovimientoInventario,
+)
+
+
+@receiver(post_save)
+@receiver(post_delete)
+def actualizar_version(sender, **kwargs):
+    if sender in MODELOS_VERSIONADOS:
+        incrementar_version(sender)
+
+
+#resumenes mensuales (resumenes.py): borrar una venta completada, sola o en
+#cascada al borrar su cliente, la resta antes de que se borren sus lineas
+@receiver(pre_delete, sender=Venta)
+def venta_eliminada(sender, instance, **kwargs):
+    if instance.estado == 'completado':
+        resumenes.revertir_venta(instance)
+
+
+#indice de busqueda (busqueda.py): solo si cambio algun campo indexado
+@receiver(post_save)
+def actualizar_busqueda(sender, instance, update_fields=None, **kwargs):
+    indice = busqueda.POR_MODELO.get(sender)
+    if indice is not None and (update_fields is None or set(update_fields) & set(indice.campos)):
+        busqueda.registrar_cambio(sender, instance)
+
+
+@receiver(post_delete)
+def quitar_de_busqueda(sender, instance, **kwargs):
+    if sender in busqueda.POR_MODELO:
+        busqueda.registrar_cambio(sender, instance, borrado=True)
+
+
+#cache de grupos por usuario (decorators.grupos_usuario)
+def _invalidar_al_confirmar(user_ids):
+    user_ids = list(user_ids)
+    if user_ids:
+        invalidar_grupos(*user_ids)
+        #de nuevo al confirmar, por si otro request lo volvio a cargar antes del commit
+        transaction.on_commit(lambda: invalidar_grupos(*user_ids))
+
+
+@receiver(m2m_changed, sender=User.groups.through)
+def grupos_de_usuario_cambiados(sender, instance, action, reverse, pk_set, **kwargs):
+    if not reverse:
+        #user.groups.add/remove/clear(...)
+        if action.startswith('post_'):
+            _invalidar_al_confirmar([instance.pk])
+    elif action == 'pre_clear':
+        #group.user_set.clear(): hay que saber quienes eran antes de borrar
+        instance._usuarios_antes_de_limpiar = list(instance.user_set.values_list('pk', flat=True))
+    elif action == 'post_clear':
+        _invalidar_al_confirmar(getattr(instance, '_usuarios_antes_de_limpiar', []))
+    elif action.startswith('post_'):
+        #group.user_set.add/remove(...)
+        _invalidar_al_confirmar(pk_set or [])
+
+
+@receiver(post_save, sender=Group)
+def grupo_guardado(sender, instance, created, **kwargs):
+    if not created:
+        #renombrar un grupo cambia los nombres cacheados de todos sus miembros
+        _invalidar_al_confirmar(instance.user_set.values_list('pk', flat=True))
+
+
+@receiver(pre_delete, sender=Group)
+def grupo_eliminado(sender, instance, **kwargs):
+    _invalidar_al_confirmar(instance.user_set.values_list('pk', flat=True))
+
+
+#cache de tokens de la API (autenticacion.py)
+@receiver(post_save, sender=User)
+def usuario_guardado(sender, instance, created, update_fields=None, **kwargs):
+    #cada inicio de sesion guarda last_login: eso no cambia lo que se cachea
+    if not created and set(update_fields or ()) != {'last_login'}:
+        autenticacion.invalidar_usuario(instance.pk)
+
+
+@receiver(post_delete, sender=TokenAcceso)
+def token_eliminado(sender, instance, **kwargs):
+    autenticacion.invalidar_cache(instance.clave_hash)
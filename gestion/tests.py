@@ -1,3 +1,1374 @@
-from django.test import TestCase
+import csv
+import importlib
+import io
+import json
+import os
+import pstats
+import re
+import shutil
+import tempfile
+import threading
+import time
+import warnings
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.apps import apps as django_apps
+from django.conf import settings
+from django.contrib import admin
+from django.contrib.auth.models import Group, User
+from django.contrib.messages.storage.cookie import CookieStorage
+from django.core.cache import cache
+from django.core.handlers.asgi import ASGIRequest
+from django.core.management import call_command
+from django.db import IntegrityError, OperationalError, close_old_connections, connection, transaction
+from django.db.models import QuerySet
+from django.http import HttpResponse, QueryDict, StreamingHttpResponse
+from django.template.loader import render_to_string
+from django.test import AsyncRequestFactory, RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from pypdf import PdfReader
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+
+from .models import (Categoria, Cliente, Compra, DetalleCompra, DetalleVenta, MovimientoInventario, Producto, Proveedor,
+                     ResumenProductoMes, ResumenVentasMes, TokenAcceso, TrabajoReporte, Venta)
+from . import (arranque, autenticacion, busqueda, exportar, inventario, lineas, metricas, paginacion, pdf_paralelo,
+               pdf_streaming, perfilado, resumenes, trabajos, urls, views)
+from .admin import DetalleVentaInline
+from .api_views import ProductoViewSet, VentaViewSet
+from .decorators import PREFIJO_CACHE_GRUPOS, grupos_usuario, solo_administrador
+from .estaticos import WhiteNoiseAsyncMiddleware
+from .filters import InventarioFilter, VentaFilter
+from .versiones import versiones
+
+
+def crear_producto(nombre, cantidad, precio='10.00'):
+    categoria, _ = Categoria.objects.get_or_create(nombre='General')
+    proveedor, _ = Proveedor.objects.get_or_create(
+        empresa='Proveedor', defaults={'contacto': 'Ana', 'telefono': '12345678', 'direccion': 'Zona 1'})
+    return Producto.objects.create(
+        codigo=nombre, nombre=nombre, categoria=categoria, proveedor=proveedor,
+        cantidad=cantidad, precio_compra=precio, precio_venta=precio,
+    )
+
+
+def crear_venta(lineas, numero=None):
+    cliente, _ = Cliente.objects.get_or_create(
+        nombre='Cliente', defaults={'telefono': '12345678', 'correo': 'c@example.com', 'direccion': 'Zona 1'})
+    venta = Venta.objects.create(cliente=cliente, numero_pedido=numero or f'PED-{Venta.objects.count() + 1:05d}')
+    DetalleVenta.objects.bulk_create([
+        DetalleVenta(venta=venta, producto=producto, cantidad=cantidad, precio_unitario=producto.precio_venta)
+        for producto, cantidad in lineas
+    ])
+    return venta
+
+
+def crear_compra(lineas):
+    compra = Compra.objects.create(proveedor=Proveedor.objects.first(), numero_orden=f'ORD-{Compra.objects.count() + 1:05d}')
+    DetalleCompra.objects.bulk_create([
+        DetalleCompra(compra=compra, producto=producto, cantidad=cantidad, costo_unitario=costo)
+        for producto, cantidad, costo in lineas
+    ])
+    return compra
+
+
+class PaginacionKeysetTests(TestCase):
+    #nombres repetidos: el desempate por id tiene que cruzar el borde de las paginas
+    NOMBRES = ['B', 'A', 'A', 'C', 'A', 'B', 'D', 'A']
+
+    def setUp(self):
+        for nombre in self.NOMBRES:
+            Cliente.objects.create(nombre=nombre, telefono='12345678', correo='c@example.com', direccion='Zona 1')
+        self.orden = list(Cliente.objects.order_by('nombre', 'id').values_list('id', flat=True))
+
+    def pagina(self, **parametros):
+        request = RequestFactory().get('/clientes/', parametros)
+        return paginacion.paginar_keyset(request, Cliente.objects.all(), ['nombre', 'id'], por_pagina=3)
+
+    def ids(self, pagina):
+        return [cliente.id for cliente in pagina]
+
+    def test_adelante_y_atras_con_empates(self):
+        paginas = [self.pagina()]
+        self.assertFalse(paginas[0].tiene_anterior)
+        while paginas[-1].tiene_siguiente:
+            paginas.append(self.pagina(despues=paginas[-1].cursor_siguiente))
+        self.assertEqual([cliente for pagina in paginas for cliente in self.ids(pagina)], self.orden)
+        self.assertEqual([len(pagina) for pagina in paginas], [3, 3, 2])
+
+        #hacia atras desde la ultima se recorren las mismas paginas
+        anterior = paginas[-1]
+        for esperada in reversed(paginas[:-1]):
+            anterior = self.pagina(antes=anterior.cursor_anterior)
+            self.assertEqual(self.ids(anterior), self.ids(esperada))
+        self.assertFalse(anterior.tiene_anterior)
+        self.assertTrue(anterior.tiene_siguiente)
+
+    def test_cursor_invalido_vuelve_al_inicio(self):
+        primera = self.ids(self.pagina())
+        largo_incorrecto = paginacion._codificar_cursor(['A'])
+        no_es_lista = paginacion._codificar_cursor({'nombre': 'A', 'id': 1})
+        tipo_incorrecto = paginacion._codificar_cursor(['A', 'uno'])
+        for cursor in ['xxx', '!!', largo_incorrecto, no_es_lista, tipo_incorrecto]:
+            with self.subTest(cursor=cursor):
+                self.assertEqual(self.ids(self.pagina(despues=cursor)), primera)
+                self.assertEqual(self.ids(self.pagina(antes=cursor)), primera)
+
+    def test_enlaces_conservan_filtros(self):
+        primera = self.pagina(q='A', orden='x')
+        self.assertIsNone(primera.enlace_anterior)
+        segunda = self.pagina(q='A', despues=primera.cursor_siguiente)
+        enlace = QueryDict(segunda.enlace_siguiente[1:])
+        self.assertEqual((enlace['q'], enlace['despues'], enlace['por_pagina']), ('A', segunda.cursor_siguiente, '3'))
+        self.assertEqual(QueryDict(segunda.enlace_anterior[1:]).getlist('despues'), [])
+
+        html = render_to_string('paginacion.html', {'pagina': primera})
+        self.assertNotIn('None', html)
+        self.assertNotIn('antes=', html)
+        self.assertIn('q=A&amp;orden=x&amp;despues=', html)
+
+
+class ExportarCsvTests(TestCase):
+    def setUp(self):
+        self.client.force_login(User.objects.create_user('lector', password='x'))
+        self.producto = crear_producto('P1', 100)
+
+    def exportar(self, ruta, **filtros):
+        respuesta = self.client.get(ruta, {'export': 'csv', **filtros})
+        self.assertIsInstance(respuesta, StreamingHttpResponse)
+        return list(csv.reader(io.StringIO(b''.join(respuesta.streaming_content).decode())))
+
+    def test_ventas_filtradas(self):
+        otro = Cliente.objects.create(nombre='Otro', telefono='87654321', correo='o@example.com', direccion='Zona 2')
+        for numero in range(6):
+            venta = crear_venta([(self.producto, 1)])
+            if numero % 2:
+                Venta.objects.filter(pk=venta.pk).update(estado='completado', total=10 * numero)
+            else:
+                Venta.objects.filter(pk=venta.pk).update(cliente=otro)
+
+        filas = self.exportar('/reportes/ventas/', cliente='Cliente')
+        self.assertEqual(filas[0], exportar.ENCABEZADOS['ventas'])
+        esperadas = Venta.objects.filter(cliente__nombre='Cliente').order_by('-fecha')
+        self.assertEqual([fila[0] for fila in filas[1:]], [venta.numero_pedido for venta in esperadas])
+        self.assertEqual({(fila[2], fila[4]) for fila in filas[1:]}, {('Cliente', 'Completado')})
+        self.assertEqual(sorted(fila[3] for fila in filas[1:]), ['10.00', '30.00', '50.00'])
+
+    def test_inventario(self):
+        crear_producto('P2', 7, precio='3.50')
+        filas = self.exportar('/reportes/inventario/', nombre='P2')
+        self.assertEqual(filas, [exportar.ENCABEZADOS['inventario'], ['P2', 'P2', 'General', '7', '3.50']])
+
+    def test_consultas_constantes(self):
+        def contar(ruta):
+            with CaptureQueriesContext(connection) as consultas:
+                self.exportar(ruta)
+            return len(consultas)
+
+        crear_compra([(self.producto, 1, '1.00')])
+        crear_venta([(self.producto, 1)])
+        rutas = ('/reportes/ventas/', '/reportes/compras/', '/reportes/inventario/')
+        for ruta in rutas:
+            contar(ruta) #la primera vez se crean las versiones y se llenan los caches
+        antes = {ruta: contar(ruta) for ruta in rutas}
+        for numero in range(30):
+            crear_venta([(self.producto, 1)])
+            crear_compra([(crear_producto(f'Q{numero}', 1), 1, '1.00')])
+        for ruta, consultas in antes.items():
+            self.assertEqual(contar(ruta), consultas, ruta)
+
+
+class PdfStreamingTests(TestCase):
+    def textos(self, reporte, filas):
+        destino = io.BytesIO()
+        totales = reporte.render(filas, destino, total_paginas=reporte.total_paginas(len(filas)))
+        destino.seek(0)
+        return [pagina.extract_text() for pagina in PdfReader(destino).pages], totales
+
+    def test_varias_paginas_con_pie_y_totales(self):
+        reporte = pdf_streaming.ReporteInventarioStreaming('Inventario')
+        cantidad = reporte.filas_en_pagina(1) + reporte.filas_en_pagina(2) + 5
+        filas = [(f'C{i:05d}', f'Producto {i}', 'General', 2, Decimal('1.50')) for i in range(cantidad)]
+
+        paginas, totales = self.textos(reporte, filas)
+        self.assertEqual(len(paginas), reporte.total_paginas(cantidad))
+        self.assertEqual(len(paginas), 3)
+        for numero, texto in enumerate(paginas, 1):
+            self.assertIn(f'Página {numero} de 3', texto)
+        self.assertEqual(totales, {'stock': 2 * cantidad, 'valor': Decimal('3.00') * cantidad})
+        self.assertEqual([('TOTALES:' in texto) for texto in paginas], [False, False, True])
+        self.assertIn(f'{2 * cantidad} unidades', paginas[-1])
+        #cada fila aparece una sola vez y la primera de la pagina 2 es la que indica primera_fila_de_pagina
+        self.assertIn(filas[reporte.primera_fila_de_pagina(2)][0], paginas[1])
+        self.assertEqual(sum(len(re.findall(r'Producto \d+', texto)) for texto in paginas), cantidad)
+
+    def test_totales_en_pagina_nueva_si_la_ultima_queda_llena(self):
+        reporte = pdf_streaming.ReporteInventarioStreaming('Inventario')
+        cantidad = reporte.filas_en_pagina(1)
+        filas = [(f'C{i:05d}', f'Producto {i}', None, 1, Decimal('2.00')) for i in range(cantidad)]
+
+        paginas, _ = self.textos(reporte, filas)
+        self.assertEqual(len(paginas), 2)
+        self.assertNotIn('TOTALES:', paginas[0])
+        self.assertIn('TOTALES:', paginas[1])
+        self.assertIn('Página 2 de 2', paginas[1])
+
+    def test_generar_desde_la_base(self):
+        producto = crear_producto('P1', 10)
+        for total in ('10.00', '2.50'):
+            venta = crear_venta([(producto, 1)])
+            Venta.objects.filter(pk=venta.pk).update(total=total)
+
+        destino = io.BytesIO()
+        reporte = pdf_streaming.ReporteVentasStreaming('Ventas')
+        totales = reporte.generar(Venta.objects.order_by('id'), destino, total_paginas=1)
+        self.assertEqual(totales['total'], Decimal('12.50'))
+        texto = PdfReader(destino).pages[0].extract_text()
+        self.assertIn('TOTAL:', texto)
+        self.assertIn('Q12.50', texto)
+        self.assertIn('PED-00001', texto)
+
+
+class PdfParaleloTests(TransactionTestCase):
+    #las partes se dibujan en hilos: ven la misma base de prueba que el proceso de la prueba
+    PROCESOS = 3
+
+    def setUp(self):
+        reporte = pdf_streaming.ReporteInventarioStreaming('Inventario')
+        for i in range(reporte.filas_en_pagina(1) + reporte.filas_en_pagina(2) * 3 + 7):
+            crear_producto(f'P{i:04d}', i % 9, precio=f'{i % 13}.25')
+
+    def textos(self, destino):
+        destino.seek(0)
+        return [pagina.extract_text() for pagina in PdfReader(destino).pages]
+
+    def generar(self, planificar=None):
+        destino = io.BytesIO()
+        with mock.patch.object(pdf_paralelo, '_pool', lambda procesos: ThreadPoolExecutor(procesos)):
+            if planificar:
+                with mock.patch.object(pdf_paralelo, '_planificar', planificar):
+                    paralelo = pdf_paralelo.generar_pdf_paralelo(
+                        'inventario', Producto.objects.order_by('id'), 'Inventario', destino, procesos=self.PROCESOS)
+            else:
+                paralelo = pdf_paralelo.generar_pdf_paralelo(
+                    'inventario', Producto.objects.order_by('id'), 'Inventario', destino, procesos=self.PROCESOS)
+        return paralelo, self.textos(destino)
+
+    def serie(self, **kwargs):
+        destino = io.BytesIO()
+        pdf_streaming.ReporteInventarioStreaming('Inventario').generar(Producto.objects.order_by('id'), destino, **kwargs)
+        return self.textos(destino)
+
+    def test_igual_que_en_serie(self):
+        paralelo, paginas = self.generar()
+        esperadas = self.serie(total_paginas=len(paginas))
+
+        self.assertTrue(paralelo)
+        self.assertEqual(len(paginas), len(esperadas))
+        self.assertGreaterEqual(len(paginas), self.PROCESOS)
+        for numero, (texto, esperado) in enumerate(zip(paginas, esperadas), 1):
+            self.assertIn(f'Página {numero} de {len(esperadas)}', texto)
+            #el pie lleva el acumulado: cada parte arranca con el total de las anteriores
+            self.assertEqual(texto.splitlines()[-1], esperado.splitlines()[-1])
+        self.assertEqual(paginas[-1], esperadas[-1])
+        self.assertEqual([re.findall(r'P\d{4}', texto) for texto in paginas],
+                         [re.findall(r'P\d{4}', texto) for texto in esperadas])
+
+    def test_vuelve_a_serie_si_cambian_los_datos(self):
+        planificar = pdf_paralelo._planificar
+
+        def planificar_y_borrar(*args):
+            plan = planificar(*args)
+            #una escritura entre el conteo y el dibujo de las partes
+            Producto.objects.filter(pk=Producto.objects.order_by('id').values('pk')[:1]).delete()
+            return plan
+
+        paralelo, paginas = self.generar(planificar_y_borrar)
+
+        #se descarta lo dibujado en paralelo y queda el mismo reporte que en serie
+        self.assertFalse(paralelo)
+        self.assertEqual(paginas, self.serie())
+
+
+class TrabajosReporteTests(TestCase):
+    def setUp(self):
+        self.directorio = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directorio, ignore_errors=True)
+        self.enterContext(override_settings(REPORTES_DIR=self.directorio))
+
+    def test_reserva_una_sola_vez(self):
+        primero = trabajos.solicitar_reporte('ventas', 'csv', {})
+        antes = timezone.now()
+
+        tomado = trabajos.tomar_siguiente()
+        self.assertEqual((tomado.pk, tomado.estado), (primero.pk, 'procesando'))
+        #update() no toca auto_now: la reserva tiene que mover actualizado
+        self.assertGreaterEqual(tomado.actualizado, antes)
+        self.assertIsNone(trabajos.tomar_siguiente())
+
+    def test_libera_solo_los_abandonados(self):
+        viejo = trabajos.solicitar_reporte('ventas', 'csv', {})
+        TrabajoReporte.objects.filter(pk=viejo.pk).update(
+            estado='procesando', actualizado=timezone.now() - timedelta(hours=2))
+        #un trabajo pendiente desde hace horas que se acaba de reservar no es un abandonado
+        reciente = trabajos.solicitar_reporte('compras', 'csv', {})
+        TrabajoReporte.objects.filter(pk=reciente.pk).update(actualizado=timezone.now() - timedelta(hours=2))
+        self.assertEqual(trabajos.tomar_siguiente().pk, reciente.pk)
+
+        self.assertEqual(trabajos.liberar_abandonados(30), 1)
+        viejo.refresh_from_db()
+        reciente.refresh_from_db()
+        self.assertEqual((viejo.estado, reciente.estado), ('pendiente', 'procesando'))
+
+    def test_reutiliza_hasta_que_cambian_los_datos(self):
+        producto = crear_producto('A', 10)
+        crear_venta([(producto, 1)])
+        primero = trabajos.solicitar_reporte('ventas', 'csv', {'estado': 'pendiente'})
+        trabajos.procesar(trabajos.tomar_siguiente())
+
+        mismo = trabajos.solicitar_reporte('ventas', 'csv', {'estado': 'pendiente'})
+        self.assertEqual((mismo.pk, mismo.estado), (primero.pk, 'completado'))
+        self.assertTrue(trabajos.archivo_disponible(mismo))
+
+        crear_venta([(producto, 2)])
+        nuevo = trabajos.solicitar_reporte('ventas', 'csv', {'estado': 'pendiente'})
+        self.assertNotEqual(nuevo.pk, primero.pk)
+        self.assertEqual(nuevo.estado, 'pendiente')
+
+
+class LineasTests(TestCase):
+    def setUp(self):
+        self.a = crear_producto('A', 100, precio='10.00')
+        self.b = crear_producto('B', 100, precio='2.50')
+        self.venta = crear_venta([])
+
+    def total(self):
+        self.venta.refresh_from_db()
+        return self.venta.total
+
+    def test_recalcula_el_total(self):
+        self.assertTrue(lineas.agregar_linea_venta(self.venta.id, self.a, 2))
+        self.assertTrue(lineas.agregar_linea_venta(self.venta.id, self.b, 4))
+        self.assertEqual(self.total(), Decimal('30.00'))
+        #el mismo producto se suma a su linea
+        self.assertFalse(lineas.agregar_linea_venta(self.venta.id, self.a, 1))
+        self.assertEqual(self.total(), Decimal('40.00'))
+
+        linea_b = self.venta.detalles.get(producto=self.b)
+        self.assertEqual(lineas.actualizar_linea_venta(linea_b.id, 2), self.venta.id)
+        self.assertEqual(self.total(), Decimal('35.00'))
+        lineas.eliminar_linea_venta(self.venta.detalles.get(producto=self.a).id)
+        self.assertEqual(self.total(), Decimal('5.00'))
+        lineas.eliminar_linea_venta(linea_b.id)
+        self.assertEqual(self.total(), Decimal('0'))
+
+    def test_una_linea_por_producto(self):
+        lineas.agregar_linea_venta(self.venta.id, self.a, 1)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            DetalleVenta.objects.create(venta=self.venta, producto=self.a, cantidad=1, precio_unitario='10.00')
+
+    def test_reintenta_si_otra_transaccion_inserto_la_linea(self):
+        lineas.agregar_linea_venta(self.venta.id, self.a, 2)
+        update = QuerySet.update
+        llamadas = []
+
+        def update_que_llega_tarde(queryset, **cambios):
+            #el primer UPDATE no ve la linea, como si la hubiera insertado otra transaccion
+            if queryset.model is DetalleVenta and not llamadas:
+                llamadas.append(cambios)
+                return 0
+            return update(queryset, **cambios)
+
+        with mock.patch.object(QuerySet, 'update', autospec=True, side_effect=update_que_llega_tarde):
+            creada = lineas.agregar_linea_venta(self.venta.id, self.a, 3)
+
+        self.assertEqual(len(llamadas), 1)
+        self.assertFalse(creada)
+        self.assertEqual(list(self.venta.detalles.values_list('cantidad', flat=True)), [5])
+        self.assertEqual(self.total(), Decimal('50.00'))
+
+    def test_linea_inexistente(self):
+        lineas.agregar_linea_venta(self.venta.id, self.a, 1)
+        detalle = self.venta.detalles.get()
+        lineas.eliminar_linea_venta(detalle.id)
+
+        with self.assertRaises(lineas.LineaNoEncontrada):
+            lineas.eliminar_linea_venta(detalle.id)
+        with self.assertRaises(lineas.LineaNoEncontrada):
+            lineas.actualizar_linea_venta(detalle.id, 2)
+        with self.assertRaises(lineas.LineaNoEncontrada):
+            lineas.actualizar_linea_compra(detalle.id, 2)
+
+    def test_rechaza_cantidad_no_positiva(self):
+        lineas.agregar_linea_venta(self.venta.id, self.a, 3)
+        detalle = self.venta.detalles.get()
+        for cantidad in (0, -1):
+            with self.assertRaises(lineas.LineaError):
+                lineas.actualizar_linea_venta(detalle.id, cantidad)
+            with self.assertRaises(lineas.LineaError):
+                lineas.agregar_linea_venta(self.venta.id, self.a, cantidad)
+        detalle.refresh_from_db()
+        self.assertEqual(detalle.cantidad, 3)
+        self.assertEqual(self.total(), Decimal('30.00'))
+
+
+class FinalizarVentaTests(TestCase):
+
+    def test_descuenta_stock_y_registra_movimientos(self):
+        a = crear_producto('A', 10)
+        b = crear_producto('B', 5)
+        venta = crear_venta([(a, 3), (b, 5)])
+
+        self.assertTrue(inventario.finalizar_venta(venta.id))
+
+        a.refresh_from_db()
+        b.refresh_from_db()
+        venta.refresh_from_db()
+        self.assertEqual((a.cantidad, b.cantidad), (7, 0))
+        self.assertEqual(venta.estado, 'completado')
+        self.assertEqual(MovimientoInventario.objects.filter(venta_asociada=venta, tipo='salida').count(), 2)
+        #una segunda llamada no vuelve a descontar
+        self.assertFalse(inventario.finalizar_venta(venta.id))
+        a.refresh_from_db()
+        self.assertEqual(a.cantidad, 7)
+
+    def test_sin_stock_no_cambia_nada(self):
+        a = crear_producto('A', 10)
+        b = crear_producto('B', 1)
+        venta = crear_venta([(a, 3), (b, 2)])
+
+        with self.assertRaises(inventario.StockInsuficiente) as contexto:
+            inventario.finalizar_venta(venta.id)
+
+        self.assertEqual(contexto.exception.productos, ['B'])
+        a.refresh_from_db()
+        venta.refresh_from_db()
+        self.assertEqual(a.cantidad, 10)
+        self.assertEqual(venta.estado, 'pendiente')
+        self.assertFalse(MovimientoInventario.objects.exists())
+
+    def test_consultas_constantes(self):
+        def contar(num_lineas):
+            productos = [crear_producto(f'P{num_lineas}-{i}', 100) for i in range(num_lineas)]
+            venta = crear_venta([(producto, 1) for producto in productos])
+            with CaptureQueriesContext(connection) as consultas:
+                inventario.finalizar_venta(venta.id)
+            return len(consultas)
+
+        contar(1) #la primera vez se crean las filas de versiones y resumenes
+        self.assertEqual(contar(2), contar(40))
+
+
+class RecibirCompraTests(TestCase):
+
+    def test_recepcion_parcial_y_final(self):
+        a = crear_producto('A', 1)
+        b = crear_producto('B', 0)
+        compra = crear_compra([(a, 10, '4.50'), (b, 3, '7.00')])
+        linea_a = compra.detalles.get(producto=a)
+
+        self.assertEqual(inventario.recibir_compra(compra.id, {linea_a.id: 4}), 'parcial')
+        a.refresh_from_db()
+        self.assertEqual((a.cantidad, str(a.precio_compra)), (5, '4.50'))
+
+        #sin cantidades se recibe todo lo que falta
+        self.assertEqual(inventario.recibir_compra(compra.id), 'recibida')
+        a.refresh_from_db()
+        b.refresh_from_db()
+        self.assertEqual((a.cantidad, b.cantidad), (11, 3))
+        self.assertEqual(
+            sorted(MovimientoInventario.objects.filter(compra_asociada=compra).values_list('cantidad', flat=True)),
+            [3, 4, 6])
+        self.assertIsNone(inventario.recibir_compra(compra.id))
+
+    def test_no_recibe_mas_de_lo_pendiente(self):
+        a = crear_producto('A', 0)
+        compra = crear_compra([(a, 2, '1.00')])
+        linea = compra.detalles.get()
+
+        with self.assertRaises(inventario.RecepcionInvalida):
+            inventario.recibir_compra(compra.id, {linea.id: 3})
+
+        a.refresh_from_db()
+        compra.refresh_from_db()
+        self.assertEqual((a.cantidad, compra.estado), (0, 'pendiente'))
+
+    def test_rechaza_recepcion_vacia(self):
+        a = crear_producto('A', 0)
+        compra = crear_compra([(a, 2, '1.00')])
+        linea = compra.detalles.get()
+        for cantidades in ({}, {linea.id: 0}):
+            with self.assertRaises(inventario.RecepcionInvalida):
+                inventario.recibir_compra(compra.id, cantidades)
+
+        usuario = User.objects.create_user('comprador', password='x')
+        usuario.groups.add(Group.objects.get_or_create(name='comprador')[0])
+        self.client.force_login(usuario)
+        respuesta = self.client.post(reverse('finalizar_compra', args=[compra.id]), {f'recibir_{linea.id}': ''}, follow=True)
+        self.assertContains(respuesta, 'Indique al menos una cantidad a recibir.')
+        compra.refresh_from_db()
+        self.assertEqual((compra.estado, MovimientoInventario.objects.filter(compra_asociada=compra).count()), ('pendiente', 0))
+
+    def test_consultas_constantes(self):
+        def contar(num_lineas):
+            productos = [crear_producto(f'C{num_lineas}-{i}', 0) for i in range(num_lineas)]
+            compra = crear_compra([(producto, 5, '2.00') for producto in productos])
+            with CaptureQueriesContext(connection) as consultas:
+                inventario.recibir_compra(compra.id)
+            return len(consultas)
+
+        contar(1)
+        self.assertEqual(contar(2), contar(40))
+
+
+class PedidosApiTests(TestCase):
+
+    def setUp(self):
+        self.usuario = User.objects.create_user('vendedor', password='x')
+        self.usuario.groups.add(Group.objects.get_or_create(name='vendedor')[0])
+        self.api = APIClient()
+        self.api.force_authenticate(self.usuario)
+        self.producto = crear_producto('A', 5, precio='2.50')
+        self.cliente = crear_venta([]).cliente
+
+    def pedido(self, cantidad, finalizar=True):
+        return {'cliente': self.cliente.id, 'finalizar': finalizar,
+                'lineas': [{'producto': self.producto.id, 'cantidad': cantidad}]}
+
+    def test_lote_se_registra_completo_o_nada(self):
+        respuesta = self.api.post('/api/pedidos/', {'pedidos': [self.pedido(2), self.pedido(3)]}, format='json')
+        self.assertEqual(respuesta.status_code, 201)
+        self.assertEqual([p['total'] for p in respuesta.data['pedidos']], ['5.00', '7.50'])
+        self.producto.refresh_from_db()
+        self.assertEqual(self.producto.cantidad, 0)
+
+        ventas = Venta.objects.count()
+        respuesta = self.api.post('/api/pedidos/', {'pedidos': [self.pedido(1, finalizar=False), self.pedido(1)]},
+                                  format='json')
+        self.assertEqual(respuesta.status_code, 400)
+        self.assertEqual(Venta.objects.count(), ventas)
+
+    def test_clave_de_idempotencia(self):
+        primera = self.api.post('/api/pedidos/', self.pedido(2), format='json', HTTP_IDEMPOTENCY_KEY='abc')
+        segunda = self.api.post('/api/pedidos/', self.pedido(2), format='json', HTTP_IDEMPOTENCY_KEY='abc')
+        self.assertEqual(primera.data, segunda.data)
+        self.assertEqual(segunda['Idempotent-Replayed'], 'true')
+        self.producto.refresh_from_db()
+        self.assertEqual(self.producto.cantidad, 3)
+
+        otra = self.api.post('/api/pedidos/', self.pedido(1), format='json', HTTP_IDEMPOTENCY_KEY='abc')
+        self.assertEqual(otra.status_code, 422)
+
+
+class ApiConsultasTests(TestCase):
+    RUTAS = ['/api/ventas/', '/api/compras/', '/api/productos/', '/api/movimientos/',
+             '/api/clientes/', '/api/proveedores/', '/api/categorias/']
+
+    def setUp(self):
+        cache.clear()
+        self.api = APIClient()
+        self.api.force_authenticate(User.objects.create_user('lector', password='x'))
+
+    def crear_datos(self, cantidad):
+        inicio = Producto.objects.count()
+        productos = [crear_producto(f'N{inicio + i}', 100) for i in range(cantidad)]
+        for i in range(cantidad):
+            venta = crear_venta([(p, 1) for p in productos[i:i + 3]])
+            inventario.finalizar_venta(venta.id)
+            crear_compra([(p, 2, '1.00') for p in productos[i:i + 3]])
+
+    def contar_consultas(self):
+        #se mide la consulta real, no el cache del catalogo
+        cache.clear()
+        conteos = {}
+        for ruta in self.RUTAS:
+            with CaptureQueriesContext(connection) as consultas:
+                respuesta = self.api.get(ruta)
+            self.assertEqual(respuesta.status_code, 200)
+            conteos[ruta] = len(consultas)
+        return conteos
+
+    def test_consultas_constantes(self):
+        self.crear_datos(2)
+        pocos = self.contar_consultas()
+        self.crear_datos(20)
+        self.assertEqual(pocos, self.contar_consultas())
+
+    def test_paginacion_por_cursor(self):
+        self.crear_datos(5)
+        respuesta = self.api.get('/api/ventas/', {'por_pagina': 2})
+        self.assertEqual(len(respuesta.data['results']), 2)
+        siguiente = self.api.get(respuesta.data['next'])
+        self.assertEqual(len(siguiente.data['results']), 2)
+        ids = [v['id'] for v in respuesta.data['results'] + siguiente.data['results']]
+        self.assertEqual(ids, sorted(ids, reverse=True))
+
+
+    def test_lista_rapida_igual_al_serializer(self):
+        self.crear_datos(4)
+        for ruta, viewset in (('/api/ventas/', VentaViewSet), ('/api/productos/', ProductoViewSet)):
+            datos = self.api.get(ruta).json()['results']
+            objetos = viewset.queryset.in_bulk([dato['id'] for dato in datos])
+            esperado = viewset.serializer_class([objetos[dato['id']] for dato in datos], many=True).data
+            self.assertEqual(datos, json.loads(JSONRenderer().render(esperado)))
+
+    def test_fields_y_expand(self):
+        self.crear_datos(2)
+        datos = self.api.get('/api/ventas/', {'fields': 'numero_pedido,total'}).json()['results']
+        self.assertEqual(set(datos[0]), {'numero_pedido', 'total'})
+        datos = self.api.get('/api/ventas/', {'fields': 'total', 'expand': 'detalles'}).json()['results']
+        self.assertEqual(set(datos[0]), {'total', 'detalles'})
+        self.assertTrue(datos[0]['detalles'])
+
+
+    def test_filtros(self):
+        self.crear_datos(3)
+        pendiente = crear_venta([])
+        hoy = pendiente.fecha.date().isoformat()
+
+        datos = self.api.get('/api/ventas/', {'estado': 'pendiente', 'end_date': hoy}).json()['results']
+        self.assertEqual([venta['id'] for venta in datos], [pendiente.id])
+        producto = Producto.objects.order_by('id').first()
+        datos = self.api.get('/api/movimientos/', {'producto': producto.id, 'tipo': 'salida'}).json()['results']
+        self.assertTrue(datos)
+        self.assertTrue(all(mov['producto'] == producto.id for mov in datos))
+        self.assertEqual(self.api.get('/api/ventas/', {'estado': 'otro'}).status_code, 400)
+
+
+    def test_get_condicional(self):
+        self.crear_datos(2)
+        primera = self.api.get('/api/productos/')
+        with CaptureQueriesContext(connection) as consultas:
+            repetida = self.api.get('/api/productos/', HTTP_IF_NONE_MATCH=primera['ETag'])
+        self.assertEqual(repetida.status_code, 304)
+        self.assertEqual(len(consultas), 1) #solo la de versiones
+
+        #los caminos masivos tambien cambian la version
+        venta = crear_venta([(Producto.objects.first(), 1)])
+        inventario.finalizar_venta(venta.id)
+        cambiada = self.api.get('/api/productos/', HTTP_IF_NONE_MATCH=primera['ETag'])
+        self.assertEqual(cambiada.status_code, 200)
+        self.assertNotEqual(cambiada['ETag'], primera['ETag'])
+
+    def test_cache_catalogo(self):
+        self.crear_datos(2)
+        primera = self.api.get('/api/productos/', {'fields': 'nombre,cantidad'}).json()
+        with CaptureQueriesContext(connection) as consultas:
+            repetida = self.api.get('/api/productos/', {'fields': 'nombre,cantidad'}).json()
+        self.assertEqual(repetida, primera)
+        self.assertEqual(len(consultas), 1) #solo la de versiones
+
+        #otros parametros son otra entrada del cache
+        self.assertEqual(set(self.api.get('/api/productos/', {'fields': 'nombre'}).json()['results'][0]), {'nombre'})
+
+        #un camino masivo (UPDATE sin señales) tambien invalida
+        producto = Producto.objects.order_by('nombre', 'id').first()
+        venta = crear_venta([(producto, 1)])
+        inventario.finalizar_venta(venta.id)
+        cambiada = self.api.get('/api/productos/', {'fields': 'nombre,cantidad'}).json()
+        self.assertEqual(cambiada['results'][0]['cantidad'], primera['results'][0]['cantidad'] - 1)
+
+        #el select de categorias del filtro tambien sale del cache
+        Categoria.objects.create(nombre='Nueva')
+        self.assertIn('Nueva', dict(InventarioFilter().form.fields['categoria'].choices).values())
+
+
+class BusquedaTests(TestCase):
+    def setUp(self):
+        self.api = APIClient()
+        self.api.force_authenticate(User.objects.create_user('lector', password='x'))
+
+    def test_buscar_ordena_y_tolera_errores(self):
+        for nombre in ('Martillo de goma', 'Martillo carpintero', 'Portatornillos', 'Tornillo'):
+            crear_producto(nombre, 1)
+        datos = self.api.get('/api/buscar/', {'q': 'martillo', 'tipo': 'productos'}).json()['productos']
+        self.assertEqual({p['nombre'] for p in datos}, {'Martillo de goma', 'Martillo carpintero'})
+        #"tornillo" empieza la palabra en Tornillo y esta en medio de Portatornillos
+        datos = self.api.get('/api/buscar/', {'q': 'tornillo'}).json()['productos']
+        self.assertEqual([p['nombre'] for p in datos][:2], ['Tornillo', 'Portatornillos'])
+        #aproximada, con un error de tipeo
+        datos = self.api.get('/api/buscar/', {'q': 'martilo'}).json()['productos']
+        self.assertTrue(datos and all(p['nombre'].startswith('Martillo') for p in datos))
+        self.assertEqual(self.api.get('/api/buscar/', {'tipo': 'otro'}).status_code, 400)
+
+    def test_indice_se_actualiza_y_filtra(self):
+        cliente = Cliente.objects.create(nombre='José Pérez', direccion='x', telefono='1', correo='jp@x.com')
+        venta = Venta.objects.create(numero_pedido='PED-1', cliente=cliente)
+        #sin tildes y sin distinguir mayusculas, igual que icontains
+        self.assertEqual(list(VentaFilter({'cliente': 'jose PER'}).qs), [venta])
+        cliente.nombre = 'Ana'
+        cliente.save()
+        self.assertEqual(list(VentaFilter({'cliente': 'perez'}).qs), [])
+        self.assertEqual(list(VentaFilter({'cliente': 'an'}).qs), [venta])
+        cliente.delete()
+        self.assertEqual(busqueda.buscar('clientes', 'ana'), [])
+
+    def test_escrituras_masivas_suben_la_version(self):
+        def version(tipo):
+            etiqueta = busqueda.INDICES[tipo].etiqueta
+            return versiones(etiqueta)[etiqueta]
+
+        producto = crear_producto('Martillo', 1)
+        antes = version('productos')
+        Producto.objects.filter(pk=producto.pk).update(cantidad=5)
+        self.assertEqual(version('productos'), antes)
+        Producto.objects.filter(pk=producto.pk).update(codigo='S-1', nombre='Serrucho')
+        self.assertEqual(version('productos'), antes + 1)
+        self.assertEqual(busqueda.buscar('productos', 'martillo'), [])
+        self.assertEqual([pk for pk, _ in busqueda.buscar('productos', 'serrucho')], [producto.pk])
+
+        antes = version('clientes')
+        Cliente.objects.bulk_create([Cliente(nombre='Ana', direccion='x', telefono='1', correo='a@x.com')])
+        self.assertEqual(version('clientes'), antes + 1)
+
+        proveedor = Proveedor.objects.get()
+        antes = version('proveedores')
+        proveedor.telefono = '2'
+        Proveedor.objects.bulk_update([proveedor], ['telefono'])
+        self.assertEqual(version('proveedores'), antes)
+        proveedor.empresa = 'Ferretería'
+        Proveedor.objects.bulk_update([proveedor], ['empresa'])
+        self.assertEqual(version('proveedores'), antes + 1)
+        self.assertEqual(len(busqueda.buscar('proveedores', 'ferreteria')), 1)
+
+
+class BusquedaSegundoPlanoTests(TransactionTestCase):
+    def setUp(self):
+        self.indice = busqueda.INDICES['productos']
+        self.indice.descartar()
+        self.addCleanup(self.indice.descartar)
+
+    def test_sigue_usando_el_indice_anterior_mientras_arma_el_nuevo(self):
+        producto = crear_producto('Martillo', 1)
+        #la primera vez no hay otro indice que usar: se arma en la busqueda
+        self.assertEqual([pk for pk, _ in busqueda.buscar('productos', 'martillo')], [producto.pk])
+        self.assertIsNone(self.indice.hilo)
+
+        Producto.objects.filter(pk=producto.pk).update(codigo='S-1', nombre='Serrucho')
+        liberar = threading.Event()
+        armar = busqueda.Indice._armar
+
+        def armar_lento(indice, version):
+            liberar.wait(5)
+            armar(indice, version)
+
+        with mock.patch.object(busqueda.Indice, '_armar', armar_lento):
+            #mientras se arma el nuevo se responde con el anterior, sin esperar
+            self.assertEqual([pk for pk, _ in busqueda.buscar('productos', 'martillo')], [producto.pk])
+            self.assertTrue(self.indice.hilo.is_alive())
+            hilo = self.indice.hilo
+            busqueda.buscar('productos', 'martillo')
+            self.assertIs(self.indice.hilo, hilo)
+            liberar.set()
+            hilo.join(5)
+
+        self.assertEqual(busqueda.buscar('productos', 'martillo'), [])
+        self.assertEqual([pk for pk, _ in busqueda.buscar('productos', 'serrucho')], [producto.pk])
+
+
+class TokenAccesoTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.usuario = User.objects.create_user('movil', password='clave-1')
+
+    def login(self):
+        return APIClient().post('/api/login/', {'username': 'movil', 'password': 'clave-1'}).data['token']
+
+    def get(self, token):
+        api = APIClient()
+        api.credentials(HTTP_AUTHORIZATION=f'Token {token}')
+        return api.get('/api/categorias/')
+
+    def test_varios_dispositivos_y_cache(self):
+        primero, segundo = self.login(), self.login()
+        self.assertEqual(self.get(primero).status_code, 200)
+        self.assertEqual(self.get(segundo).status_code, 200)
+        #solo se guarda el hash
+        self.assertFalse(TokenAcceso.objects.filter(clave_hash=primero).exists())
+
+        with CaptureQueriesContext(connection) as consultas:
+            self.assertEqual(self.get(primero).status_code, 200)
+        self.assertFalse([c for c in consultas if 'tokenacceso' in c['sql'] or 'auth_user' in c['sql']])
+
+    def test_cache_por_proceso_dura_poco(self):
+        token = self.login()
+        with mock.patch.object(cache, 'set', wraps=cache.set) as guardar:
+            self.get(token)
+        segundos = [c.args[2] for c in guardar.call_args_list if c.args[0].startswith(autenticacion.PREFIJO_CACHE_TOKENS)]
+        self.assertEqual(segundos, [5])
+
+        compartido = {'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}}
+        with override_settings(CACHES=compartido):
+            self.assertEqual(autenticacion.tiempo_cache_tokens(), 300)
+
+    def test_logout_y_cambio_de_clave(self):
+        primero, segundo = self.login(), self.login()
+        self.get(primero), self.get(segundo)
+
+        api = APIClient()
+        api.credentials(HTTP_AUTHORIZATION=f'Bearer {primero}')
+        self.assertEqual(api.post('/api/logout/').status_code, 204)
+        self.assertEqual(self.get(primero).status_code, 401)
+        self.assertEqual(self.get(segundo).status_code, 200)
+
+        self.usuario.is_active = False
+        self.usuario.save()
+        self.assertEqual(self.get(segundo).status_code, 401)
+
+    def test_vencido(self):
+        token = self.login()
+        TokenAcceso.objects.update(expira=timezone.now())
+        self.assertEqual(self.get(token).status_code, 401)
+
+
+class GruposCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.usuario = User.objects.create_user('ana', password='x')
+        self.vendedor = Group.objects.create(name='vendedor')
+        self.comprador = Group.objects.create(name='comprador')
+        self.usuario.groups.add(self.vendedor)
+        self.clave = f'{PREFIJO_CACHE_GRUPOS}{self.usuario.pk}'
+
+    def grupos(self):
+        #un objeto nuevo por llamada, como en cada request
+        return grupos_usuario(User.objects.get(pk=self.usuario.pk))
+
+    def assertInvalida(self, cambio, esperados):
+        self.grupos()
+        self.assertIsNotNone(cache.get(self.clave))
+        with self.captureOnCommitCallbacks(execute=True):
+            cambio()
+        self.assertIsNone(cache.get(self.clave))
+        self.assertEqual(self.grupos(), esperados)
+
+    def test_segunda_lectura_sale_del_cache(self):
+        self.assertEqual(self.grupos(), ('vendedor',))
+        usuario = User.objects.get(pk=self.usuario.pk)
+        with CaptureQueriesContext(connection) as consultas:
+            self.assertEqual(grupos_usuario(usuario), ('vendedor',))
+            self.assertEqual(grupos_usuario(usuario), ('vendedor',))
+        self.assertEqual(len(consultas), 0)
+
+    def test_cambios_desde_el_usuario(self):
+        self.assertInvalida(lambda: self.usuario.groups.add(self.comprador), ('vendedor', 'comprador'))
+        self.assertInvalida(lambda: self.usuario.groups.remove(self.vendedor), ('comprador',))
+        self.assertInvalida(lambda: self.usuario.groups.clear(), ())
+
+    def test_cambios_desde_el_grupo(self):
+        self.assertInvalida(lambda: self.comprador.user_set.add(self.usuario), ('vendedor', 'comprador'))
+        self.assertInvalida(lambda: self.vendedor.user_set.remove(self.usuario), ('comprador',))
+        self.assertInvalida(lambda: self.comprador.user_set.clear(), ())
+
+    def test_renombrar_y_eliminar_grupo(self):
+        def renombrar():
+            self.vendedor.name = 'ventas'
+            self.vendedor.save()
+
+        self.assertInvalida(renombrar, ('ventas',))
+        self.assertInvalida(self.vendedor.delete, ())
+
+
+class ResumenesTests(TestCase):
+    def contenido(self):
+        return (
+            sorted(ResumenVentasMes.objects.exclude(num_ventas=0).values_list('mes', 'total', 'num_ventas')),
+            sorted(ResumenProductoMes.objects.exclude(cantidad=0).values_list('mes', 'producto_id', 'cantidad')),
+        )
+
+    def setUp(self):
+        a, b = crear_producto('A', 100), crear_producto('B', 100)
+        hace_dos_meses = timezone.now() - timedelta(days=62)
+        for items, fecha in (([(a, 2), (b, 1)], hace_dos_meses), ([(a, 3)], hace_dos_meses), ([(b, 4)], None),
+                             ([(a, 1), (b, 1)], None)):
+            venta = crear_venta(items)
+            cambios = {'total': sum(Decimal(producto.precio_venta) * cantidad for producto, cantidad in items)}
+            if fecha:
+                cambios['fecha'] = fecha
+            Venta.objects.filter(pk=venta.pk).update(**cambios)
+            inventario.finalizar_venta(venta.pk)
+        #una pendiente y una completada que se revierte no cuentan
+        crear_venta([(a, 7)])
+        revertida = Venta.objects.filter(estado='completado').order_by('id').last()
+        resumenes.revertir_venta(revertida)
+        Venta.objects.filter(pk=revertida.pk).update(estado='cancelado')
+
+    def test_incremental_igual_a_reconstruir(self):
+        incremental = self.contenido()
+        self.assertEqual(len(incremental[0]), 2)
+        self.assertEqual(sum(num for _, _, num in incremental[0]), 3)
+
+        resumenes.reconstruir()
+        self.assertEqual(self.contenido(), incremental)
+
+    def test_migracion_llena_los_resumenes(self):
+        esperado = self.contenido()
+        ResumenVentasMes.objects.all().delete()
+        ResumenProductoMes.objects.all().delete()
+
+        migracion = importlib.import_module('gestion.migrations.0005_resumenes_mensuales')
+        migracion.poblar_resumenes(django_apps, None)
+        self.assertEqual(self.contenido(), esperado)
+
+    def test_borrar_cliente_resta_sus_ventas(self):
+        otro = Cliente.objects.create(nombre='Otro', telefono='87654321', correo='o@example.com', direccion='Zona 2')
+        venta = crear_venta([(Producto.objects.get(codigo='A'), 5)])
+        Venta.objects.filter(pk=venta.pk).update(cliente=otro, total=Decimal('50.00'))
+        inventario.finalizar_venta(venta.pk)
+
+        #en cascada se borran sus ventas completadas, la pendiente y la cancelada
+        Cliente.objects.get(nombre='Cliente').delete()
+        incremental = self.contenido()
+        self.assertEqual([(total, num) for _, total, num in incremental[0]], [(Decimal('50.00'), 1)])
+
+        resumenes.reconstruir()
+        self.assertEqual(self.contenido(), incremental)
+
+    def test_admin_no_cambia_ventas_completadas(self):
+        venta = Venta.objects.filter(estado='completado').first()
+        request = RequestFactory().get('/')
+        request.user = User.objects.create_superuser('admin', 'a@example.com', 'x')
+        self.assertTrue({'estado', 'total'} <= set(admin.site._registry[Venta].get_readonly_fields(request, venta)))
+        inline = DetalleVentaInline(Venta, admin.site)
+        self.assertFalse(inline.has_change_permission(request, venta))
+        self.assertFalse(inline.has_delete_permission(request, venta))
+
+
+class AutocompletarProductosTests(TestCase):
+    def setUp(self):
+        usuario = User.objects.create_user('vendedor', password='x')
+        usuario.groups.add(Group.objects.get_or_create(name='vendedor')[0],
+                           Group.objects.get_or_create(name='comprador')[0])
+        self.client.force_login(usuario)
+
+    def test_detalle_no_lista_el_catalogo(self):
+        producto = crear_producto('Elegido', 5)
+        venta = crear_venta([(producto, 1)])
+        compra = crear_compra([(producto, 1, '1.00')])
+
+        def contar():
+            conteos = []
+            for url in (f'/ventas/detalle/{venta.id}/', f'/compras/detalle/{compra.id}/'):
+                with CaptureQueriesContext(connection) as consultas:
+                    respuesta = self.client.get(url)
+                self.assertEqual(respuesta.status_code, 200)
+                conteos.append(len(consultas))
+            return conteos, respuesta
+
+        contar() #la primera vez se cargan los grupos del usuario
+        pocos, _ = contar()
+        for i in range(30):
+            crear_producto(f'Otro {i}', 1)
+        muchos, respuesta = contar()
+        self.assertEqual(pocos, muchos)
+        self.assertNotContains(respuesta, 'Otro 1')
+
+        #el producto elegido sigue apareciendo cuando el formulario vuelve con errores
+        respuesta = self.client.post(f'/ventas/detalle/{venta.id}/', {'producto': producto.id, 'cantidad': ''})
+        self.assertContains(respuesta, f'value="{producto.id}" selected')
+
+    def test_autocompletar_por_paginas_y_proveedor(self):
+        for i in range(5):
+            crear_producto(f'Clavo {i}', 1)
+        otro = Proveedor.objects.create(empresa='Otro', contacto='x', telefono='1', direccion='x')
+        Producto.objects.filter(nombre='Clavo 4').update(proveedor=otro)
+
+        datos = self.client.get('/productos/autocompletar/', {'q': 'clavo', 'por_pagina': 2}).json()
+        self.assertEqual([p['texto'] for p in datos['resultados']], ['Clavo 0 - Clavo 0', 'Clavo 1 - Clavo 1'])
+        datos = self.client.get('/productos/autocompletar/', {'q': 'clavo', 'por_pagina': 2,
+                                                             'despues': datos['siguiente']}).json()
+        self.assertEqual([p['texto'] for p in datos['resultados']], ['Clavo 2 - Clavo 2', 'Clavo 3 - Clavo 3'])
+
+        datos = self.client.get('/productos/autocompletar/', {'proveedor': otro.id}).json()
+        self.assertEqual([p['texto'] for p in datos['resultados']], ['Clavo 4 - Clavo 4'])
+        self.assertIsNone(datos['siguiente'])
+
+    def test_precios_en_lote(self):
+        productos = [crear_producto(f'P{i}', i, precio=f'{i}.50') for i in range(3)]
+        with CaptureQueriesContext(connection) as consultas:
+            respuesta = self.client.get('/api/productos/precios/', {'ids': f'{productos[1].id},{productos[2].id}'})
+        datos = respuesta.json()
+        self.assertEqual(set(datos['precios']), {str(productos[1].id), str(productos[2].id)})
+        self.assertEqual(datos['precios'][str(productos[2].id)], {'precio_compra': 2.5, 'precio_venta': 2.5, 'stock': 2})
+        self.assertIn('no-cache', respuesta['Cache-Control'])
+        #una sola consulta a productos para todos los ids
+        self.assertEqual(len([c for c in consultas if 'gestion_producto' in c['sql']]), 1)
+
+        proveedor = productos[0].proveedor_id
+        primera = self.client.get('/api/productos/precios/', {'proveedor': proveedor})
+        self.assertEqual(len(primera.json()['precios']), 3)
+        self.assertTrue(primera.json()['completo'])
+        repetida = self.client.get('/api/productos/precios/', {'proveedor': proveedor}, HTTP_IF_NONE_MATCH=primera['ETag'])
+        self.assertEqual(repetida.status_code, 304)
+
+        #un cambio de precio cambia la version
+        productos[0].precio_compra = '9.00'
+        productos[0].save(update_fields=['precio_compra'])
+        nueva = self.client.get('/api/productos/precios/', {'proveedor': proveedor}, HTTP_IF_NONE_MATCH=primera['ETag'])
+        self.assertEqual(nueva.status_code, 200)
+        self.assertNotEqual(nueva.json()['version'], primera.json()['version'])
+        self.assertEqual(self.client.get('/api/productos/precios/', {'ids': '1,x'}).status_code, 400)
+
+
+class PresupuestoConsultasTests(TestCase):
+    """Consultas de cada vista de views.py contra su @presupuesto_consultas."""
+    #objeto de la url cuando no sale del nombre de la ruta (accion_objeto)
+    OBJETO = {
+        'obtener_precio_producto': 'producto',
+        'exportar_reporte': 'tipo',
+        'estado_trabajo_reporte': 'trabajo',
+        'descargar_trabajo_reporte': 'trabajo',
+        'descargar_perfil': 'perfil',
+    }
+
+    def setUp(self):
+        usuario = User.objects.create_user('todos', password='x')
+        usuario.groups.add(*[Group.objects.get_or_create(name=nombre)[0]
+                             for nombre in ('administrador', 'vendedor', 'comprador')])
+        self.client.force_login(usuario)
+        self.producto = crear_producto('Base', 100)
+        self.venta = crear_venta([(self.producto, 1)])
+        self.compra = crear_compra([(self.producto, 2, '1.00')])
+        self.trabajo = TrabajoReporte.objects.create(clave='x', tipo='ventas', formato='csv', estado='completado')
+
+    def crear_datos(self, cantidad):
+        inicio = Producto.objects.count()
+        for i in range(inicio, inicio + cantidad):
+            categoria = Categoria.objects.create(nombre=f'Categoría {i}')
+            proveedor = Proveedor.objects.create(empresa=f'Proveedor {i}', contacto='Ana', telefono='1', direccion='Zona 1')
+            cliente = Cliente.objects.create(nombre=f'Cliente {i}', telefono='1', correo=f'c{i}@example.com',
+                                             direccion='Zona 1')
+            producto = Producto.objects.create(codigo=f'P{i}', nombre=f'Producto {i}', categoria=categoria,
+                                               proveedor=proveedor, cantidad=100, precio_compra='1.00',
+                                               precio_venta='2.00')
+            venta = Venta.objects.create(cliente=cliente, numero_pedido=f'PED-N{i}')
+            DetalleVenta.objects.create(venta=venta, producto=producto, cantidad=1, precio_unitario='2.00')
+            inventario.finalizar_venta(venta.id)
+            compra = Compra.objects.create(proveedor=proveedor, numero_orden=f'ORD-N{i}')
+            DetalleCompra.objects.create(compra=compra, producto=producto, cantidad=2, costo_unitario='1.00')
+            inventario.recibir_compra(compra.id)
+            #tambien crecen las lineas de la venta y la compra que se abren en detalle
+            extra = crear_producto(f'Extra {i}', 100)
+            DetalleVenta.objects.create(venta=self.venta, producto=extra, cantidad=1, precio_unitario='10.00')
+            DetalleCompra.objects.create(compra=self.compra, producto=extra, cantidad=1, costo_unitario='1.00')
+
+    def url(self, patron):
+        if not patron.pattern.converters:
+            return reverse(patron.name)
+        objetos = {
+            'cliente': self.venta.cliente_id,
+            'proveedor': self.compra.proveedor_id,
+            'categoria': self.producto.categoria_id,
+            'producto': self.producto.id,
+            'venta': self.venta.id,
+            'compra': self.compra.id,
+            'detalle_venta': self.venta.detalles.first().id,
+            'detalle_compra': self.compra.detalles.first().id,
+            'trabajo': self.trabajo.id,
+            'tipo': 'ventas',
+            'perfil': '1-inexistente.prof',
+        }
+        objeto = self.OBJETO.get(patron.name, patron.name.split('_', 1)[1])
+        argumento = next(iter(patron.pattern.converters))
+        return reverse(patron.name, kwargs={argumento: objetos[objeto]})
+
+    def contar_consultas(self):
+        conteos = {}
+        for patron in urls.urlpatterns:
+            vista = getattr(patron, 'callback', None)
+            if vista is None or vista.__module__ != views.__name__:
+                continue
+            with self.subTest(vista=patron.name):
+                presupuesto = getattr(vista, 'presupuesto_consultas', None)
+                self.assertIsNotNone(presupuesto, f'{patron.name} no declara @presupuesto_consultas')
+                #el peor caso: sin cache, sin mensajes pendientes y sin guardar lo que la vista cambie
+                cache.clear()
+                self.client.cookies.pop('messages', None)
+                datos = {'proveedor': self.compra.proveedor_id} if patron.name == 'obtener_precios_productos' else {}
+                with transaction.atomic():
+                    with CaptureQueriesContext(connection) as consultas:
+                        respuesta = self.client.get(self.url(patron), datos)
+                    transaction.set_rollback(True)
+                self.assertLess(respuesta.status_code, 500)
+                self.assertLessEqual(len(consultas), presupuesto or 0, patron.name)
+                conteos[patron.name] = len(consultas)
+        return conteos
+
+    def test_consultas_dentro_del_presupuesto_y_constantes(self):
+        #con una fila de cada cosa ya existen las versiones y los resumenes del mes
+        self.crear_datos(1)
+        pocos = self.contar_consultas()
+        self.crear_datos(10)
+        self.assertEqual(pocos, self.contar_consultas())
+
+
+class MetricasTests(TestCase):
+    def setUp(self):
+        usuario = User.objects.create_user('lector', password='x')
+        usuario.groups.add(Group.objects.get_or_create(name='administrador')[0])
+        self.client.force_login(usuario)
+
+    def metricas(self, **extra):
+        return self.client.get('/metrics', **extra)
+
+    @override_settings(METRICAS_TOKEN='secreto')
+    def test_por_ruta_y_protegido(self):
+        self.client.get('/clientes/')
+        self.client.get('/clientes/')
+        self.assertEqual(self.metricas().status_code, 403)
+        self.assertEqual(self.metricas(HTTP_AUTHORIZATION='Bearer otro').status_code, 403)
+
+        respuesta = self.metricas(HTTP_AUTHORIZATION='Bearer secreto')
+        self.assertEqual(respuesta.status_code, 200)
+        texto = respuesta.content.decode()
+        self.assertIn('# TYPE gestion_peticion_segundos histogram', texto)
+        self.assertRegex(texto, r'gestion_peticiones_total\{vista="lista_clientes",metodo="GET",codigo="200"\} [2-9]')
+        self.assertRegex(texto, r'gestion_peticion_consultas_bucket\{vista="lista_clientes",metodo="GET",le="\+Inf"\} ')
+        self.assertIn('gestion_respuesta_bytes_count{vista="lista_clientes",metodo="GET"}', texto)
+
+    def test_suma_los_procesos(self):
+        with tempfile.TemporaryDirectory() as directorio, override_settings(METRICAS_DIR=directorio):
+            #copia de otro worker con 5 requests a la misma vista
+            with open(os.path.join(directorio, 'otro.json'), 'w') as archivo:
+                json.dump([['gestion_peticiones_total', [['vista', 'lista_clientes'], ['metodo', 'GET'], ['codigo', '200']], 5]],
+                          archivo)
+            antes = metricas.juntar([metricas.REGISTRO.copia()])
+            clave = ('gestion_peticiones_total', (('vista', 'lista_clientes'), ('metodo', 'GET'), ('codigo', '200')))
+            self.client.get('/clientes/')
+            User.objects.filter(username='lector').update(is_staff=True)
+            texto = self.metricas().content.decode()
+            self.assertIn(f'gestion_peticiones_total{{vista="lista_clientes",metodo="GET",codigo="200"}} '
+                          f'{antes.get(clave, 0) + 6}', texto)
+            self.assertTrue(os.path.exists(os.path.join(directorio, metricas.REGISTRO.archivo)))
+
+    @override_settings(METRICAS_SERVER_TIMING=True)
+    def test_server_timing(self):
+        respuesta = self.client.get('/clientes/')
+        self.assertRegex(respuesta['Server-Timing'], r'^db;dur=[\d.]+;desc="\d+ consultas", total;dur=[\d.]+$')
+
+
+class PerfiladoTests(TestCase):
+    def setUp(self):
+        usuario = User.objects.create_user('admin', password='x')
+        usuario.groups.add(Group.objects.get_or_create(name='administrador')[0])
+        self.client.force_login(usuario)
+        self.directorio = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directorio)
+
+    def activo(self, **extra):
+        return override_settings(PERFILADO_ACTIVO=True, PERFILADO_DIR=self.directorio, **extra)
+
+    def test_desactivado_no_perfila(self):
+        with override_settings(PERFILADO_DIR=self.directorio, PERFILADO_MUESTRA=1.0):
+            self.client.get('/clientes/')
+        self.assertEqual(os.listdir(self.directorio), [])
+
+    def test_muestra_y_anillo(self):
+        with self.activo(PERFILADO_MUESTRA=1.0, PERFILADO_MAXIMO=2):
+            for _ in range(3):
+                self.client.get('/clientes/')
+            perfiles = perfilado.listar()
+        self.assertEqual(len(perfiles), 2)
+        self.assertEqual(len(os.listdir(self.directorio)), 4)
+        perfil = perfiles[0]
+        self.assertEqual((perfil['vista'], perfil['estado'], perfil['motivo']), ('lista_clientes', 200, 'muestra'))
+        self.assertTrue(any('gestion_cliente' in consulta['sql'] for consulta in perfil['consultas']))
+        with self.activo():
+            estadisticas = pstats.Stats(perfilado.ruta(perfil['nombre'], '.prof'))
+        self.assertTrue(any(funcion[2] == 'lista_clientes' for funcion in estadisticas.stats))
+
+    def test_umbral_y_vistas(self):
+        with self.activo(PERFILADO_MUESTRA=0.0, PERFILADO_UMBRAL_MS=0, PERFILADO_VISTAS=['dashboard']):
+            self.client.get('/clientes/')
+            self.client.get('/dashboard/')
+            perfiles = perfilado.listar()
+        self.assertEqual([(p['vista'], p['motivo']) for p in perfiles], [('dashboard', 'lento')])
+
+    def test_pagina_y_comando(self):
+        with self.activo(PERFILADO_MUESTRA=1.0):
+            self.client.get('/clientes/')
+            nombre = perfilado.listar()[0]['nombre']
+            self.assertContains(self.client.get('/perfiles/'), nombre)
+            descarga = self.client.get(f'/perfiles/{nombre}.json/')
+            self.assertEqual(json.loads(b''.join(descarga.streaming_content))['vista'], 'lista_clientes')
+            self.assertEqual(self.client.get('/perfiles/..%2Fsettings.json/').status_code, 404)
+
+            salida = io.StringIO()
+            call_command('perfiles', stdout=salida)
+            self.assertIn(nombre, salida.getvalue())
+            call_command('perfiles', ver=nombre, stdout=salida)
+            self.assertIn('lista_clientes', salida.getvalue())
+
+            #dentro del override: el middleware ya cargado en este cliente sigue perfilando
+            vendedor = User.objects.create_user('vendedor', password='x')
+            self.client.force_login(vendedor)
+            self.assertEqual(self.client.get('/perfiles/').status_code, 302)
+
+
+class VistasAsyncTests(TestCase):
+    def setUp(self):
+        self.usuario = User.objects.create_user('lector', password='x')
+        self.usuario.groups.add(Group.objects.get_or_create(name='administrador')[0])
+        self.async_client.force_login(self.usuario)
+        self.producto = crear_producto('P1', 5)
+
+    async def test_lectura_por_asgi(self):
+        for ruta in ['/reportes/inventario/', '/reportes/movimientos/', '/reportes/ventas/', '/dashboard/']:
+            with self.subTest(ruta=ruta):
+                #la primera respuesta fija la cookie CSRF, que es parte del ETag
+                await self.async_client.get(ruta)
+                respuesta = await self.async_client.get(ruta)
+                self.assertEqual(respuesta.status_code, 200)
+                if respuesta.has_header('ETag'):
+                    repetida = await self.async_client.get(ruta, headers={'If-None-Match': respuesta['ETag']})
+                    self.assertEqual(repetida.status_code, 304)
+
+        respuesta = await self.async_client.get(f'/api/producto/{self.producto.id}/precio/')
+        self.assertEqual(json.loads(respuesta.content)['precio_compra'], 10.0)
+
+    async def test_csv_en_streaming_por_asgi(self):
+        await sync_to_async(crear_producto)('P2', 3)
+        for ruta in ['/reportes/inventario/', '/reportes/ventas/', '/reportes/compras/']:
+            with self.subTest(ruta=ruta):
+                respuesta = await self.async_client.get(ruta, {'export': 'csv'})
+                self.assertEqual(respuesta.status_code, 200)
+                #un iterador sincronico haria que el handler ASGI lo lea entero (y avise con un Warning)
+                self.assertTrue(respuesta.is_async)
+                with warnings.catch_warnings():
+                    warnings.simplefilter('error')
+                    [parte async for parte in respuesta]
+                self.assertIsInstance(respuesta.asgi_request, ASGIRequest)
+
+        respuesta = await self.async_client.get('/reportes/inventario/', {'export': 'csv'})
+        partes = [parte async for parte in respuesta]
+        #encabezado y una parte por fila, enviadas a medida que se leen
+        self.assertEqual(len(partes), 3)
+        self.assertIn('P2', b''.join(partes).decode())
+
+    def test_lectura_por_wsgi(self):
+        #las vistas async tambien funcionan bajo WSGI (Django las corre con async_to_sync)
+        self.client.force_login(self.usuario)
+        respuesta = self.client.get('/reportes/inventario/', {'export': 'csv'})
+        self.assertIn('P1', b''.join(respuesta.streaming_content).decode())
+        self.assertEqual(self.client.get('/dashboard/').status_code, 200)
+
+    async def test_restriccion_por_grupo(self):
+        @solo_administrador
+        async def vista(request):
+            return HttpResponse('ok')
+
+        self.assertTrue(iscoroutinefunction(vista))
+        vendedor = await User.objects.acreate(username='vendedor')
+        for usuario, estado in [(self.usuario, 200), (vendedor, 302)]:
+            request = AsyncRequestFactory().get('/')
+            request.user = usuario
+
+            async def auser(usuario=usuario):
+                return usuario
+
+            request.auser = auser
+            request._messages = CookieStorage(request)
+            self.assertEqual((await vista(request)).status_code, estado)
+
+    def test_estaticos_async(self):
+        async def siguiente(request):
+            return HttpResponse('vista')
+
+        middleware = WhiteNoiseAsyncMiddleware(siguiente)
+        self.assertTrue(iscoroutinefunction(middleware))
+        self.assertFalse(iscoroutinefunction(WhiteNoiseAsyncMiddleware(lambda request: None)))
+
+
+class ArranqueTests(TestCase):
+    def test_arranque_sin_modulos_diferidos_y_en_presupuesto(self):
+        medicion = arranque.medir()
+        self.assertEqual(medicion['diferidos'], [])
+        self.assertLessEqual(medicion['arranque_ms'], settings.ARRANQUE_PRESUPUESTO_MS)
+        self.assertGreaterEqual(medicion['primer_request_ms'], medicion['arranque_ms'])
+        self.assertIn('django', medicion['paquetes_ms'])
+
+    def test_exportar_importa_al_usarse(self):
+        usuario = User.objects.create_user('lector', password='x')
+        self.client.force_login(usuario)
+        crear_producto('P1', 5)
+        respuesta = self.client.get('/reportes/inventario/', {'export': 'pdf'})
+        self.assertEqual(respuesta['Content-Type'], 'application/pdf')
+
+
+class FinalizarVentaConcurrenciaTests(TransactionTestCase):
+    HILOS = 8
+
+    def _finalizar(self, venta_id, resultados):
+        close_old_connections()
+        try:
+            for _ in range(200):
+                try:
+                    resultados.append(inventario.finalizar_venta(venta_id))
+                    return
+                except inventario.StockInsuficiente:
+                    resultados.append(False)
+                    return
+                except OperationalError:
+                    #SQLite no espera los bloqueos entre hilos: se reintenta
+                    time.sleep(0.01)
+        finally:
+            connection.close()
+
+    def test_no_vende_de_mas(self):
+        producto = crear_producto('A', 5)
+        ventas = [crear_venta([(producto, 1)], numero=f'PED-{i:05d}') for i in range(self.HILOS)]
+        resultados = []
+
+        hilos = [threading.Thread(target=self._finalizar, args=(venta.id, resultados)) for venta in ventas]
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+
+        producto.refresh_from_db()
+        self.assertEqual(len(resultados), self.HILOS)
+        self.assertEqual(resultados.count(True), 5)
+        self.assertEqual(producto.cantidad, 0)
+        self.assertEqual(Venta.objects.filter(estado='completado').count(), 5)
+        self.assertEqual(MovimientoInventario.objects.filter(producto=producto).count(), 5)
+
+
+class LineasConcurrenciaTests(TransactionTestCase):
+    HILOS = 8
+
+    def _agregar(self, venta_id, producto, resultados):
+        close_old_connections()
+        try:
+            for _ in range(200):
+                try:
+                    resultados.append(lineas.agregar_linea_venta(venta_id, producto, 1))
+                    return
+                except OperationalError:
+                    #SQLite no espera los bloqueos entre hilos: se reintenta
+                    time.sleep(0.01)
+        finally:
+            connection.close()
+
+    def test_agregados_simultaneos_quedan_en_una_linea(self):
+        producto = crear_producto('A', 100, precio='10.00')
+        venta = crear_venta([])
+        resultados = []
+
+        hilos = [threading.Thread(target=self._agregar, args=(venta.id, producto, resultados))
+                 for _ in range(self.HILOS)]
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+
+        venta.refresh_from_db()
+        self.assertEqual(len(resultados), self.HILOS)
+        self.assertEqual(resultados.count(True), 1)
+        self.assertEqual(list(venta.detalles.values_list('cantidad', flat=True)), [self.HILOS])
+        self.assertEqual(venta.total, Decimal('10.00') * self.HILOS)
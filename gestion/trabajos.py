@@ -0,0 +1,201 @@
+"""
+Exportación de reportes en segundo plano.
+
+Las vistas solo registran un TrabajoReporte y devuelven su id; el comando
+`manage.py procesar_reportes` toma los trabajos pendientes, genera el archivo
+en disco y va actualizando el progreso.
+
+Cada trabajo tiene una clave formada por el tipo de reporte, el formato, los
+filtros normalizados y la versión de los datos de los modelos que usa el
+reporte. Dos pedidos iguales reciben el mismo trabajo (y el mismo archivo)
+mientras los datos no cambien.
+"""
+import hashlib
+import json
+import os
+import time
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import IntegrityError, models
+from django.utils import timezone
+
+from .filters import VentaFilter, CompraFilter, InventarioFilter
+from .models import Venta, Compra, Producto, Cliente, Proveedor, Categoria, TrabajoReporte
+from .versiones import sello_version
+
+REPORTES = {
+    'ventas': {
+        'titulo': 'Reporte de Ventas',
+        'filtro': VentaFilter,
+        'queryset': lambda: Venta.objects.select_related('cliente').order_by('-fecha', '-id'),
+        'modelos': (Venta, Cliente),
+    },
+    'compras': {
+        'titulo': 'Reporte de Compras',
+        'filtro': CompraFilter,
+        'queryset': lambda: Compra.objects.select_related('proveedor').order_by('-fecha', '-id'),
+        'modelos': (Compra, Proveedor),
+    },
+    'inventario': {
+        'titulo': 'Reporte de Inventario',
+        'filtro': InventarioFilter,
+        'queryset': lambda: Producto.objects.select_related('categoria').order_by('nombre', 'id'),
+        'modelos': (Producto, Categoria),
+    },
+}
+
+#cada cuanto se guarda el progreso como maximo (segundos)
+INTERVALO_PROGRESO = 1.0
+
+
+def directorio_reportes():
+    directorio = getattr(settings, 'REPORTES_DIR', os.path.join(settings.BASE_DIR, 'reportes_generados'))
+    os.makedirs(directorio, exist_ok=True)
+    return directorio
+
+
+def _normalizar_valor(valor):
+    if isinstance(valor, models.Model):
+        return str(valor.pk)
+    if isinstance(valor, (date, datetime)):
+        return valor.isoformat()
+    if isinstance(valor, Decimal):
+        return format(valor.normalize(), 'f')
+    return str(valor)
+
+
+def normalizar_parametros(tipo, datos):
+    """
+    Pasa los parámetros GET por el FilterSet del reporte y devuelve solo los
+    filtros válidos y no vacíos, como texto y en orden. Así '?cliente=Ana&x=1'
+    y '?x=2&cliente=Ana' producen la misma clave.
+    """
+    filtro = REPORTES[tipo]['filtro'](datos, queryset=REPORTES[tipo]['queryset']())
+    form = filtro.form
+    if not form.is_valid():
+        return None
+    return {
+        nombre: _normalizar_valor(valor)
+        for nombre, valor in sorted(form.cleaned_data.items())
+        if valor not in (None, '', [])
+    }
+
+
+def calcular_clave(tipo, formato, parametros):
+    contenido = json.dumps({
+        'tipo': tipo,
+        'formato': formato,
+        'parametros': parametros,
+        'version': sello_version(*REPORTES[tipo]['modelos']),
+    }, sort_keys=True)
+    return hashlib.sha256(contenido.encode()).hexdigest()
+
+
+def ruta_archivo(trabajo):
+    return os.path.join(directorio_reportes(), trabajo.archivo) if trabajo.archivo else None
+
+
+def archivo_disponible(trabajo):
+    ruta = ruta_archivo(trabajo)
+    return bool(ruta and os.path.exists(ruta))
+
+
+def solicitar_reporte(tipo, formato, parametros, usuario=None):
+    """
+    Devuelve el trabajo vigente para el pedido, creándolo si hace falta.
+    """
+    clave = calcular_clave(tipo, formato, parametros)
+    vigente = TrabajoReporte.objects.filter(clave=clave).exclude(estado='error').first()
+    if vigente:
+        if vigente.estado == 'completado' and not archivo_disponible(vigente):
+            #el archivo se borro del disco: se vuelve a generar
+            TrabajoReporte.objects.filter(pk=vigente.pk).update(
+                estado='pendiente', progreso=0, archivo='', actualizado=timezone.now())
+            vigente.refresh_from_db()
+        return vigente
+    try:
+        return TrabajoReporte.objects.create(
+            clave=clave, tipo=tipo, formato=formato, parametros=parametros, usuario=usuario,
+        )
+    except IntegrityError:
+        #otro pedido identico lo creo al mismo tiempo
+        return TrabajoReporte.objects.filter(clave=clave).exclude(estado='error').get()
+
+
+def tomar_siguiente():
+    """
+    Reserva el trabajo pendiente más antiguo para este proceso, o devuelve
+    None. La reserva es un UPDATE condicionado al estado, así dos workers
+    nunca procesan el mismo trabajo.
+
+    QuerySet.update() no toca los campos auto_now: `actualizado` se fija a
+    mano en la reserva y en cada avance, porque liberar_abandonados lo usa
+    para saber si el worker sigue vivo.
+    """
+    candidatos = TrabajoReporte.objects.filter(estado='pendiente').order_by('creado').values_list('pk', flat=True)[:10]
+    for pk in candidatos:
+        if TrabajoReporte.objects.filter(pk=pk, estado='pendiente').update(
+                estado='procesando', progreso=0, actualizado=timezone.now()):
+            return TrabajoReporte.objects.get(pk=pk)
+    return None
+
+
+def liberar_abandonados(minutos):
+    """Devuelve a pendiente los trabajos que quedaron en proceso (worker caído)."""
+    limite = timezone.now() - timedelta(minutes=minutos)
+    return TrabajoReporte.objects.filter(estado='procesando', actualizado__lt=limite).update(
+        estado='pendiente', actualizado=timezone.now())
+
+
+def procesar(trabajo):
+    """Genera el archivo del trabajo y lo marca como completado o con error."""
+    from .exportar import escribir_csv
+    from .pdf_generator import escribir_pdf
+
+    reporte = REPORTES[trabajo.tipo]
+    filtro = reporte['filtro'](trabajo.parametros, queryset=reporte['queryset']())
+    data = filtro.qs
+    total = max(data.count(), 1)
+    ultimo = [0.0]
+
+    def progreso(filas):
+        ahora = time.monotonic()
+        if ahora - ultimo[0] >= INTERVALO_PROGRESO:
+            ultimo[0] = ahora
+            TrabajoReporte.objects.filter(pk=trabajo.pk).update(
+                progreso=min(99, filas * 100 // total), actualizado=timezone.now())
+
+    nombre = f"{trabajo.tipo}_{trabajo.clave[:16]}.{trabajo.formato}"
+    destino = os.path.join(directorio_reportes(), nombre)
+    temporal = f"{destino}.{os.getpid()}.tmp"
+    try:
+        if trabajo.formato == 'csv':
+            with open(temporal, 'w', newline='', encoding='utf-8') as archivo:
+                escribir_csv(trabajo.tipo, data, archivo, progreso=progreso)
+        else:
+            escribir_pdf(trabajo.tipo, data, reporte['titulo'], temporal, progreso=progreso)
+        os.replace(temporal, destino)
+    except Exception as error:
+        if os.path.exists(temporal):
+            os.remove(temporal)
+        TrabajoReporte.objects.filter(pk=trabajo.pk).update(
+            estado='error', error=str(error), terminado=timezone.now(), actualizado=timezone.now())
+        raise
+
+    TrabajoReporte.objects.filter(pk=trabajo.pk).update(
+        estado='completado', progreso=100, archivo=nombre, terminado=timezone.now(), actualizado=timezone.now())
+
+
+def limpiar(dias):
+    """Borra los trabajos terminados hace más de `dias` días y sus archivos."""
+    limite = timezone.now() - timedelta(days=dias)
+    viejos = TrabajoReporte.objects.filter(estado__in=['completado', 'error'], creado__lt=limite)
+    for trabajo in viejos:
+        ruta = ruta_archivo(trabajo)
+        #el mismo archivo puede seguir en uso por otro trabajo con la misma clave
+        if ruta and os.path.exists(ruta) and not TrabajoReporte.objects.filter(
+                archivo=trabajo.archivo, creado__gte=limite).exists():
+            os.remove(ruta)
+    return viejos.delete()[0]
@@ -15,6 +15,9 @@ router.register(r'movimientos', api_views.MovimientoViewSet)
 # Endpoint de autenticación
 api_patterns = [
     path('login/', api_views.LoginView.as_view(), name='api_login'),
+    path('logout/', api_views.LogoutView.as_view(), name='api_logout'),
+    path('pedidos/', api_views.PedidosView.as_view(), name='api_pedidos'),
+    path('buscar/', api_views.BusquedaView.as_view(), name='api_buscar'),
     path('', include(router.urls)),
 ]
 
@@ -44,6 +47,7 @@ urlpatterns = [
     path('productos/nuevo/', views.crear_producto, name='crear_producto'),
     path('productos/editar/<int:id>/', views.editar_producto, name='editar_producto'),
     path('productos/eliminar/<int:id>/', views.eliminar_producto, name='eliminar_producto'),
+    path('productos/autocompletar/', views.autocompletar_productos, name='autocompletar_productos'),
 
     #ventas
     path('ventas/', views.lista_ventas, name='lista_ventas'),
@@ -61,16 +65,27 @@ urlpatterns = [
     path('compras/eliminar-item/<int:id>/', views.eliminar_detalle_compra, name='eliminar_detalle_compra'),
     path('compras/cancelar/<int:id>/', views.cancelar_compra, name='cancelar_compra'),
     path('api/producto/<int:producto_id>/precio/', views.obtener_precio_producto, name='obtener_precio_producto'),
+    path('api/productos/precios/', views.obtener_precios_productos, name='obtener_precios_productos'),
 
     #reportes
     path('reportes/ventas/', views.reporte_ventas, name='reporte_ventas'),
     path('reportes/compras/', views.reporte_compras, name='reporte_compras'),
     path('reportes/inventario/', views.reporte_inventario, name='reporte_inventario'),
     path('reportes/movimientos/', views.movimientos_inventario, name='movimientos_inventario'),
+    path('reportes/<str:tipo>/exportar/', views.exportar_reporte, name='exportar_reporte'),
+    path('reportes/trabajos/<int:id>/', views.estado_trabajo_reporte, name='estado_trabajo_reporte'),
+    path('reportes/trabajos/<int:id>/descargar/', views.descargar_trabajo_reporte, name='descargar_trabajo_reporte'),
 
     #dashboard
     path('dashboard/', views.dashboard, name='dashboard'),
 
+    #metricas para Prometheus
+    path('metrics', views.metricas_prometheus, name='metricas'),
+
+    #perfiles de requests (perfilado.py)
+    path('perfiles/', views.lista_perfiles, name='lista_perfiles'),
+    path('perfiles/<str:archivo>/', views.descargar_perfil, name='descargar_perfil'),
+
     #API REST
     path('api/', include(api_patterns)),
 ]
\ No newline at end of file
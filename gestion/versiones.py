@@ -0,0 +1,87 @@
+"""
+Versiones de datos por modelo.
+
+Cada modelo de negocio tiene un contador en VersionModelo que sube cada vez
+que se guarda o elimina una fila (ver signals.py). Con esos contadores se arma
+un sello de versión barato de consultar, que sirve para saber si un resultado
+calculado antes (por ejemplo un reporte exportado) sigue vigente.
+
+También alimentan los ETag / Last-Modified de la API y de los reportes: si
+ningún modelo que lee una respuesta cambió, el cliente recibe un 304 sin que
+se ejecute la consulta principal.
+"""
+import hashlib
+
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+
+
+def _etiqueta(modelo):
+    return modelo if isinstance(modelo, str) else modelo._meta.label_lower
+
+
+def incrementar_version(*modelos):
+    """
+    Sube en uno la versión de cada modelo indicado e invalida lo que haya en
+    el cache del catálogo para esos modelos.
+    """
+    from .models import VersionModelo
+    from .cache_catalogo import invalidar_al_confirmar
+
+    invalidar_al_confirmar(*(_etiqueta(modelo) for modelo in modelos))
+
+    for modelo in modelos:
+        etiqueta = _etiqueta(modelo)
+        #update() no toca los campos auto_now
+        cambios = {'version': F('version') + 1, 'actualizado': timezone.now()}
+        if VersionModelo.objects.filter(modelo=etiqueta).update(**cambios):
+            continue
+        try:
+            with transaction.atomic():
+                VersionModelo.objects.create(modelo=etiqueta, version=1)
+        except IntegrityError:
+            #otro proceso la creo al mismo tiempo
+            VersionModelo.objects.filter(modelo=etiqueta).update(**cambios)
+
+
+def versiones(*modelos):
+    """Diccionario {modelo: version} en una sola consulta."""
+    from .models import VersionModelo
+
+    etiquetas = [_etiqueta(modelo) for modelo in modelos]
+    actuales = dict(VersionModelo.objects.filter(modelo__in=etiquetas).values_list('modelo', 'version'))
+    return {etiqueta: actuales.get(etiqueta, 0) for etiqueta in etiquetas}
+
+
+def sello_version(*modelos):
+    """Texto que cambia cuando cambia cualquiera de los modelos indicados."""
+    return '-'.join(f'{modelo}:{version}' for modelo, version in sorted(versiones(*modelos).items()))
+
+
+def estado_version(request, *modelos):
+    """
+    (sello, última modificación) de los modelos indicados, en una consulta y
+    una sola vez por request.
+    """
+    from .models import VersionModelo
+
+    clave = tuple(_etiqueta(modelo) for modelo in modelos)
+    memoria = request.__dict__.setdefault('_estado_version', {})
+    if clave not in memoria:
+        filas = {modelo: (version, actualizado) for modelo, version, actualizado in
+                 VersionModelo.objects.filter(modelo__in=clave).values_list('modelo', 'version', 'actualizado')}
+        sello = '-'.join(f'{modelo}:{filas.get(modelo, (0, None))[0]}' for modelo in sorted(clave))
+        fechas = [actualizado for _, actualizado in filas.values()]
+        memoria[clave] = (sello, max(fechas) if fechas else None)
+    return memoria[clave]
+
+
+def etag_version(request, modelos, *partes):
+    """
+    ETag de una respuesta GET: cambia con la versión de los modelos que lee,
+    la ruta, los parámetros y las `partes` extra que indique quien llama.
+    """
+    sello, _ = estado_version(request, *modelos)
+    contenido = '|'.join([request.get_full_path(), sello, *map(str, partes)])
+    return hashlib.sha1(contenido.encode()).hexdigest()
@@ -1,28 +1,37 @@
 from django.contrib.auth.decorators import login_required, permission_required
 from django.shortcuts import render, redirect, get_object_or_404
-from .models import Cliente, Proveedor, Producto, Categoria, Venta, DetalleVenta, Compra, DetalleCompra, MovimientoInventario
+from .models import Cliente, Proveedor, Producto, Categoria, Venta, DetalleVenta, Compra, DetalleCompra, MovimientoInventario, TrabajoReporte, ResumenVentasMes, ResumenProductoMes
 from .forms import ClienteForm, ProveedorForm, ProductoForm, CategoriaForm, VentaForm, DetalleVentaForm, CompraForm, DetalleCompraForm
-from django.db.models import Sum
+from django.db.models import Sum, F
 from django.contrib import messages
-import csv
-from django.http import HttpResponse, JsonResponse
+from django.core.handlers.asgi import ASGIRequest
+from django.http import JsonResponse, FileResponse, Http404, HttpResponse
+from django.conf import settings
+from django.urls import reverse
+from django.utils.cache import patch_cache_control
 from django.template.loader import get_template
-from .filters import VentaFilter, CompraFilter, InventarioFilter
-from django.db.models.functions import TruncMonth
-from django.db.models import Count
+from .filters import VentaFilter, CompraFilter, InventarioFilter, condicion_contiene
 import json
-from .decorators import grupo_requerido, solo_administrador, solo_vendedor, solo_comprador, administrador_o_vendedor, administrador_o_comprador
-from .pdf_generator import generar_pdf_ventas, generar_pdf_compras, generar_pdf_inventario
-
+import os
+from asgiref.sync import sync_to_async
+from secrets import compare_digest
+from .decorators import grupo_requerido, solo_administrador, solo_vendedor, solo_comprador, administrador_o_vendedor, administrador_o_comprador, version_condicional, presupuesto_consultas
+from .paginacion import paginar_keyset, apaginar_keyset, obtener_por_pagina
+from . import trabajos, lineas, inventario, cache_catalogo, metricas, perfilado
+from .versiones import estado_version
+
+@presupuesto_consultas(3)
 @login_required
 def inicio(request):
     return render(request, 'inicio.html')
 
+@presupuesto_consultas(4)
 @solo_administrador
 def lista_clientes(request):
-    clientes = Cliente.objects.all()
-    return render(request, 'cliente/lista.html', {'clientes': clientes})
+    clientes = paginar_keyset(request, Cliente.objects.all(), ['nombre', 'id'])
+    return render(request, 'cliente/lista.html', {'clientes': clientes, 'pagina': clientes})
 
+@presupuesto_consultas(3)
 @solo_administrador
 def crear_cliente(request):
     if request.method == 'POST':
@@ -36,6 +45,7 @@ def crear_cliente(request):
 
     return render(request, 'cliente/form.html', {'form': form})
 
+@presupuesto_consultas(6)
 @solo_administrador
 def editar_cliente(request, id):
     cliente = get_object_or_404(Cliente, id=id)
@@ -51,6 +61,7 @@ def editar_cliente(request, id):
 
     return render(request, 'cliente/form.html', {'form': form})
 
+@presupuesto_consultas(6)
 @solo_administrador
 def eliminar_cliente(request, id):
     cliente = get_object_or_404(Cliente, id=id)
@@ -61,11 +72,13 @@ def eliminar_cliente(request, id):
 
     return redirect('lista_clientes') #cargar el formulario con los datos del cliente
 
+@presupuesto_consultas(4)
 @administrador_o_comprador
 def lista_proveedores(request):
     proveedores = Proveedor.objects.all()
     return render(request, 'proveedor/llista.html', {'proveedores': proveedores})
 
+@presupuesto_consultas(3)
 @administrador_o_comprador
 def crear_proveedor(request):
     if request.method == 'POST':
@@ -78,6 +91,7 @@ def crear_proveedor(request):
         form = ProveedorForm()
     return render(request, 'proveedor/form.html', {'form': form})
 
+@presupuesto_consultas(6)
 @administrador_o_comprador
 def editar_proveedor(request, id):
     proveedor = get_object_or_404(Proveedor, id=id)
@@ -91,6 +105,7 @@ def editar_proveedor(request, id):
         form = ProveedorForm(instance=proveedor)
     return render(request, 'proveedor/form.html', {'form': form})
 
+@presupuesto_consultas(6)
 @administrador_o_comprador
 def eliminar_proveedor(request, id):
     proveedor = get_object_or_404(Proveedor, id=id)
@@ -100,11 +115,13 @@ def eliminar_proveedor(request, id):
     return redirect('lista_proveedores')
 
 #categorias
+@presupuesto_consultas(4)
 @login_required
 def lista_categorias(request):
-    categorias = Categoria.objects.all()
+    categorias = cache_catalogo.obtener('lista_categorias', (Categoria,), (), lambda: list(Categoria.objects.all()))
     return render(request, 'categoria/lista.html', {'categorias': categorias})
 
+@presupuesto_consultas(3)
 @solo_administrador
 def crear_categoria(request):
     if request.method == 'POST':
@@ -117,6 +134,7 @@ def crear_categoria(request):
         form = CategoriaForm()
     return render(request, 'categoria/form.html', {'form': form})
 
+@presupuesto_consultas(6)
 @solo_administrador
 def editar_categoria(request, id):
     categoria = get_object_or_404(Categoria, id=id)
@@ -130,6 +148,7 @@ def editar_categoria(request, id):
         form = CategoriaForm(instance=categoria)
     return render(request, 'categoria/form.html', {'form': form})
 
+@presupuesto_consultas(6)
 @solo_administrador
 def eliminar_categoria(request, id):
     categoria = get_object_or_404(Categoria, id=id)
@@ -139,11 +158,13 @@ def eliminar_categoria(request, id):
     return redirect('lista_categorias')
 
 #productos
+@presupuesto_consultas(6)
 @login_required
 def lista_productos(request):
-    productos = Producto.objects.all()
-    return render(request, 'producto/lista.html', {'productos': productos})
+    productos = paginar_keyset(request, Producto.objects.select_related('proveedor', 'categoria'), ['nombre', 'id'])
+    return render(request, 'producto/lista.html', {'productos': productos, 'pagina': productos})
 
+@presupuesto_consultas(5)
 @solo_administrador
 def crear_producto(request):
     if request.method == 'POST':
@@ -156,6 +177,7 @@ def crear_producto(request):
         form = ProductoForm()
     return render(request, 'producto/form.html', {'form': form})
 
+@presupuesto_consultas(8)
 @solo_administrador
 def editar_producto(request, id):
     producto = get_object_or_404(Producto, id=id)
@@ -169,6 +191,7 @@ def editar_producto(request, id):
         form = ProductoForm(instance=producto)
     return render(request, 'producto/form.html', {'form': form})
 
+@presupuesto_consultas(6)
 @solo_administrador
 def eliminar_producto(request, id):
     producto = get_object_or_404(Producto, id=id)
@@ -178,11 +201,13 @@ def eliminar_producto(request, id):
     return redirect('lista_productos')
 
 #gestion de ventas
+@presupuesto_consultas(4)
 @solo_vendedor
 def lista_ventas(request):
-    ventas = Venta.objects.all().order_by('-fecha') #las mas recientes primero
-    return render(request, 'venta/lista.html', {'ventas': ventas})
+    ventas = paginar_keyset(request, Venta.objects.select_related('cliente'), ['-fecha', '-id']) #las mas recientes primero
+    return render(request, 'venta/lista.html', {'ventas': ventas, 'pagina': ventas})
 
+@presupuesto_consultas(4)
 @solo_vendedor
 def crear_venta(request):
     if request.method == 'POST':
@@ -200,48 +225,22 @@ def crear_venta(request):
         form = VentaForm()
     return render(request, 'venta/form.html', {'form': form})
 
+@presupuesto_consultas(7)
 @solo_vendedor
 def detalle_venta(request, id):
-    venta = get_object_or_404(Venta, id=id)
-    detalles = DetalleVenta.objects.filter(venta=venta)
-
-    #recalcular total de la venta en la pagina
-    total = 0
-    for d in detalles:
-        total += d.subtotal()
+    venta = get_object_or_404(Venta.objects.select_related('cliente'), id=id)
+    detalles = DetalleVenta.objects.filter(venta=venta).select_related('producto')
 
     if request.method == 'POST':
         form = DetalleVentaForm(request.POST)
         if form.is_valid():
-            producto_seleccionado = form.cleaned_data['producto']
-            cantidad_ingresada = form.cleaned_data['cantidad']
-
-            #buscar si el producto ya existe en los detalles de la venta
-            detalle_existente = DetalleVenta.objects.filter(venta=venta, producto=producto_seleccionado).first()
-
-            if detalle_existente:
-                #si existe, solo sumar la cantidad y actualizar precio
-                detalle_existente.cantidad += cantidad_ingresada
-                detalle_existente.precio_unitario = producto_seleccionado.precio_venta
-                detalle_existente.save()
-                messages.success(request, 'Cantidad actualizada en el pedido.')
+            #si el producto ya esta en la venta se suma la cantidad y se actualiza el precio
+            try:
+                creada = lineas.agregar_linea_venta(venta.id, form.cleaned_data['producto'], form.cleaned_data['cantidad'])
+            except lineas.LineaError as error:
+                messages.error(request, str(error))
             else:
-                #sino existe, crear uno nuevo
-                detalle = form.save(commit=False)
-                detalle.venta = venta
-                detalle.precio_unitario = producto_seleccionado.precio_venta
-                detalle.save()
-                messages.success(request, 'Producto agregado.')
-
-            #recalcular total de la cabecera (venta)
-            #esto es importante hacerlo después de guardar/actualizar
-            nuevos_detalles = DetalleVenta.objects.filter(venta=venta)
-            nuevo_total = 0
-            for d in nuevos_detalles:
-                nuevo_total += d.subtotal()
-            venta.total = nuevo_total
-            venta.save()
-
+                messages.success(request, 'Producto agregado.' if creada else 'Cantidad actualizada en el pedido.')
             return redirect('detalle_venta', id=id)
     else:
         form = DetalleVentaForm()
@@ -250,60 +249,38 @@ def detalle_venta(request, id):
         'venta': venta,
         'detalles': detalles,
         'form': form,
-        'total': total
+        'total': venta.total #lo mantiene lineas.py
     })
 
+@presupuesto_consultas(22)
 @solo_vendedor
 def finalizar_venta(request, id):
     venta = get_object_or_404(Venta, id=id)
 
-    if venta.estado == 'pendiente':
-        detalles = DetalleVenta.objects.filter(venta=venta)
-
-        # Validación de stock... (tu código existente sigue igual)
-        for detalle in detalles:
-            if detalle.producto.cantidad < detalle.cantidad:
-                messages.error(request, f"Error: No hay suficiente stock...")
-                return redirect('detalle_venta', id=id)
-
-        #restar inventario y registrar movimiento
-        for detalle in detalles:
-            producto = detalle.producto
-            producto.cantidad -= detalle.cantidad
-            producto.save()
-
-            MovimientoInventario.objects.create(
-                tipo='salida',
-                producto=producto,
-                cantidad=detalle.cantidad,
-                venta_asociada=venta
-            )
-            # --------------------------------------
-
-        venta.estado = 'completado'
-        venta.save()
+    try:
+        finalizada = inventario.finalizar_venta(venta.id)
+    except inventario.StockInsuficiente as error:
+        messages.error(request, f"Error: {error}")
+        return redirect('detalle_venta', id=id)
+
+    if finalizada:
         messages.success(request, 'Venta finalizada, stock actualizado y movimiento registrado.')
 
     return redirect('lista_ventas')
 
+@presupuesto_consultas(16)
 @solo_vendedor
 def eliminar_detalle_venta(request, id):
     detalle = get_object_or_404(DetalleVenta, id=id)
-    venta = detalle.venta #guardar la referencia de la venta antes de eliminar
-    detalle.delete()
-
-    #recalcular el total de la venta
-    detalles_restantes = DetalleVenta.objects.filter(venta=venta)
-    nuevo_total = 0
-    for d in detalles_restantes:
-        nuevo_total += d.subtotal()
-
-    venta.total = nuevo_total
-    venta.save()
-
-    messages.warning(request, 'Producto eliminado. Total actualizado.')
-    return redirect('detalle_venta', id=venta.id)
+    try:
+        lineas.eliminar_linea_venta(detalle.id)
+    except lineas.LineaError as error:
+        messages.error(request, str(error))
+    else:
+        messages.warning(request, 'Producto eliminado. Total actualizado.')
+    return redirect('detalle_venta', id=detalle.venta_id)
 
+@presupuesto_consultas(8)
 @solo_vendedor
 def cancelar_venta(request, id):
     venta = get_object_or_404(Venta, id=id)
@@ -317,11 +294,13 @@ def cancelar_venta(request, id):
     return redirect('lista_ventas')
 
 #gestion de compras
+@presupuesto_consultas(4)
 @solo_comprador
 def lista_compras(request):
-    compras = Compra.objects.all().order_by('-fecha')
-    return render(request, 'compra/lista.html', {'compras': compras})
+    compras = paginar_keyset(request, Compra.objects.select_related('proveedor'), ['-fecha', '-id'])
+    return render(request, 'compra/lista.html', {'compras': compras, 'pagina': compras})
 
+@presupuesto_consultas(4)
 @solo_comprador
 def crear_compra(request):
     if request.method == 'POST':
@@ -337,15 +316,11 @@ def crear_compra(request):
         form = CompraForm()
     return render(request, 'compra/form.html', {'form': form})
 
+@presupuesto_consultas(7)
 @solo_comprador
 def detalle_compra(request, id):
-    compra = get_object_or_404(Compra, id=id)
-    detalles = DetalleCompra.objects.filter(compra=compra)
-
-    #recalcular en total en la pagina
-    total = 0
-    for d in detalles:
-        total += (d.cantidad * d.costo_unitario)
+    compra = get_object_or_404(Compra.objects.select_related('proveedor'), id=id)
+    detalles = DetalleCompra.objects.filter(compra=compra).select_related('producto')
 
     if request.method == 'POST':
         form = DetalleCompraForm(request.POST)
@@ -354,87 +329,77 @@ def detalle_compra(request, id):
         form.fields['producto'].queryset = Producto.objects.filter(proveedor=compra.proveedor)
 
         if form.is_valid():
-            producto_seleccionado = form.cleaned_data['producto']
-            cantidad_ingresada = form.cleaned_data['cantidad']
-            costo_ingresado = form.cleaned_data['costo_unitario']
-
-            detalle_existente = DetalleCompra.objects.filter(compra=compra, producto=producto_seleccionado).first()
-
-            if detalle_existente:
-                detalle_existente.cantidad += cantidad_ingresada
-                detalle_existente.costo_unitario = costo_ingresado
-                detalle_existente.save()
-                messages.success(request, 'Cantidad actualizada en la orden.')
+            try:
+                creada = lineas.agregar_linea_compra(
+                    compra.id,
+                    form.cleaned_data['producto'],
+                    form.cleaned_data['cantidad'],
+                    form.cleaned_data['costo_unitario'],
+                )
+            except lineas.LineaError as error:
+                messages.error(request, str(error))
             else:
-                detalle = form.save(commit=False)
-                detalle.compra = compra
-                detalle.save()
-                messages.success(request, 'Producto agregado a la orden.')
-
-            #Actualizar total
-            nuevos_detalles = DetalleCompra.objects.filter(compra=compra)
-            nuevo_total = 0
-            for d in nuevos_detalles:
-                nuevo_total += (d.cantidad * d.costo_unitario)
-            compra.total = nuevo_total
-            compra.save()
-
+                messages.success(request, 'Producto agregado a la orden.' if creada else 'Cantidad actualizada en la orden.')
             return redirect('detalle_compra', id=id)
     else:
         form = DetalleCompraForm()
 
     form.fields['producto'].queryset = Producto.objects.filter(proveedor=compra.proveedor)
+    #el autocompletado solo ofrece productos de este proveedor
+    if compra.proveedor_id:
+        form.fields['producto'].widget.attrs['data-proveedor'] = compra.proveedor_id
 
     return render(request, 'compra/detalle.html', {
         'compra': compra,
         'detalles': detalles,
         'form': form,
-        'total': total
+        'total': compra.total #lo mantiene lineas.py
     })
 
+@presupuesto_consultas(19)
 @solo_comprador
 def finalizar_compra(request, id):
     compra = get_object_or_404(Compra, id=id)
-    if compra.estado == 'pendiente':
-        compra.estado = 'recibida'
-        compra.save()
 
-        detalles = DetalleCompra.objects.filter(compra=compra)
-        for detalle in detalles:
-            producto = detalle.producto
-            producto.cantidad += detalle.cantidad
-            producto.precio_compra = detalle.costo_unitario
-            producto.save()
-
-            #guardar en el historial de movimientos
-            MovimientoInventario.objects.create(
-                tipo='entrada',
-                producto=producto,
-                cantidad=detalle.cantidad,
-                compra_asociada=compra
-            )
-            # --------------------------------------
+    #por POST llegan las cantidades de una recepcion parcial (recibir_<id detalle>)
+    cantidades = None
+    if request.method == 'POST':
+        try:
+            cantidades = {
+                int(clave[len('recibir_'):]): int(valor)
+                for clave, valor in request.POST.items()
+                if clave.startswith('recibir_') and valor.strip()
+            }
+        except ValueError:
+            messages.error(request, 'Cantidades no válidas.')
+            return redirect('detalle_compra', id=id)
+
+    try:
+        estado = inventario.recibir_compra(compra.id, cantidades)
+    except inventario.RecepcionInvalida as error:
+        messages.error(request, str(error))
+        return redirect('detalle_compra', id=id)
 
+    if estado == 'recibida':
         messages.success(request, 'Compra recibida y movimientos registrados.')
+    elif estado == 'parcial':
+        messages.success(request, 'Recepción parcial registrada.')
+        return redirect('detalle_compra', id=id)
     return redirect('lista_compras')
 
+@presupuesto_consultas(16)
 @solo_comprador
 def eliminar_detalle_compra(request, id):
     detalle = get_object_or_404(DetalleCompra, id=id)
-    compra = detalle.compra
-    detalle.delete()
-
-    # Recalcular total
-    detalles_restantes = DetalleCompra.objects.filter(compra=compra)
-    nuevo_total = 0
-    for d in detalles_restantes:
-        nuevo_total += (d.cantidad * d.costo_unitario)
-    compra.total = nuevo_total
-    compra.save()
-
-    messages.warning(request, 'Producto eliminado de la orden.')
-    return redirect('detalle_compra', id=compra.id)
+    try:
+        lineas.eliminar_linea_compra(detalle.id)
+    except lineas.LineaError as error:
+        messages.error(request, str(error))
+    else:
+        messages.warning(request, 'Producto eliminado de la orden.')
+    return redirect('detalle_compra', id=detalle.compra_id)
 
+@presupuesto_consultas(8)
 @solo_comprador
 def cancelar_compra(request, id):
     compra = get_object_or_404(Compra, id=id)
@@ -445,99 +410,166 @@ def cancelar_compra(request, id):
     return redirect('lista_compras')
 
 #reportes
+#pdf_generator (ReportLab) y exportar se importan al exportar y no al arrancar cada worker
+#las vistas de solo lectura mas pesadas son async: bajo ASGI no ocupan un worker mientras esperan
+#a la base; lo que sigue siendo sincronico (filtros, plantillas, PDF) corre en un hilo
+async def _arender(request, plantilla, contexto):
+    #login_required ya cargo el usuario con auser(); sin esto request.user lo vuelve a consultar
+    request.user = await request.auser()
+    #las plantillas leen la sesion y los grupos con consultas sincronicas
+    return await sync_to_async(render)(request, plantilla, contexto)
+
+def _csv_async(request):
+    #bajo ASGI un iterador sincronico se lee entero antes de enviarse; bajo WSGI uno async tambien
+    return isinstance(request, ASGIRequest)
+
+@presupuesto_consultas(5)
 @login_required
-def reporte_ventas(request):
-    ventas = Venta.objects.all().order_by('-fecha')
+@version_condicional(Venta, Cliente)
+async def reporte_ventas(request):
+    ventas = Venta.objects.select_related('cliente').order_by('-fecha')
     filtro = VentaFilter(request.GET, queryset=ventas)
-    data = filtro.qs # Datos ya filtrados
+    #validar el filtro puede consultar la base (opciones, indice de busqueda): se hace en un hilo
+    data = await sync_to_async(lambda: filtro.qs)() # Datos ya filtrados
 
-    # EXPORTAR A CSV
+    # EXPORTAR A CSV (streaming, en bloques y sin N+1)
     if request.GET.get('export') == 'csv':
-        response = HttpResponse(content_type='text/csv')
-        response['Content-Disposition'] = 'attachment; filename="ventas.csv"'
-        writer = csv.writer(response)
-        writer.writerow(['Pedido', 'Fecha', 'Cliente', 'Total', 'Estado']) # Encabezados
-        for v in data:
-            writer.writerow([v.numero_pedido, v.fecha.strftime("%d/%m/%Y"), v.cliente.nombre, v.total, v.get_estado_display()])
-        return response
+        from .exportar import exportar_csv_ventas
+        return exportar_csv_ventas(data, asincrono=_csv_async(request))
 
-    # EXPORTAR A PDF (usando ReportLab, compatible con Railway)
+    # EXPORTAR A PDF (usando ReportLab, compatible con Railway; se dibuja en un hilo)
     if request.GET.get('export') == 'pdf':
-        return generar_pdf_ventas(data, 'Reporte de Ventas')
+        from .pdf_generator import generar_pdf_ventas
+        return await sync_to_async(generar_pdf_ventas)(data, 'Reporte de Ventas')
 
-    return render(request, 'reportes/ventas.html', {'filtro': filtro, 'ventas': data})
+    filas = [fila async for fila in data.aiterator(chunk_size=2000)]
+    return await _arender(request, 'reportes/ventas.html', {'filtro': filtro, 'ventas': filas})
 
+@presupuesto_consultas(5)
 @login_required
-def reporte_compras(request):
-    compras = Compra.objects.all().order_by('-fecha')
+@version_condicional(Compra, Proveedor)
+async def reporte_compras(request):
+    compras = Compra.objects.select_related('proveedor').order_by('-fecha')
     filtro = CompraFilter(request.GET, queryset=compras)
-    data = filtro.qs
+    #validar el filtro puede consultar la base (opciones, indice de busqueda): se hace en un hilo
+    data = await sync_to_async(lambda: filtro.qs)()
 
     if request.GET.get('export') == 'csv':
-        response = HttpResponse(content_type='text/csv')
-        response['Content-Disposition'] = 'attachment; filename="compras.csv"'
-        writer = csv.writer(response)
-        writer.writerow(['Orden', 'Fecha', 'Proveedor', 'Total', 'Estado'])
-        for c in data:
-            writer.writerow([c.numero_orden, c.fecha.strftime("%d/%m/%Y"), c.proveedor.empresa, c.total, c.get_estado_display()])
-        return response
+        from .exportar import exportar_csv_compras
+        return exportar_csv_compras(data, asincrono=_csv_async(request))
 
     # EXPORTAR A PDF (usando ReportLab, compatible con Railway)
     if request.GET.get('export') == 'pdf':
-        return generar_pdf_compras(data, 'Reporte de Compras')
+        from .pdf_generator import generar_pdf_compras
+        return await sync_to_async(generar_pdf_compras)(data, 'Reporte de Compras')
 
-    return render(request, 'reportes/compras.html', {'filtro': filtro, 'compras': data})
+    filas = [fila async for fila in data.aiterator(chunk_size=2000)]
+    return await _arender(request, 'reportes/compras.html', {'filtro': filtro, 'compras': filas})
 
+@presupuesto_consultas(6)
 @login_required
-def reporte_inventario(request):
-    productos = Producto.objects.all().order_by('nombre')
+@version_condicional(Producto, Categoria)
+async def reporte_inventario(request):
+    productos = Producto.objects.select_related('categoria').order_by('nombre')
     filtro = InventarioFilter(request.GET, queryset=productos)
-    data = filtro.qs
+    #validar el filtro puede consultar la base (opciones, indice de busqueda): se hace en un hilo
+    data = await sync_to_async(lambda: filtro.qs)()
 
     if request.GET.get('export') == 'csv':
-        response = HttpResponse(content_type='text/csv')
-        response['Content-Disposition'] = 'attachment; filename="inventario.csv"'
-        writer = csv.writer(response)
-        writer.writerow(['Código', 'Producto', 'Categoría', 'Stock', 'Precio Venta'])
-        for p in data:
-            writer.writerow([p.codigo, p.nombre, p.categoria.nombre, p.cantidad, p.precio_venta])
-        return response
+        from .exportar import exportar_csv_inventario
+        return exportar_csv_inventario(data, asincrono=_csv_async(request))
 
     # EXPORTAR A PDF (usando ReportLab, compatible con Railway)
     if request.GET.get('export') == 'pdf':
-        return generar_pdf_inventario(data, 'Reporte de Inventario')
+        from .pdf_generator import generar_pdf_inventario
+        return await sync_to_async(generar_pdf_inventario)(data, 'Reporte de Inventario')
+
+    filas = [fila async for fila in data.aiterator(chunk_size=2000)]
+    return await _arender(request, 'reportes/inventario.html', {'filtro': filtro, 'productos': filas})
+
+#exportacion de reportes en segundo plano
+def _estado_trabajo_json(request, trabajo):
+    datos = {
+        'id': trabajo.id,
+        'tipo': trabajo.tipo,
+        'formato': trabajo.formato,
+        'estado': trabajo.estado,
+        'progreso': trabajo.progreso,
+        'url_estado': reverse('estado_trabajo_reporte', args=[trabajo.id]),
+    }
+    if trabajo.estado == 'completado':
+        datos['url_descarga'] = reverse('descargar_trabajo_reporte', args=[trabajo.id])
+    if trabajo.estado == 'error':
+        datos['error'] = trabajo.error
+    return JsonResponse(datos, status=200 if trabajo.estado == 'completado' else 202)
+
+@presupuesto_consultas(7)
+@login_required
+def exportar_reporte(request, tipo):
+    if tipo not in trabajos.REPORTES:
+        return JsonResponse({'success': False, 'error': 'Reporte no encontrado'}, status=404)
 
-    return render(request, 'reportes/inventario.html', {'filtro': filtro, 'productos': data})
+    formato = request.GET.get('formato', 'pdf')
+    if formato not in dict(TrabajoReporte.FORMATOS):
+        return JsonResponse({'success': False, 'error': 'Formato no soportado'}, status=400)
+
+    parametros = trabajos.normalizar_parametros(tipo, request.GET)
+    if parametros is None:
+        return JsonResponse({'success': False, 'error': 'Filtros inválidos'}, status=400)
+
+    trabajo = trabajos.solicitar_reporte(tipo, formato, parametros, usuario=request.user)
+    return _estado_trabajo_json(request, trabajo)
+
+@presupuesto_consultas(5)
+@login_required
+def estado_trabajo_reporte(request, id):
+    trabajo = get_object_or_404(TrabajoReporte, id=id)
+    return _estado_trabajo_json(request, trabajo)
+
+@presupuesto_consultas(5)
+@login_required
+def descargar_trabajo_reporte(request, id):
+    trabajo = get_object_or_404(TrabajoReporte, id=id, estado='completado')
+    if not trabajos.archivo_disponible(trabajo):
+        raise Http404('El archivo del reporte ya no está disponible.')
+    content_type = 'application/pdf' if trabajo.formato == 'pdf' else 'text/csv'
+    return FileResponse(open(trabajos.ruta_archivo(trabajo), 'rb'), as_attachment=True,
+                        filename=f"reporte_{trabajo.tipo}.{trabajo.formato}", content_type=content_type)
 
 #movimientos de inventario
+@presupuesto_consultas(5)
 @login_required
-def movimientos_inventario(request):
-    movimientos = MovimientoInventario.objects.all().order_by('-fecha')
-    return render(request, 'reportes/movimientos.html', {'movimientos': movimientos})
+@version_condicional(MovimientoInventario, Producto, Venta, Compra)
+async def movimientos_inventario(request):
+    movimientos = await apaginar_keyset(
+        request,
+        MovimientoInventario.objects.select_related('producto', 'venta_asociada', 'compra_asociada'),
+        ['-fecha', '-id'],
+    )
+    return await _arender(request, 'reportes/movimientos.html', {'movimientos': movimientos, 'pagina': movimientos})
 
 #inicio
+@presupuesto_consultas(5)
 @login_required
-def dashboard(request):
+async def dashboard(request):
     #ventas por mes (grafico de barras)
-    ventas_por_mes = Venta.objects.annotate(mes=TruncMonth('fecha'))\
-        .values('mes')\
-        .annotate(total_ventas=Sum('total'))\
-        .order_by('mes')
+    #se leen los resumenes mensuales en lugar de recorrer todas las ventas
+    ventas_por_mes = ResumenVentasMes.objects.values('mes', total_ventas=F('total')).order_by('mes')
 
     meses_label = []
     montos_data = []
-    for v in ventas_por_mes:
+    async for v in ventas_por_mes:
         meses_label.append(v['mes'].strftime("%B %Y"))
         montos_data.append(float(v['total_ventas']))
 
     #productos más vendidos (grafico de pastel)
-    productos_top = DetalleVenta.objects.values('producto__nombre')\
+    productos_top = ResumenProductoMes.objects.values('producto__nombre')\
         .annotate(cantidad_total=Sum('cantidad'))\
         .order_by('-cantidad_total')[:5]
 
     prod_labels = []
     prod_data = []
-    for p in productos_top:
+    async for p in productos_top:
         prod_labels.append(p['producto__nombre'])
         prod_data.append(p['cantidad_total'])
 
@@ -547,12 +579,42 @@ def dashboard(request):
         'prod_labels': json.dumps(prod_labels),
         'prod_data': json.dumps(prod_data),
     }
-    return render(request, 'dashboard.html', context)
+    return await _arender(request, 'dashboard.html', context)
 
+#autocompletado del selector de productos (forms.SelectAutocompletar)
+POR_PAGINA_AUTOCOMPLETAR = 20
+
+@presupuesto_consultas(3)
+@login_required
+def autocompletar_productos(request):
+    """
+    Opciones del selector de productos de a una página, por cursor sobre
+    (nombre, id). ?q= busca en código y nombre, ?proveedor= deja solo los
+    productos de ese proveedor (órdenes de compra) y ?despues= es el cursor
+    de la página siguiente.
+    """
+    productos = Producto.objects.only('id', 'codigo', 'nombre')
+    proveedor = request.GET.get('proveedor', '')
+    if proveedor:
+        if not proveedor.isdigit():
+            return JsonResponse({'error': 'Proveedor inválido'}, status=400)
+        productos = productos.filter(proveedor_id=proveedor)
+    texto = request.GET.get('q', '').strip()
+    if texto:
+        productos = productos.filter(condicion_contiene(Producto, ['codigo', 'nombre'], texto))
+
+    pagina = paginar_keyset(request, productos, ['nombre', 'id'],
+                            min(obtener_por_pagina(request), POR_PAGINA_AUTOCOMPLETAR))
+    return JsonResponse({
+        'resultados': [{'id': producto.id, 'texto': str(producto)} for producto in pagina],
+        'siguiente': pagina.cursor_siguiente,
+    })
+
+@presupuesto_consultas(5)
 @login_required
-def obtener_precio_producto(request, producto_id):
+async def obtener_precio_producto(request, producto_id):
     try:
-        producto = Producto.objects.get(id=producto_id)
+        producto = await Producto.objects.only('precio_compra').aget(id=producto_id)
         return JsonResponse({
             'precio_compra': float(producto.precio_compra),
             'success': True
@@ -561,4 +623,77 @@ def obtener_precio_producto(request, producto_id):
         return JsonResponse({
             'success': False,
             'error': 'Producto no encontrado'
-        }, status=404)
\ No newline at end of file
+        }, status=404)
+
+#precios de muchos productos en una consulta (el JS de compra/detalle.html los guarda en memoria)
+MAXIMO_PRECIOS = 1000
+
+@presupuesto_consultas(5)
+@login_required
+@version_condicional(Producto)
+def obtener_precios_productos(request):
+    """
+    Precios y stock de varios productos: ?ids=1,2,3 o ?proveedor= (todo su
+    catálogo, hasta MAXIMO_PRECIOS; `completo` indica si entraron todos).
+
+    `version` cambia cuando cambia cualquier producto; con el ETag el
+    navegador revalida y recibe un 304 si nada cambió.
+    """
+    productos = Producto.objects.order_by('id')
+    ids = request.GET.get('ids', '')
+    proveedor = request.GET.get('proveedor', '')
+    if ids:
+        ids = ids.split(',')
+        if len(ids) > MAXIMO_PRECIOS or not all(pk.isdigit() for pk in ids):
+            return JsonResponse({'success': False, 'error': 'Lista de ids inválida'}, status=400)
+        productos = productos.filter(id__in=ids)
+    elif proveedor.isdigit():
+        productos = productos.filter(proveedor_id=proveedor)
+    else:
+        return JsonResponse({'success': False, 'error': 'Indique ids o proveedor'}, status=400)
+
+    filas = list(productos.values_list('id', 'precio_compra', 'precio_venta', 'cantidad')[:MAXIMO_PRECIOS + 1])
+    response = JsonResponse({
+        'success': True,
+        'version': estado_version(request, Producto)[0],
+        'completo': len(filas) <= MAXIMO_PRECIOS,
+        'precios': {
+            pk: {'precio_compra': float(compra), 'precio_venta': float(venta), 'stock': stock}
+            for pk, compra, venta, stock in filas[:MAXIMO_PRECIOS]
+        },
+    })
+    #el navegador guarda la respuesta y la revalida con el ETag en cada uso
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+#metricas por ruta (metricas.py) para Prometheus
+@presupuesto_consultas(2)
+def metricas_prometheus(request):
+    #Prometheus entra con "Authorization: Bearer <METRICAS_TOKEN>"; desde el navegador, solo el staff
+    token = getattr(settings, 'METRICAS_TOKEN', None)
+    con_token = bool(token) and compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}')
+    if not con_token and not request.user.is_staff:
+        return HttpResponse('No autorizado.', status=403, content_type='text/plain; charset=utf-8')
+
+    response = HttpResponse(metricas.texto_prometheus(), content_type='text/plain; version=0.0.4; charset=utf-8')
+    patch_cache_control(response, no_store=True)
+    return response
+
+#perfiles de requests lentos o muestreados (perfilado.py)
+@presupuesto_consultas(4)
+@solo_administrador
+def lista_perfiles(request):
+    return render(request, 'perfiles/lista.html', {
+        'perfiles': perfilado.listar(),
+        'activo': getattr(settings, 'PERFILADO_ACTIVO', False),
+    })
+
+@presupuesto_consultas(5)
+@solo_administrador
+def descargar_perfil(request, archivo):
+    nombre, extension = os.path.splitext(archivo)
+    ruta = perfilado.ruta(nombre, extension)
+    if ruta is None:
+        raise Http404('El perfil ya no está disponible.')
+    content_type = 'application/octet-stream' if extension == '.prof' else 'application/json'
+    return FileResponse(open(ruta, 'rb'), as_attachment=True, filename=archivo, content_type=content_type)
@@ -3,6 +3,17 @@ ASGI config for gestion_empresarial_project project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+Los reportes, los movimientos de inventario, el dashboard y el precio de un
+producto son vistas async: bajo ASGI esperan a la base sin ocupar un worker.
+Para servirla así (uvicorn y uvicorn-worker no están en requirements.txt):
+
+    pip install uvicorn uvicorn-worker
+    uvicorn gestion_empresarial_project.asgi:application --workers 2
+    gunicorn gestion_empresarial_project.asgi:application -k uvicorn_worker.UvicornWorker -w 2
+
+La API (DRF) sigue siendo sincrónica y Django la corre en un hilo. Para
+comparar con WSGI: python manage.py benchmark_asgi.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
 """
@@ -52,7 +52,9 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
-    'whitenoise.middleware.WhiteNoiseMiddleware',
+    'gestion.estaticos.WhiteNoiseAsyncMiddleware',
+    'gestion.metricas.MetricasMiddleware',
+    'gestion.perfilado.PerfiladoMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -73,6 +75,7 @@ TEMPLATES = [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'gestion.context_processors.roles',
             ],
         },
     },
@@ -144,9 +147,80 @@ LOGIN_URL = 'login'
 # REST Framework Configuration
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        'gestion.autenticacion.TokenAccesoAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
     ],
-}
\ No newline at end of file
+    'DEFAULT_PAGINATION_CLASS': 'gestion.paginacion.PaginacionCursorApi',
+    'DEFAULT_FILTER_BACKENDS': [
+        'django_filters.rest_framework.DjangoFilterBackend',
+    ],
+}
+
+# Paginacion por cursor de las listas HTML
+PAGINACION_POR_PAGINA = 50
+PAGINACION_MAXIMO = 500
+
+# Motor de PDFs: 'streaming' (por páginas, memoria acotada) o 'platypus' (Table de ReportLab)
+PDF_MOTOR = os.environ.get('PDF_MOTOR', 'streaming')
+
+# Renderizado de PDFs en paralelo (opcional): con PDF_PROCESOS > 1 los reportes
+# con al menos PDF_PARALELO_MIN_FILAS filas se dibujan en el worker repartidos entre procesos
+PDF_PROCESOS = int(os.environ.get('PDF_PROCESOS', '1'))
+PDF_PARALELO_MIN_FILAS = int(os.environ.get('PDF_PARALELO_MIN_FILAS', '20000'))
+
+# Archivos generados por los trabajos de exportación (manage.py procesar_reportes)
+REPORTES_DIR = os.environ.get('REPORTES_DIR', os.path.join(BASE_DIR, 'reportes_generados'))
+
+# Cache. En producción con varios workers conviene un backend compartido
+# (Redis, Memcached o archivos) para que las invalidaciones lleguen a todos.
+CACHES = {
+    'default': {
+        'BACKEND': os.environ.get('CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.environ.get('CACHE_LOCATION', 'gestion'),
+    }
+}
+
+# Segundos que se guardan en cache los grupos de cada usuario
+CACHE_GRUPOS_SEGUNDOS = 300
+
+# Cache del catalogo (cache_catalogo.py): segundos frescos y segundos extra
+# en que se sirve el valor vencido mientras un solo proceso lo recalcula
+CACHE_CATALOGO_SEGUNDOS = 300
+CACHE_CATALOGO_GRACIA = 60
+
+# Buscadores de texto de los filtros con el indice en memoria (busqueda.py)
+BUSQUEDA_CON_INDICE = True
+
+# Tokens de la API (autenticacion.py): duracion y segundos en cache. Con el
+# cache locmem cada worker tiene su copia y un token revocado sigue valiendo
+# en los demas hasta que vence su entrada: ahi se usa CACHE_TOKENS_SEGUNDOS_LOCAL
+TOKEN_DURACION_HORAS = 24 * 7
+CACHE_TOKENS_SEGUNDOS = 300
+CACHE_TOKENS_SEGUNDOS_LOCAL = 5
+
+# Metricas por ruta en /metrics (metricas.py). Con varios workers,
+# METRICAS_DIR es un directorio compartido por los procesos que se vacia al
+# arrancar el servidor. Prometheus se autentica con METRICAS_TOKEN (Bearer);
+# sin token solo el staff puede ver la pagina.
+METRICAS_ACTIVAS = os.environ.get('METRICAS_ACTIVAS', 'True') == 'True'
+METRICAS_DIR = os.environ.get('METRICAS_DIR')
+METRICAS_TOKEN = os.environ.get('METRICAS_TOKEN')
+# Header Server-Timing (tiempo total y de base de datos) en cada respuesta
+METRICAS_SERVER_TIMING = os.environ.get('METRICAS_SERVER_TIMING') == 'True'
+
+# Perfilado con cProfile (perfilado.py), desactivado por defecto. Se perfila
+# la fraccion PERFILADO_MUESTRA de los requests; con PERFILADO_UMBRAL_MS se
+# perfilan todos y se guardan tambien los que tardan mas que el umbral.
+# PERFILADO_VISTAS limita el perfilado a esas rutas (nombres separados por comas).
+PERFILADO_ACTIVO = os.environ.get('PERFILADO_ACTIVO') == 'True'
+PERFILADO_MUESTRA = float(os.environ.get('PERFILADO_MUESTRA', '0.01'))
+PERFILADO_UMBRAL_MS = float(os.environ['PERFILADO_UMBRAL_MS']) if os.environ.get('PERFILADO_UMBRAL_MS') else None
+PERFILADO_VISTAS = [vista for vista in os.environ.get('PERFILADO_VISTAS', '').split(',') if vista]
+PERFILADO_DIR = os.environ.get('PERFILADO_DIR', os.path.join(BASE_DIR, 'perfiles'))
+PERFILADO_MAXIMO = int(os.environ.get('PERFILADO_MAXIMO', '50'))
+
+# Presupuesto de arranque de un worker (django.setup() y URLs, arranque.py),
+# verificado por los tests y por `python manage.py benchmark_arranque`
+ARRANQUE_PRESUPUESTO_MS = float(os.environ.get('ARRANQUE_PRESUPUESTO_MS', '2000'))